@@ -35,6 +35,29 @@ def load_data(file_path, label_path=None):
         print(f"Error loading CSV data: {e}")
         sys.exit(1)
 
+def save_columnar(df, output_path):
+    """
+    Saves a DataFrame in a columnar format chosen by extension.
+
+    '.feather' / '.arrow' write uncompressed Arrow IPC so readers can
+    memory-map the file; '.parquet' writes Parquet.
+
+    Args:
+        df (pd.DataFrame): The dataset to save.
+        output_path (str): Destination path.
+
+    Returns:
+        str: The path written.
+    """
+    if output_path.endswith('.parquet'):
+        df.to_parquet(output_path, index=False)
+    elif output_path.endswith(('.feather', '.arrow')):
+        df.reset_index(drop=True).to_feather(output_path, compression='uncompressed')
+    else:
+        raise ValueError(f"Unsupported columnar format: {output_path}")
+    print(f"Saved columnar dataset to {output_path}")
+    return output_path
+
 if __name__ == "__main__":
     # Simple test for the loader
     if len(sys.argv) > 1:
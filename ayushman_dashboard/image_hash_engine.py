@@ -1,3 +1,4 @@
+import io
 import os
 from PIL import Image
 import imagehash
@@ -23,15 +24,31 @@ class ImageForensicsEngine:
             raise FileNotFoundError(f"File not found: {file_path}")
 
         if file_path.lower().endswith(".pdf"):
-            doc = fitz.open(file_path)
+            return self._render_first_page(fitz.open(file_path))
+
+        return Image.open(file_path)
+
+    # --------------------------------------------
+    # Load image or PDF from memory
+    # --------------------------------------------
+    def _load_bytes_as_image(self, data, filename=""):
+
+        # PDFs are recognised by extension or by their %PDF header
+        if filename.lower().endswith(".pdf") or data[:5] == b"%PDF-":
+            return self._render_first_page(fitz.open(stream=data, filetype="pdf"))
+
+        img = Image.open(io.BytesIO(data))
+        img.load()  # decode now, while the buffer is alive
+        return img
+
+    def _render_first_page(self, doc):
+
+        with doc:
             if doc.page_count == 0:
                 raise Exception("PDF conversion failed.")
             page = doc.load_page(0)
             pix = page.get_pixmap(dpi=200)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            return img
-
-        return Image.open(file_path)
+            return Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
 
     # --------------------------------------------
     # Generate Multiple Hashes
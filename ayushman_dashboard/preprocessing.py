@@ -77,3 +77,32 @@ def get_ml_features(X, id_cols=None):
     
     print(f"Detected {len(numeric_features.columns)} numeric features for ML.")
     return numeric_features
+
+# ID and code columns stored as categoricals in the columnar cache
+CATEGORICAL_COLUMNS = [
+    'BeneID', 'ClaimID', 'Provider', 'AttendingPhysician', 'OperatingPhysician',
+    'OtherPhysician', 'ClmAdmitDiagnosisCode', 'DiagnosisGroupCode'
+]
+
+# Monetary columns stored as float32 in the columnar cache
+AMOUNT_COLUMNS = [
+    'InscClaimAmtReimbursed', 'DeductibleAmtPaid',
+    'IPAnnualReimbursementAmt', 'IPAnnualDeductibleAmt',
+    'OPAnnualReimbursementAmt', 'OPAnnualDeductibleAmt'
+]
+
+def pin_dtypes(df):
+    """
+    Pins compact dtypes for columnar storage: ID and diagnosis code columns
+    as categoricals, amounts as float32 and ChronicCond_ flags as int8.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if col in CATEGORICAL_COLUMNS or col.startswith('ClmDiagnosisCode_'):
+            df[col] = df[col].astype(str).astype('category')
+        elif col in AMOUNT_COLUMNS:
+            df[col] = df[col].astype('float32')
+        elif col.startswith('ChronicCond_'):
+            df[col] = df[col].astype('int8')
+    print("Pinned dtypes: IDs as category, amounts as float32, ChronicCond flags as int8.")
+    return df
@@ -69,16 +69,19 @@ def generate_pdf_report(hospital_id, hospital_stats, top_claims, executive_summa
     elements.append(Paragraph("Top 10 Suspicious Claims", heading_style))
     elements.append(Spacer(1, 12))
     
-    claims_data = [["Claim ID", "Procedure", "Amount (Rs)", "Risk Score"]]
+    # Per-claim top contributing features, when the claims were explained
+    has_explanations = 'explanation' in top_claims.columns
+    claims_data = [["Claim ID", "Procedure", "Amount (Rs)", "Risk Score"] + (["Top Factors"] if has_explanations else [])]
     for _, row in top_claims.head(10).iterrows():
         claims_data.append([
             str(row.get('claim_id', '')),
             str(row.get('procedure_code', '')),
             f"{row.get('claim_amount', 0):.2f}",
             str(row.get('risk_score', 0))
-        ])
+        ] + ([Paragraph(str(row.get('explanation') or ''), normal_style)] if has_explanations else []))
         
-    t2 = Table(claims_data, colWidths=[120, 100, 100, 100])
+    col_widths = [90, 70, 80, 70, 180] if has_explanations else [120, 100, 100, 100]
+    t2 = Table(claims_data, colWidths=col_widths)
     t2.setStyle(TableStyle([
         ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
         ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
@@ -1,27 +1,81 @@
 import os
 import json
+import time
 import uuid
+import threading
 import numpy as np
 import pandas as pd
 from PIL import Image
 try:
-    from fastapi import FastAPI, HTTPException, UploadFile, File
+    from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 except ImportError:
     import subprocess
     import sys
     subprocess.check_call([sys.executable, "-m", "pip", "install", "python-multipart"])
-    from fastapi import FastAPI, HTTPException, UploadFile, File
+    from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from fraud_detection_engine import run_pipeline
+from model_artifact import DEFAULT_ARTIFACT_PATH, load_model_artifact
+from claim_scoring import ClaimScorer
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '../ayushman_dashboard'))
 from image_hash_engine import ImageForensicsEngine
+from image_analysis import (
+    UPLOAD_SPOOL_LIMIT, ImageAnalysisBusy, ImageAnalysisPool, ImageAnalysisWorkerLost,
+    hash_image_bytes, hash_image_file,
+)
+from fastapi.concurrency import run_in_threadpool
+from image_hash_index import ImageHashIndex
+from image_hash_store import DEFAULT_STORE_PATH, StoredImageHashIndex
+
+# Packed hashes of uploaded images, to simulate a dataset of previous claims.
+# Opened at startup on the durable store shared by all API workers (in memory
+# if it cannot be opened). Only the parent process reads or writes it, under
+# historical_hashes_lock
+IMAGE_HASH_STORE_PATH = os.environ.get("IMAGE_HASH_STORE", DEFAULT_STORE_PATH)
+historical_hashes = ImageHashIndex()
+historical_hashes_lock = threading.Lock()
+
+# Lowest similarity reported as a duplicate (below 50 the risk is 0 anyway).
+# Above 94.27 every lookup is sublinear; below it, a novel image is a full
+# scan of the history (see image_hash_index.py)
+IMAGE_MATCH_MIN_SIMILARITY = float(os.environ.get("IMAGE_MATCH_MIN_SIMILARITY", 50))
+
+# Image decoding and hashing run in worker processes, off the event loop
+image_pool = ImageAnalysisPool.from_env()
+forensics_engine = ImageForensicsEngine()
+
+# Pre-trained model exported with `python model_artifact.py`; loaded once at startup
+MODEL_ARTIFACT_PATH = os.environ.get("FRAUD_MODEL_ARTIFACT", DEFAULT_ARTIFACT_PATH)
+model_artifact = None
+claim_scorer = None
 
-# Keep track of uploaded image hashes to simulate a dataset of previous claims
-historical_hashes = []
+@asynccontextmanager
+async def lifespan(app):
+    global model_artifact, claim_scorer, historical_hashes
+    if os.path.exists(MODEL_ARTIFACT_PATH):
+        try:
+            model_artifact = load_model_artifact(MODEL_ARTIFACT_PATH)
+            claim_scorer = ClaimScorer(model_artifact)
+            print(f"Loaded model artifact v{model_artifact['model_version']} from {MODEL_ARTIFACT_PATH}")
+        except ValueError as e:
+            print(f"Refusing model artifact {MODEL_ARTIFACT_PATH}: {e}. Falling back to training.")
+    # Warm the dashboard cache in the background; startup does not wait for it
+    refresh_fraud_data(blocking=False)
+    try:
+        historical_hashes = StoredImageHashIndex.open(IMAGE_HASH_STORE_PATH)
+        print(f"Opened image hash store {IMAGE_HASH_STORE_PATH} ({len(historical_hashes):,} images)")
+    except (OSError, ValueError) as e:
+        print(f"Image hash store {IMAGE_HASH_STORE_PATH} unavailable: {e}. Keeping hashes in memory.")
+    image_pool.start()
+    yield
+    image_pool.shutdown()
+    if isinstance(historical_hashes, StoredImageHashIndex):
+        historical_hashes.store.close()
 
-app = FastAPI(title="Arogya Vigilant Fraud API")
+app = FastAPI(title="Arogya Vigilant Fraud API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,19 +85,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global cache for pipeline results, computed once lazily during the first request
+# Cleaned datasets written by main_pipeline, in order of preference
+CLEANED_DATA_PATHS = ["cleaned_claims.feather", "cleaned_claims.parquet", "cleaned_claims.csv"]
+
+# Dashboard payload cache. Warmed in the background at startup; at most one
+# computation runs at a time, and once a payload exists it is served (stale
+# if older than DASHBOARD_CACHE_TTL seconds) while a recompute runs. After a
+# failure, no automatic recompute starts for DASHBOARD_RETRY_BACKOFF seconds
+# and cold requests fail fast with the last error instead of re-running it
+DASHBOARD_CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", 3600))
+DASHBOARD_RETRY_BACKOFF = float(os.environ.get("DASHBOARD_RETRY_BACKOFF", 60))
 cached_data = None
+cached_at = 0.0
+cache_error = None
+cache_error_at = None
+_cache_lock = threading.Lock()
+
+def _backing_off():
+    return cache_error_at is not None and time.monotonic() - cache_error_at < DASHBOARD_RETRY_BACKOFF
+
+def _compute_fraud_data():
+    # Caller holds _cache_lock
+    global cached_data, cached_at, cache_error, cache_error_at
+    try:
+        payload = build_fraud_data()
+    except Exception as e:
+        cache_error, cache_error_at = str(e), time.monotonic()
+        print(f"Dashboard cache refresh failed: {e}")
+        raise
+    cached_data, cached_at, cache_error, cache_error_at = payload, time.monotonic(), None, None
+
+def _compute_fraud_data_and_release():
+    try:
+        _compute_fraud_data()
+    except Exception:
+        pass  # Recorded in cache_error
+    finally:
+        _cache_lock.release()
+
+def refresh_fraud_data(blocking=True):
+    # blocking=True fills a cold cache in this thread: it waits for a running
+    # computation and takes its payload instead of starting another, raises
+    # 503 while the last failure is within the backoff, and raises on
+    # failure. Returns True if this call computed the payload.
+    # blocking=False starts a computation in a background thread and returns
+    # whether it did (False if one is already running).
+    if not blocking:
+        if not _cache_lock.acquire(blocking=False):
+            return False
+        # The thread takes over the lock, so no second computation can start
+        # between this check and the thread running
+        threading.Thread(target=_compute_fraud_data_and_release, daemon=True).start()
+        return True
+    with _cache_lock:
+        if cached_data is not None:
+            # Filled by the computation we waited for
+            return False
+        if _backing_off():
+            retry_after = DASHBOARD_RETRY_BACKOFF - (time.monotonic() - cache_error_at)
+            raise HTTPException(status_code=503, detail=f"Dashboard data unavailable: {cache_error}",
+                                headers={"Retry-After": str(max(1, int(retry_after)))})
+        _compute_fraud_data()
+        return True
 
 def get_fraud_data():
-    global cached_data
-    if cached_data is not None:
+    if cached_data is None:
+        # Cold cache: join the warmup (or compute) instead of racing it
+        refresh_fraud_data(blocking=True)
         return cached_data
-    
-    csv_path = "cleaned_claims.csv"
-    if not os.path.exists(csv_path):
+    if time.monotonic() - cached_at > DASHBOARD_CACHE_TTL and not _backing_off():
+        refresh_fraud_data(blocking=False)
+    return cached_data
+
+def build_fraud_data():
+    # Prefer the memory-mapped columnar cache, fall back to CSV
+    data_path = next((path for path in CLEANED_DATA_PATHS if os.path.exists(path)), None)
+    if data_path is None:
         raise HTTPException(status_code=500, detail="Data file not found")
         
-    results = run_pipeline(csv_path)
+    results = run_pipeline(data_path, model_artifact=model_artifact, columns="pipeline")
     df = results["df"]
     provider_summary = results["provider_summary"]
     metrics = results["metrics"]
@@ -56,19 +176,39 @@ def get_fraud_data():
     prevented_value = float(df[df['AnomalyFlag'] == 1]['InscClaimAmtReimbursed'].sum())
     total_claim_value = float(df['InscClaimAmtReimbursed'].sum())
 
-    # Calculate month by month trend (synthetic but based on length/properties so it stays deterministic)
-    # Since dataset doesn't have explicit date, we'll map uniformly over a synthetic 7-month period for display
-    timeline_data = []
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul']
-    chunk_size = total_claims // 7
-    for i in range(7):
-        chunk = df.iloc[i * chunk_size:(i + 1) * chunk_size]
-        timeline_data.append({
-            "month": months[i],
-            "processed": len(chunk),
-            "flagged": int(chunk['AnomalyFlag'].sum()),
-            "saved": float(chunk[chunk['AnomalyFlag'] == 1]['InscClaimAmtReimbursed'].sum())
-        })
+    # Month by month trend from the real claim dates, precomputed by the pipeline
+    monthly = results["timeline"]["monthly"]
+    daily = results["timeline"]["daily"]
+    timeline_data = [
+        {
+            "month": pd.Timestamp(row.Period).strftime("%b %Y"),
+            "processed": int(row.processed),
+            "flagged": int(row.flagged),
+            "saved": float(row.saved)
+        }
+        for row in monthly.itertuples()
+    ]
+    daily_timeline_data = [
+        {
+            "date": pd.Timestamp(row.Period).strftime("%Y-%m-%d"),
+            "processed": int(row.processed),
+            "flagged": int(row.flagged),
+            "saved": float(row.saved)
+        }
+        for row in daily.itertuples()
+    ]
+    if not timeline_data:
+        # No usable ClaimStartDt: spread claims over a synthetic 7-month period for display
+        months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul']
+        chunk_size = total_claims // 7
+        for i in range(7):
+            chunk = df.iloc[i * chunk_size:(i + 1) * chunk_size]
+            timeline_data.append({
+                "month": months[i],
+                "processed": len(chunk),
+                "flagged": int(chunk['AnomalyFlag'].sum()),
+                "saved": float(chunk[chunk['AnomalyFlag'] == 1]['InscClaimAmtReimbursed'].sum())
+            })
 
     # Synthetic Regional mapping (using Provider IDs to create pseudo-regions)
     regions = ['North', 'South', 'East', 'West', 'Central']
@@ -115,8 +255,24 @@ def get_fraud_data():
         log_entries.append({"id": 3, "time": "1 hr ago", "type": "info", "message": f"Computed {len(provider_summary)} provider aggregated risk scores."})
         log_entries.append({"id": 4, "time": "System Start", "type": "info", "message": "ML Engine loaded and pipeline initialized."})
 
-    
-    cached_data = {
+    # Why the most anomalous claims were flagged, for auditors
+    flagged_claims = []
+    explanations = results["explanations"]
+    if explanations is not None:
+        explained = explanations[explanations['Explained']].head(50)
+        risk_scores = df['RiskScore'].to_numpy()
+        for row in explained.itertuples():
+            flagged_claims.append({
+                "claimId": str(getattr(row, 'ClaimID', row.Row)),
+                "provider": str(getattr(row, 'Provider', '')),
+                "riskScore": round(float(risk_scores[row.Row]), 2),
+                "topFeatures": [
+                    {"feature": getattr(row, f'TopFeature{i}'), "contribution": round(float(getattr(row, f'TopContribution{i}')), 4)}
+                    for i in range(1, 4) if hasattr(row, f'TopFeature{i}')
+                ]
+            })
+
+    return {
         "hero": {
             "totalClaims": f"{total_claims:,}",
             "suspiciousPercentage": f"{suspicious_claim_percentage}%",
@@ -131,60 +287,107 @@ def get_fraud_data():
         },
         "analytics": {
             "timeline": timeline_data,
+            "dailyTimeline": daily_timeline_data,
             "regions": region_data
         },
-        "providers": top_providers
+        "providers": top_providers,
+        "flaggedClaims": flagged_claims
     }
-    return cached_data
 
 @app.get("/dashboard")
 def get_dashboard():
     try:
         data = get_fraud_data()
         return data
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/dashboard/refresh", status_code=202)
+def refresh_dashboard():
+    # Recompute in the background, ignoring the retry backoff; /dashboard
+    # keeps serving the current payload
+    started = refresh_fraud_data(blocking=False)
+    return {"status": "refreshing" if started else "already_refreshing", "lastError": cache_error}
+
+@app.post("/api/score-claims")
+def score_new_claims(claims: list[dict], explain: bool = False):
+    # Incremental scoring against the loaded artifact; no refit
+    if claim_scorer is None:
+        raise HTTPException(status_code=503, detail="No model artifact loaded")
+    try:
+        scored = claim_scorer.score_claims(pd.DataFrame(claims), explain=explain)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+    id_cols = [col for col in ['ClaimID', 'Provider'] if col in scored.columns]
+    output_cols = ['AnomalyScore', 'AnomalyFlag', 'RiskScore'] + (['Explanation'] if explain else [])
+    output = scored[id_cols + output_cols]
+    return json.loads(output.to_json(orient="records"))
+
+@app.get("/api/drift")
+def get_drift():
+    # Drift of every claim scored since the artifact was loaded
+    if claim_scorer is None:
+        raise HTTPException(status_code=503, detail="No model artifact loaded")
+    try:
+        return claim_scorer.drift_summary()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@app.post("/api/drift")
+def check_drift(claims: list[dict]):
+    # Drift of one batch on its own; nothing is scored or recorded
+    if claim_scorer is None:
+        raise HTTPException(status_code=503, detail="No model artifact loaded")
+    try:
+        return claim_scorer.drift_summary(pd.DataFrame(claims))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def match_and_record_hashes(ph1, dh1, wh1, claim_id=None, provider_id=None):
+    # Best match against the history, then add the upload to it, atomically.
+    # The match is taken BEFORE adding so we don't just match ourselves
+    with historical_hashes_lock:
+        highest_similarity, best_match = historical_hashes.match_and_add(
+            ph1, dh1, wh1, IMAGE_MATCH_MIN_SIMILARITY, claim_id=claim_id, provider_id=provider_id
+        )
+        matched = None
+        if best_match is not None and isinstance(historical_hashes, StoredImageHashIndex):
+            matched = historical_hashes.metadata(best_match)
+    return highest_similarity, matched
+
 @app.post("/api/analyze-image")
-async def analyze_image(file: UploadFile = File(...)):
-    global historical_hashes
-    
-    # Create temp directory
-    os.makedirs("temp_uploads", exist_ok=True)
-    temp_path = os.path.join("temp_uploads", f"{uuid.uuid4()}_{file.filename}")
-    
-    with open(temp_path, "wb") as buffer:
-        buffer.write(await file.read())
+async def analyze_image(file: UploadFile = File(...), claim_id: str = Form(None), provider_id: str = Form(None)):
+    # Shed load before buffering the upload when the pool is saturated
+    try:
+        image_pool.reserve()
+    except ImageAnalysisBusy as e:
+        raise HTTPException(status_code=503, detail=f"Image analysis busy: {e}", headers={"Retry-After": "1"})
 
+    temp_path = None
     try:
-        engine = ImageForensicsEngine()
-        
-        # Extract features of the uploaded image
-        img = engine._load_file_as_image(temp_path)
-        ph1, dh1, wh1 = engine._generate_hashes(img)
+        # Hash from memory; only uploads above the spool limit touch the disk
+        data = await file.read(UPLOAD_SPOOL_LIMIT + 1)
+        if len(data) <= UPLOAD_SPOOL_LIMIT:
+            hash_job = (hash_image_bytes, data, file.filename or "")
+        else:
+            os.makedirs("temp_uploads", exist_ok=True)
+            temp_path = os.path.join("temp_uploads", f"{uuid.uuid4()}_{os.path.basename(file.filename or 'upload')}")
+            with open(temp_path, "wb") as buffer:
+                while data:
+                    buffer.write(data)
+                    data = await file.read(1024 * 1024)
+            hash_job = (hash_image_file, temp_path)
+
+        engine = forensics_engine
         
-        highest_similarity = 0
-        best_match = None
-        
-        # Compare against history dataset
-        for hist in historical_hashes:
-            distances = [
-                engine._hamming_distance(ph1, hist["ph"]),
-                engine._hamming_distance(dh1, hist["dh"]),
-                engine._hamming_distance(wh1, hist["wh"]),
-            ]
-            similarity = engine._calculate_similarity(distances)
-            if similarity > highest_similarity:
-                highest_similarity = similarity
-                best_match = hist
-
-        # Append to our dataset AFTER calculating so we don't just match ourselves
-        historical_hashes.append({
-            "ph": ph1,
-            "dh": dh1,
-            "wh": wh1,
-            "ph_str": str(ph1)
-        })
+        # Extract features of the uploaded image in a worker process
+        ph1, dh1, wh1 = await image_pool.run(*hash_job)
+        highest_similarity, best_match = await run_in_threadpool(
+            match_and_record_hashes, ph1, dh1, wh1, claim_id, provider_id
+        )
         
         risk_score = 0
         if highest_similarity > 0:
@@ -199,15 +402,17 @@ async def analyze_image(file: UploadFile = File(...)):
             "dupScore": highest_similarity,
             "finalRisk": max(risk_score, int(base_if_score * 0.4)), # if duplicate => massive risk, else isolation forest base
             "pHash": str(ph1),
-            "vectorId": f"EMB-2024-{hash(str(ph1)) % 9000 + 1000}"
+            "vectorId": f"EMB-2024-{hash(str(ph1)) % 9000 + 1000}",
+            "matchedClaimId": (best_match["claim_id"] or None) if best_match else None
         }
         
+    except ImageAnalysisWorkerLost as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
         raise HTTPException(status_code=500, detail=f"Image Engine Fault: {str(e)}")
-
-    if os.path.exists(temp_path):
-        os.remove(temp_path)
+    finally:
+        image_pool.release()
+        if temp_path is not None and os.path.exists(temp_path):
+            os.remove(temp_path)
 
     return output
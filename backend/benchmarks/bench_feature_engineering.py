@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Feature Engineering Benchmark
+=============================
+
+Compares fraud_detection_engine.engineer_features against the previous
+copy + groupby/merge implementation on synthetic claims, reporting wall
+time and peak traced memory (tracemalloc) for each row count.
+
+The synthetic claims carry ClmProcedureCode_1, so engineer_features also
+builds the code-mix features. The reference runs the same
+ProviderCodeCounts step, which has no groupby/merge predecessor, so both
+sides do the same work and the speedup only reflects the rewritten steps.
+
+Usage:
+    python benchmarks/bench_feature_engineering.py --rows 1000000 10000000
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from code_features import ProviderCodeCounts
+from fraud_detection_engine import engineer_features
+
+
+CHRONIC_CONDITIONS = [
+    'Alzheimer', 'Heartfailure', 'KidneyDisease', 'Cancer', 'ObstrPulmonary',
+    'Depression', 'Diabetes', 'IschemicHeart', 'Osteoporasis', 'rheumatoidarthritis', 'stroke'
+]
+
+
+def make_claims(n_rows, n_providers=5000, n_procedures=1000, seed=42):
+    """Minimal claim frame with the columns engineer_features reads."""
+    rng = np.random.default_rng(seed)
+    provider_names = np.array([f"PRV{i:06d}" for i in range(n_providers)], dtype=object)
+    df = pd.DataFrame({
+        'Provider': provider_names[rng.integers(0, n_providers, n_rows)],
+        'InscClaimAmtReimbursed': np.round(rng.lognormal(7, 1.2, n_rows)),
+        'PotentialFraud': (rng.random(n_rows) < 0.38).astype(np.int64),
+    })
+    procedures = rng.integers(0, n_procedures, n_rows).astype(np.float64)
+    procedures[rng.random(n_rows) < 0.5] = np.nan
+    df['ClmProcedureCode_1'] = procedures
+    for condition in CHRONIC_CONDITIONS:
+        df[f'ChronicCond_{condition}'] = rng.integers(0, 2, n_rows, dtype=np.int64)
+    return df
+
+
+def legacy_engineer_features(df):
+    """The copy + groupby + merge implementation this benchmark compares against."""
+    df = df.copy()
+    provider_stats = df.groupby('Provider').agg({
+        'InscClaimAmtReimbursed': ['mean', 'count'],
+        'PotentialFraud': 'mean'
+    }).reset_index()
+    provider_stats.columns = ['Provider', 'ProviderAvgClaimAmount',
+                              'ProviderClaimCount', 'ProviderFraudRate']
+    df = df.merge(provider_stats, on='Provider', how='left')
+
+    global_avg = df['InscClaimAmtReimbursed'].mean()
+    df['GlobalAvgClaimAmount'] = global_avg
+    df['ClaimAmountDeviation'] = df['InscClaimAmtReimbursed'] - global_avg
+
+    procedure_col = 'ClmProcedureCode_1'
+    procedure_freq = df.groupby(['Provider', procedure_col]).size().reset_index(name='ProcedureFrequency')
+    df = df.merge(procedure_freq, on=['Provider', procedure_col], how='left')
+
+    # Same code-mix step as engineer_features, so the workloads match
+    _, code_features = ProviderCodeCounts.fit_claim_features(df)
+    for name, values in code_features.items():
+        df[name] = values
+
+    chronic_cols = [col for col in df.columns if col.startswith('ChronicCond_')]
+    df['TotalChronicConditions'] = df[chronic_cols].sum(axis=1)
+    return df
+
+
+def measure(func, df):
+    """Wall time of one run, then peak traced memory of a second run."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func(df)
+        elapsed = time.perf_counter() - start
+        del result
+
+        tracemalloc.start()
+        result = func(df)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    return elapsed, peak
+
+
+def run_benchmark(row_counts, n_providers):
+    results = []
+    for n_rows in row_counts:
+        df = make_claims(n_rows, n_providers=n_providers)
+        input_mb = df.memory_usage(deep=False).sum() / 1e6
+        for name, func in [('legacy', legacy_engineer_features), ('engineer_features', engineer_features)]:
+            elapsed, peak = measure(func, df)
+            results.append({
+                'rows': n_rows,
+                'implementation': name,
+                'seconds': round(elapsed, 3),
+                'peak_mb': round(peak / 1e6, 1),
+                'input_mb': round(input_mb, 1),
+            })
+            print(f"{n_rows:>12,}  {name:<18} {elapsed:8.3f}s  peak {peak / 1e6:9.1f} MB  (input {input_mb:.1f} MB)")
+        del df
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark feature engineering")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--providers", type=int, default=5000)
+    parser.add_argument("--json", help="Write results to this JSON file")
+
+    args = parser.parse_args()
+    results = run_benchmark(args.rows, args.providers)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Flat Isolation Forest Scorer Benchmark
+======================================
+
+Times sklearn IsolationForest.decision_function + predict (two walks of
+the forest, as train_isolation_model used to do) against
+forest_scorer.FlatIsolationForest.score (one walk) for 1-row, 1k-row and
+1M-row batches, and checks that scores and flags agree.
+
+Usage:
+    python benchmarks/bench_forest_scorer.py --batches 1 1000 1000000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from forest_scorer import FlatIsolationForest
+
+
+def best_of(func, repeats):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmark(batch_sizes, n_features=11, n_estimators=200, train_rows=100_000, seed=42):
+    rng = np.random.default_rng(seed)
+    model = IsolationForest(n_estimators=n_estimators, contamination=0.1, random_state=seed)
+    model.fit(rng.normal(size=(train_rows, n_features)))
+
+    start = time.perf_counter()
+    flat = FlatIsolationForest.from_model(model)
+    export_seconds = time.perf_counter() - start
+    print(f"Exported {n_estimators} trees ({len(flat.feature):,} nodes) in {export_seconds * 1000:.1f} ms")
+
+    results = []
+    for batch in batch_sizes:
+        X = rng.normal(size=(batch, n_features))
+        repeats = 20 if batch <= 1000 else 1
+
+        def sklearn_score():
+            return model.decision_function(X), np.where(model.predict(X) == -1, 1, 0)
+
+        sklearn_seconds = best_of(sklearn_score, repeats)
+        flat_seconds = best_of(lambda: flat.score(X), repeats)
+
+        expected_scores, expected_flags = sklearn_score()
+        scores, flags = flat.score(X)
+        results.append({
+            'batch_rows': batch,
+            'sklearn_seconds': round(sklearn_seconds, 6),
+            'flat_seconds': round(flat_seconds, 6),
+            'speedup': round(sklearn_seconds / flat_seconds, 2),
+            'max_abs_score_diff': float(np.abs(scores - expected_scores).max()),
+            'flags_equal': bool(np.array_equal(flags, expected_flags)),
+        })
+        print(f"{batch:>10,} rows  sklearn {sklearn_seconds * 1000:10.2f} ms  "
+              f"flat {flat_seconds * 1000:10.2f} ms  x{sklearn_seconds / flat_seconds:6.2f}  "
+              f"max|diff| {results[-1]['max_abs_score_diff']:.1e}")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the flat Isolation Forest scorer")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 1000, 1_000_000])
+    parser.add_argument("--estimators", type=int, default=200)
+    parser.add_argument("--json", help="Write results to this JSON file")
+
+    args = parser.parse_args()
+    results = run_benchmark(args.batches, n_estimators=args.estimators)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Sharded Isolation Forest Training Scaling Benchmark
+===================================================
+
+Times sharded_training.train_sharded_isolation_forest across row counts
+(1M to 50M+) and worker counts (1 to N cores), against a single-process
+sklearn IsolationForest fit on the same matrix.
+
+The feature matrix is synthetic standard-normal float32 data with a small
+shifted anomaly cluster, generated in chunks so 50M x 11 stays ~2.2 GB.
+
+Usage:
+    python benchmarks/bench_sharded_training.py --rows 1m 10m 50m --workers 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from run_benchmarks import environment_info
+from sharded_training import train_sharded_isolation_forest
+from synthetic_claims import parse_row_count
+
+
+def synthetic_matrix(n_rows, n_features=11, anomaly_rate=0.01, seed=42, chunk_rows=1_000_000):
+    """Float32 feature matrix with a shifted anomaly cluster, built chunk by chunk."""
+    rng = np.random.default_rng(seed)
+    X = np.empty((n_rows, n_features), dtype=np.float32)
+    for start in range(0, n_rows, chunk_rows):
+        stop = min(start + chunk_rows, n_rows)
+        X[start:stop] = rng.standard_normal((stop - start, n_features), dtype=np.float32)
+        anomalies = rng.random(stop - start) < anomaly_rate
+        X[start:stop][anomalies] += 4.0
+    return X
+
+
+def run_benchmark(row_counts, worker_counts, n_estimators=200, contamination=0.01, baseline=True):
+    results = []
+    for n_rows in row_counts:
+        X = synthetic_matrix(n_rows)
+        print(f"\n{n_rows:,} rows")
+
+        if baseline:
+            start = time.perf_counter()
+            IsolationForest(n_estimators=n_estimators, contamination=contamination,
+                            random_state=42, n_jobs=1).fit(X)
+            seconds = time.perf_counter() - start
+            results.append({'rows': n_rows, 'mode': 'sklearn', 'workers': 1, 'fit_seconds': round(seconds, 3)})
+            print(f"  sklearn single process   {seconds:9.2f}s")
+
+        for workers in worker_counts:
+            start = time.perf_counter()
+            train_sharded_isolation_forest(X, n_estimators=n_estimators, contamination=contamination,
+                                           n_shards=workers, workers=workers)
+            seconds = time.perf_counter() - start
+            results.append({'rows': n_rows, 'mode': 'sharded', 'workers': workers, 'fit_seconds': round(seconds, 3)})
+            print(f"  sharded, {workers:>3} workers      {seconds:9.2f}s")
+        del X
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sharded Isolation Forest training")
+    parser.add_argument("--rows", nargs="+", default=["1m", "10m", "50m"], help="Row counts, e.g. 1m 10m 50m")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--estimators", type=int, default=200)
+    parser.add_argument("--no-baseline", action="store_true", help="Skip the single-process sklearn fit")
+    parser.add_argument("--json", help="Write results to this JSON file")
+
+    args = parser.parse_args()
+    results = run_benchmark([parse_row_count(r) for r in args.rows], args.workers,
+                            n_estimators=args.estimators, baseline=not args.no_baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"environment": environment_info(), "results": results}, f, indent=2)
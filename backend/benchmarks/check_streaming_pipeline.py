@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Streaming vs. In-Memory Pipeline Check
+======================================
+
+Runs streaming_pipeline.run_streaming_pipeline and
+fraud_detection_engine.run_pipeline on the same synthetic CSV and checks
+that they agree: every model feature column for every claim, and, since
+the streaming sample is sized to hold every claim, the RiskScore and
+AnomalyFlag of each claim. Several chunk sizes are checked, so features
+that only looked within a chunk would show up as mismatches.
+
+Exits with status 1 on any mismatch.
+
+Usage:
+    python benchmarks/check_streaming_pipeline.py --rows 50k --chunksizes 7000 50000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from fraud_detection_engine import run_pipeline
+from streaming_pipeline import run_streaming_pipeline
+from synthetic_claims import generate_claims, parse_row_count, write_claims
+
+
+def compare_columns(expected, actual, columns, rtol=1e-5, atol=1e-6):
+    """Largest absolute difference and mismatch count per column."""
+    report = []
+    for col in columns:
+        a = expected[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        b = actual[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        close = np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+        diff = np.abs(a - b)
+        report.append({
+            'column': col,
+            'max_abs_diff': float(np.nanmax(diff)) if np.isfinite(diff).any() else 0.0,
+            'mismatches': int((~close).sum()),
+        })
+    return pd.DataFrame(report)
+
+
+def check_streaming_pipeline(n_rows, chunksizes, n_providers, seed, workdir):
+    """
+    Compare both pipelines on one synthetic dataset.
+
+    Returns:
+    --------
+    bool
+        True if every chunk size matched
+    """
+    claims = generate_claims(n_rows, n_providers=n_providers, seed=seed, as_strings=True)
+    data_path = write_claims(claims, os.path.join(workdir, "claims.csv"))
+    del claims
+
+    expected = run_pipeline(data_path, verbose=0, explain_top_n=0)
+    feature_columns = list(expected["feature_columns"])
+    expected_df = expected["df"]
+
+    passed = True
+    for chunksize in chunksizes:
+        output_path = os.path.join(workdir, f"streaming_{chunksize}.csv")
+        results = run_streaming_pipeline(data_path, output_path, chunksize=chunksize,
+                                         sample_size=n_rows, verbose=0)
+        actual_df = pd.read_csv(output_path)
+
+        same_features = list(results["feature_columns"]) == feature_columns
+        report = compare_columns(expected_df, actual_df, feature_columns + ['RiskScore', 'AnomalyFlag'])
+        ok = same_features and len(actual_df) == len(expected_df) and report['mismatches'].sum() == 0
+        passed &= ok
+
+        print(f"\nchunksize {chunksize:,}: {'OK' if ok else 'MISMATCH'}")
+        if not same_features:
+            print(f"  feature columns differ:\n    run_pipeline: {feature_columns}\n"
+                  f"    streaming:    {list(results['feature_columns'])}")
+        print(report.to_string(index=False))
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the streaming pipeline against run_pipeline")
+    parser.add_argument("--rows", default="50k", help="Number of claims (e.g. 20k, 200k)")
+    parser.add_argument("--chunksizes", type=int, nargs="+", default=[7_000, 50_000])
+    parser.add_argument("--providers", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        passed = check_streaming_pipeline(parse_row_count(args.rows), args.chunksizes,
+                                          args.providers, args.seed, workdir)
+    print("\n✓ Streaming pipeline matches run_pipeline" if passed else "\n✗ Streaming pipeline differs")
+    sys.exit(0 if passed else 1)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Detection Pipeline Benchmark Suite
+==================================
+
+Generates synthetic Kaggle-schema claims at each requested size, runs the
+end-to-end fraud_detection_engine.run_pipeline on them and records the
+per-stage timing and memory reported by the pipeline instrumentation.
+
+Results are written as JSON together with the commit and library versions
+so runs can be compared between commits:
+
+    python benchmarks/run_benchmarks.py --sizes 10k 1m --output bench_main.json
+    python benchmarks/run_benchmarks.py --sizes 10k 1m --output bench_branch.json \\
+        --compare bench_main.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from fraud_detection_engine import run_pipeline
+from synthetic_claims import generate_claims, parse_row_count, write_claims
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL,
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info():
+    """Commit, interpreter, library versions and core count for a result file."""
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+
+
+def benchmark_size(n_rows, n_providers, fraud_rate, seed, trace_memory, workdir):
+    """Generate one dataset, run the pipeline on it and return its result record."""
+    start = time.perf_counter()
+    claims = generate_claims(n_rows, n_providers=n_providers, fraud_rate=fraud_rate, seed=seed)
+    data_path = write_claims(claims, os.path.join(workdir, f"claims_{n_rows}.feather"))
+    del claims
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = run_pipeline(data_path, columns="pipeline", verbose=0, trace_memory=trace_memory)
+    total_seconds = time.perf_counter() - start
+    os.remove(data_path)
+
+    metrics = results["metrics"]
+    return {
+        "rows": n_rows,
+        "providers": n_providers,
+        "fraud_rate": fraud_rate,
+        "generate_seconds": round(generate_seconds, 3),
+        "pipeline_seconds": round(total_seconds, 3),
+        "claims_per_second": round(n_rows / total_seconds, 1),
+        "stages": results["stage_metrics"],
+        "quality": {
+            "precision": float(metrics["precision"]),
+            "recall": float(metrics["recall"]),
+            "f1_score": float(metrics["f1_score"]),
+            "average_precision": float(metrics["ranking"]["average_precision"]),
+        },
+    }
+
+
+def print_results(results, baseline=None):
+    """Print per-stage wall times, with the change against a baseline run."""
+    baseline_stages = {}
+    for record in (baseline or {}).get("results", []):
+        for stage in record["stages"]:
+            baseline_stages[(record["rows"], stage["stage"])] = stage["wall_time_s"]
+        baseline_stages[(record["rows"], "total")] = record["pipeline_seconds"]
+
+    for record in results:
+        print(f"\n{record['rows']:,} claims  (F1 {record['quality']['f1_score']:.3f})")
+        rows = [(stage["stage"], stage["wall_time_s"]) for stage in record["stages"]]
+        rows.append(("total", record["pipeline_seconds"]))
+        for name, seconds in rows:
+            line = f"  {name:<30}{seconds:>10.3f}s"
+            previous = baseline_stages.get((record["rows"], name))
+            if previous:
+                line += f"  ({(seconds - previous) / previous * 100:+.1f}% vs baseline)"
+            print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the fraud detection pipeline")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1m"], help="Row counts, e.g. 10k 1m 10m")
+    parser.add_argument("--providers", type=int, default=5000)
+    parser.add_argument("--fraud-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--trace-memory", action="store_true", help="Record peak traced memory per stage")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against")
+
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            n_rows = parse_row_count(size)
+            print(f"Benchmarking {n_rows:,} claims...")
+            results.append(benchmark_size(
+                n_rows, args.providers, args.fraud_rate, args.seed, args.trace_memory, workdir
+            ))
+
+    report = {"environment": environment_info(), "results": results}
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    print(f"\nResults written to {args.output}")
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Incremental Claim Scoring
+=========================
+
+Scores new claims against an already-fitted model artifact without
+refitting. Provider, procedure and global claim statistics are kept as
+running (count, sum, M2) state and merged batch by batch, so each call
+costs time proportional to the batch rather than the training set. The
+sparse provider × code counts behind the code-mix features are grown the
+same way. Near-duplicate scores, stay overlaps and claim velocity are
+computed against the recent claims kept for them as well as within the
+batch (duplicate_claims.ClaimSignatureIndex,
+stay_overlaps.BeneficiaryStays, temporal_features.ProviderClaimWindows).
+Provider network features come from the graph at training time and are
+not refreshed by updates.
+
+Usage:
+    from claim_scoring import score_claims
+    scored = score_claims(new_claims_df)
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+from claim_explanations import explain_claims
+from code_features import CODE_FEATURE_COLUMNS, ProviderCodeCounts, has_code_columns
+from drift_monitor import DriftMonitor
+from duplicate_claims import DUPLICATE_SCORE_COLUMN, ClaimSignatureIndex, duplicate_claim_scores
+from stay_overlaps import OVERLAP_FEATURE_COLUMNS, BeneficiaryStays, stay_overlap_features
+from provider_network import NETWORK_FEATURE_COLUMNS, network_claim_features
+from temporal_features import (
+    DATE_COLUMN,
+    TEMPORAL_FEATURE_COLUMNS,
+    ProviderClaimWindows,
+    temporal_claim_features,
+)
+from fraud_detection_engine import score_isolation_model, transform_with_fitted_scaler
+from model_artifact import DEFAULT_ARTIFACT_PATH, load_model_artifact
+from risk_calibration import ScoreCalibration
+
+
+PROCEDURE_COLUMN = 'ClmProcedureCode_1'
+
+# Features computed against the claim history rather than the aggregates
+CROSS_CLAIM_FEATURE_COLUMNS = [DUPLICATE_SCORE_COLUMN] + OVERLAP_FEATURE_COLUMNS + TEMPORAL_FEATURE_COLUMNS
+
+
+def _merge_moments(count_a, mean_a, m2_a, count_b, mean_b, m2_b):
+    """
+    Combine two sets of (count, mean, M2) moments (Chan et al.).
+
+    Works element-wise on numpy arrays as well as on scalars.
+    """
+    count = count_a + count_b
+    safe_count = np.where(count > 0, count, 1)
+    delta = mean_b - mean_a
+    mean = mean_a + delta * count_b / safe_count
+    m2 = m2_a + m2_b + delta ** 2 * count_a * count_b / safe_count
+    return count, mean, m2
+
+
+class ClaimAggregates:
+    """
+    Running provider, procedure and global claim statistics.
+
+    Holds exactly the state engineer_features derives from the full
+    dataset, but can be built up batch by batch with ``update``.
+
+    Parameters:
+    -----------
+    claim_history : bool
+        Keep the recent claims that cross-claim features are matched
+        against. Off when those features are computed elsewhere, as in
+        the streaming pipeline.
+    """
+
+    def __init__(self, claim_history=True):
+        self.provider_index = pd.Index(np.array([], dtype=object), name='Provider')
+        self.provider_count = np.zeros(0, dtype=np.int64)
+        self.provider_mean = np.zeros(0, dtype=np.float64)
+        self.provider_m2 = np.zeros(0, dtype=np.float64)
+
+        self.procedure_index = pd.MultiIndex.from_arrays(
+            [np.array([], dtype=object), np.array([], dtype=np.float64)],
+            names=['Provider', PROCEDURE_COLUMN],
+        )
+        self.procedure_count = np.zeros(0, dtype=np.int64)
+
+        self.code_counts = ProviderCodeCounts()
+        self.provider_network = None
+        self.claim_history = claim_history
+        self.signatures = ClaimSignatureIndex()
+        self.stays = BeneficiaryStays()
+        self.windows = ProviderClaimWindows()
+
+        self.global_count = 0
+        self.global_mean = 0.0
+        self.global_m2 = 0.0
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """
+        Seed the state from a model artifact.
+
+        Arrays are copied so that memory-mapped (read-only) artifact arrays
+        can be updated in place.
+        """
+        aggregates = cls()
+
+        providers = artifact["provider_aggregates"]
+        aggregates.provider_index = pd.Index(providers["providers"], name='Provider')
+        aggregates.provider_count = np.array(providers["claim_count"], dtype=np.int64)
+        aggregates.provider_mean = np.array(providers["claim_amount_sum"], dtype=np.float64) / np.maximum(
+            aggregates.provider_count, 1
+        )
+        aggregates.provider_m2 = np.array(providers["claim_amount_m2"], dtype=np.float64)
+
+        procedures = artifact.get("procedure_frequency")
+        if procedures is not None:
+            aggregates.procedure_index = pd.MultiIndex.from_arrays(
+                [procedures["providers"], np.asarray(procedures["procedures"])],
+                names=['Provider', PROCEDURE_COLUMN],
+            )
+            aggregates.procedure_count = np.array(procedures["claim_count"], dtype=np.int64)
+
+        aggregates.code_counts = ProviderCodeCounts.from_dict(artifact.get("provider_code_counts"))
+        aggregates.signatures = ClaimSignatureIndex.from_dict(artifact.get("claim_signatures"))
+        aggregates.stays = BeneficiaryStays.from_dict(artifact.get("beneficiary_stays"))
+        aggregates.windows = ProviderClaimWindows.from_dict(artifact.get("claim_windows"))
+
+        network = artifact.get("provider_network")
+        if network is not None:
+            aggregates.provider_network = pd.DataFrame(
+                {name: np.array(network[name]) for name in NETWORK_FEATURE_COLUMNS},
+                index=pd.Index(network["providers"], name='Provider'),
+            )
+
+        stats = artifact["global_claim_stats"]
+        aggregates.global_count = int(stats["count"])
+        aggregates.global_mean = stats["sum"] / stats["count"] if stats["count"] else 0.0
+        aggregates.global_m2 = float(stats["m2"])
+        return aggregates
+
+    # --------------------------------------------
+    # Running aggregate updates
+    # --------------------------------------------
+    def update(self, claims):
+        """
+        Fold a batch of claims into the running statistics and claim history.
+
+        To score the same batch, use build_features(claims, update=True):
+        its cross-claim features must be computed before the batch joins
+        the history, or each claim would be matched against itself.
+        """
+        if len(claims) == 0:
+            return
+        self._update_providers(claims)
+        if PROCEDURE_COLUMN in claims.columns:
+            self._update_procedures(claims)
+        if has_code_columns(claims.columns):
+            self.code_counts.update(claims)
+        if self.claim_history and 'BeneID' in claims.columns:
+            self.signatures.update(claims)
+            self.stays.update(claims)
+        if self.claim_history and 'ClaimStartDt' in claims.columns:
+            self.windows.update(claims)
+        self._update_global(claims)
+
+    def _update_providers(self, claims):
+        batch = claims.groupby('Provider', sort=False)['InscClaimAmtReimbursed'].agg(['count', 'mean', 'var'])
+        batch_count = batch['count'].to_numpy(dtype=np.int64)
+        batch_mean = batch['mean'].fillna(0).to_numpy(dtype=np.float64)
+        batch_m2 = batch['var'].fillna(0).to_numpy(dtype=np.float64) * np.maximum(batch_count - 1, 0)
+
+        positions = self.provider_index.get_indexer(batch.index)
+        new = positions == -1
+        if new.any():
+            start = len(self.provider_index)
+            self.provider_index = self.provider_index.append(batch.index[new])
+            n_new = int(new.sum())
+            self.provider_count = np.concatenate([self.provider_count, np.zeros(n_new, dtype=np.int64)])
+            self.provider_mean = np.concatenate([self.provider_mean, np.zeros(n_new)])
+            self.provider_m2 = np.concatenate([self.provider_m2, np.zeros(n_new)])
+            positions[new] = np.arange(start, start + n_new)
+
+        count, mean, m2 = _merge_moments(
+            self.provider_count[positions], self.provider_mean[positions], self.provider_m2[positions],
+            batch_count, batch_mean, batch_m2,
+        )
+        self.provider_count[positions] = count
+        self.provider_mean[positions] = mean
+        self.provider_m2[positions] = m2
+
+    def _update_procedures(self, claims):
+        batch = claims.groupby(['Provider', PROCEDURE_COLUMN], sort=False).size()
+        positions = self.procedure_index.get_indexer(batch.index)
+        new = positions == -1
+        if new.any():
+            start = len(self.procedure_index)
+            self.procedure_index = self.procedure_index.append(batch.index[new])
+            n_new = int(new.sum())
+            self.procedure_count = np.concatenate([self.procedure_count, np.zeros(n_new, dtype=np.int64)])
+            positions[new] = np.arange(start, start + n_new)
+        self.procedure_count[positions] += batch.to_numpy(dtype=np.int64)
+
+    def _update_global(self, claims):
+        amounts = claims['InscClaimAmtReimbursed'].dropna().to_numpy(dtype=np.float64)
+        if len(amounts) == 0:
+            return
+        batch_mean = amounts.mean()
+        batch_m2 = float(((amounts - batch_mean) ** 2).sum())
+        self.global_count, self.global_mean, self.global_m2 = _merge_moments(
+            self.global_count, self.global_mean, self.global_m2,
+            len(amounts), batch_mean, batch_m2,
+        )
+
+    # --------------------------------------------
+    # Feature construction
+    # --------------------------------------------
+    def build_features(self, claims, cross_claim_features=None, update=False):
+        """
+        Engineered features for a batch, mirroring engineer_features.
+
+        Parameters:
+        -----------
+        claims : pd.DataFrame
+            Claim batch
+        cross_claim_features : dict, optional
+            Duplicate score, stay overlap and claim velocity columns aligned
+            with claims, already computed over the full claim set (as the
+            streaming pipeline does); computed here otherwise, against the
+            claim history and the batch itself
+        update : bool
+            Fold the batch into the state (see update) once its cross-claim
+            features are computed, so the other features include it
+
+        Returns:
+        --------
+        pd.DataFrame
+            The claims with the engineered feature columns added
+        """
+        if cross_claim_features is None:
+            cross_claim_features = self._cross_claim_features(claims)
+        if update:
+            self.update(claims)
+        features = claims.copy()
+
+        positions = self.provider_index.get_indexer(features['Provider'])
+        known = positions >= 0
+        features['ProviderAvgClaimAmount'] = np.where(known, self.provider_mean[positions], np.nan)
+        features['ProviderClaimCount'] = np.where(known, self.provider_count[positions], 0)
+        features['ClaimAmountDeviation'] = features['InscClaimAmtReimbursed'] - self.global_mean
+
+        if PROCEDURE_COLUMN in features.columns:
+            keys = pd.MultiIndex.from_arrays(
+                [features['Provider'], features[PROCEDURE_COLUMN]],
+                names=['Provider', PROCEDURE_COLUMN],
+            )
+            proc_positions = self.procedure_index.get_indexer(keys)
+            features['ProcedureFrequency'] = np.where(
+                proc_positions >= 0, self.procedure_count[proc_positions], np.nan
+            )
+        else:
+            features['ProcedureFrequency'] = 1
+
+        if len(self.code_counts):
+            for name, values in self.code_counts.claim_features(features).items():
+                features[name] = values
+
+        for name, values in cross_claim_features.items():
+            features[name] = values
+
+        if self.provider_network is not None:
+            for name, values in network_claim_features(features, self.provider_network).items():
+                features[name] = values
+
+        chronic_cols = [col for col in features.columns if col.startswith('ChronicCond_')]
+        features['TotalChronicConditions'] = features[chronic_cols].sum(axis=1) if chronic_cols else 0
+        return features
+
+    def _cross_claim_features(self, claims):
+        """Duplicate score, stay overlap and claim velocity columns for a batch."""
+        features = {}
+        if 'BeneID' in claims.columns:
+            if self.claim_history:
+                features[DUPLICATE_SCORE_COLUMN] = self.signatures.claim_features(claims)
+                features.update(self.stays.claim_features(claims))
+            else:
+                features[DUPLICATE_SCORE_COLUMN] = duplicate_claim_scores(claims)
+                features.update(stay_overlap_features(claims))
+        else:
+            features[DUPLICATE_SCORE_COLUMN] = 0.0
+            features['OverlappingStayCount'] = 0.0
+            features['ProviderOverlapRate'] = 0.0
+
+        if 'ClaimStartDt' in claims.columns:
+            if self.claim_history:
+                features.update(self.windows.claim_features(claims))
+            else:
+                features.update(temporal_claim_features(claims))
+        else:
+            # Undated claims look like a provider's only recent claim
+            for name in ['ClaimCount7d', 'ClaimCount30d', 'ClaimBurstScore']:
+                features[name] = 1.0
+            features['ClaimAmount7d'] = claims['InscClaimAmtReimbursed']
+            features['ClaimAmount30d'] = claims['InscClaimAmtReimbursed']
+        return features
+
+    @staticmethod
+    def defaulted_features(columns):
+        """
+        Features build_features fills with constant defaults for a batch with these columns.
+
+        The raw columns behind them are missing, so the values say nothing
+        about the claims (drift monitoring skips them).
+        """
+        defaulted = []
+        if 'BeneID' not in columns:
+            defaulted += [DUPLICATE_SCORE_COLUMN] + OVERLAP_FEATURE_COLUMNS
+        if DATE_COLUMN not in columns:
+            defaulted += TEMPORAL_FEATURE_COLUMNS
+        if PROCEDURE_COLUMN not in columns:
+            defaulted.append('ProcedureFrequency')
+        if not has_code_columns(columns):
+            defaulted += CODE_FEATURE_COLUMNS
+        if not any(col.startswith('ChronicCond_') for col in columns):
+            defaulted.append('TotalChronicConditions')
+        return defaulted
+
+    # --------------------------------------------
+    # Export
+    # --------------------------------------------
+    def provider_statistics(self):
+        """Current per-provider claim count, mean and standard deviation."""
+        count = self.provider_count.copy()
+        return pd.DataFrame({
+            'Provider': self.provider_index,
+            'ClaimCount': count,
+            'AvgClaimAmount': self.provider_mean.copy(),
+            'ClaimAmountStd': np.sqrt(self.provider_m2 / np.maximum(count - 1, 1)),
+        })
+
+    def to_artifact_fields(self):
+        """Artifact entries describing this state (see model_artifact)."""
+        fields = {
+            "provider_aggregates": {
+                "providers": self.provider_index.to_numpy(dtype=object),
+                "claim_count": self.provider_count.copy(),
+                "claim_amount_sum": self.provider_mean * self.provider_count,
+                "claim_amount_m2": self.provider_m2.copy(),
+            },
+            "procedure_frequency": None,
+            "provider_code_counts": self.code_counts.to_dict() if len(self.code_counts) else None,
+            "provider_network": None,
+            "claim_signatures": self.signatures.to_dict() if self.claim_history else None,
+            "beneficiary_stays": self.stays.to_dict() if self.claim_history else None,
+            "claim_windows": self.windows.to_dict() if self.claim_history else None,
+            "global_claim_stats": {
+                "count": int(self.global_count),
+                "sum": float(self.global_mean * self.global_count),
+                "m2": float(self.global_m2),
+            },
+            "global_avg_claim_amount": float(self.global_mean),
+        }
+        if self.provider_network is not None:
+            fields["provider_network"] = {
+                "providers": self.provider_network.index.to_numpy(dtype=object),
+                **{name: self.provider_network[name].to_numpy() for name in NETWORK_FEATURE_COLUMNS},
+            }
+        if len(self.procedure_index):
+            fields["procedure_frequency"] = {
+                "providers": self.procedure_index.get_level_values(0).to_numpy(dtype=object),
+                "procedures": self.procedure_index.get_level_values(1).to_numpy(),
+                "claim_count": self.procedure_count.copy(),
+            }
+        return fields
+
+
+class ClaimScorer:
+    """
+    Scores claim batches with a fitted artifact and running aggregates.
+
+    Parameters:
+    -----------
+    artifact : dict
+        Model artifact from model_artifact.load_model_artifact
+    """
+
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.aggregates = ClaimAggregates.from_artifact(artifact)
+        self.calibration = ScoreCalibration.from_dict(artifact["score_calibration"])
+        reference = artifact.get("feature_reference")
+        self.drift_monitor = DriftMonitor(reference) if reference is not None else None
+        self._lock = threading.Lock()
+
+    # --------------------------------------------
+    # PUBLIC METHODS
+    # --------------------------------------------
+    def score_claims(self, new_claims_df, update=True, explain=False):
+        """
+        Score a batch of new claims.
+
+        Parameters:
+        -----------
+        new_claims_df : pd.DataFrame
+            Claims with at least Provider and InscClaimAmtReimbursed plus the
+            raw columns behind the model features
+        update : bool
+            Fold the batch into the running aggregates before scoring, the
+            same way a full retrain would see it. A batch that fails
+            validation is never folded in. Set False to score against the
+            current state without changing it.
+        explain : bool
+            Add an Explanation column with the top contributing features
+            of each flagged claim (empty for the others)
+
+        Returns:
+        --------
+        pd.DataFrame
+            The claims with engineered features, AnomalyScore, AnomalyFlag
+            and the calibrated 0-100 RiskScore
+
+        Raises:
+        -------
+        ValueError
+            If the batch lacks Provider, InscClaimAmtReimbursed or the
+            columns behind a model feature
+        """
+        missing = [col for col in ['Provider', 'InscClaimAmtReimbursed'] if col not in new_claims_df.columns]
+        if missing:
+            raise ValueError(f"Missing required columns: {missing}")
+
+        scaler_args = (self.artifact["feature_columns"], self.artifact["fill_values"], self.artifact["scaler"])
+        with self._lock:
+            # Validate against the current state first, so a rejected batch changes nothing
+            features = self.aggregates.build_features(new_claims_df)
+            X_scaled = transform_with_fitted_scaler(features, *scaler_args)
+            if update:
+                cross_claim_features = {name: features[name].to_numpy() for name in CROSS_CLAIM_FEATURE_COLUMNS}
+                features = self.aggregates.build_features(new_claims_df, cross_claim_features, update=True)
+                X_scaled = transform_with_fitted_scaler(features, *scaler_args)
+            if self.drift_monitor is not None:
+                self.drift_monitor.update(features, self.artifact["fill_values"],
+                                          skip=self.aggregates.defaulted_features(new_claims_df.columns))
+
+        anomaly_scores, anomaly_flags = score_isolation_model(self.artifact["model"], X_scaled)
+
+        features['AnomalyScore'] = anomaly_scores
+        features['AnomalyFlag'] = anomaly_flags
+        features['RiskScore'] = self.calibration.transform(anomaly_scores)
+        if explain:
+            explanations = explain_claims(
+                self.artifact["model"], X_scaled, self.artifact["feature_columns"], anomaly_scores,
+                rows=np.flatnonzero(anomaly_flags), top_n=None,
+            )
+            explanation = np.full(len(features), '', dtype=object)
+            explanation[explanations['Row'].to_numpy()] = explanations['Explanation'].to_numpy()
+            features['Explanation'] = explanation
+        return features
+
+    def provider_statistics(self):
+        """Current per-provider claim count, mean and standard deviation."""
+        with self._lock:
+            return self.aggregates.provider_statistics()
+
+    def drift_summary(self, claims_df=None):
+        """
+        Feature drift against the training reference.
+
+        Parameters:
+        -----------
+        claims_df : pd.DataFrame, optional
+            Batch to check on its own, without scoring it or updating any
+            state. By default, drift of every claim scored so far.
+
+        Returns:
+        --------
+        dict
+            See drift_monitor.DriftMonitor.summary
+
+        Raises:
+        -------
+        ValueError
+            If the artifact has no feature reference, or claims_df lacks
+            the columns behind a model feature
+        """
+        if self.drift_monitor is None:
+            raise ValueError("Model artifact has no feature reference for drift monitoring")
+        with self._lock:
+            if claims_df is None:
+                return self.drift_monitor.summary()
+            features = self.aggregates.build_features(claims_df)
+            counts = self.drift_monitor.batch_counts(features, self.artifact["fill_values"],
+                                                     skip=self.aggregates.defaulted_features(claims_df.columns))
+        return self.drift_monitor.summary(counts)
+
+    def export_artifact(self):
+        """Copy of the artifact with the running aggregates folded in."""
+        with self._lock:
+            artifact = dict(self.artifact)
+            artifact.update(self.aggregates.to_artifact_fields())
+            return artifact
+
+
+_default_scorer = None
+
+
+def get_default_scorer(artifact_path=DEFAULT_ARTIFACT_PATH):
+    """Lazily load the shared scorer from the default artifact."""
+    global _default_scorer
+    if _default_scorer is None:
+        _default_scorer = ClaimScorer(load_model_artifact(artifact_path))
+    return _default_scorer
+
+
+def score_claims(new_claims_df, scorer=None, update=True, explain=False):
+    """
+    Score new claims against the fitted model, updating running aggregates.
+
+    Parameters:
+    -----------
+    new_claims_df : pd.DataFrame
+        Batch of new claims
+    scorer : ClaimScorer, optional
+        Scorer to use; defaults to one loaded from the default artifact
+    update : bool
+        See ClaimScorer.score_claims
+    explain : bool
+        See ClaimScorer.score_claims
+
+    Returns:
+    --------
+    pd.DataFrame
+        Scored claims
+    """
+    if scorer is None:
+        scorer = get_default_scorer()
+    return scorer.score_claims(new_claims_df, update=update, explain=explain)
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Procedure and Diagnosis Code-Mix Features
+=========================================
+
+Counts how often each provider bills each procedure and diagnosis code in
+a sparse CSR provider × code matrix, built from all ClmProcedureCode_* and
+ClmDiagnosisCode_* columns at once. Memory is proportional to the number
+of distinct (provider, code) pairs, not providers × codes.
+
+Derived features:
+    CodeFrequency           Mean share of the provider's coding taken up by
+                            each of the claim's codes
+    CodeRarity              Mean smoothed inverse provider frequency
+                            (log((1 + providers) / (1 + providers using code)))
+                            of the claim's codes
+    ProviderCodeDivergence  KL divergence of the provider's code mix from
+                            the pooled code mix of all providers
+
+The matrix can be grown batch by batch with ``update``; new providers and
+codes are appended as new rows and columns.
+
+Usage:
+    counts, features = ProviderCodeCounts.fit_claim_features(df)
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# Code column families, as (family label, column prefix)
+CODE_FAMILIES = [
+    ('procedure', 'ClmProcedureCode_'),
+    ('diagnosis', 'ClmDiagnosisCode_'),
+]
+
+CODE_FEATURE_COLUMNS = ['CodeFrequency', 'CodeRarity', 'ProviderCodeDivergence']
+
+
+def is_code_column(column):
+    """True for ClmProcedureCode_* and ClmDiagnosisCode_* columns."""
+    return any(column.startswith(prefix) for _, prefix in CODE_FAMILIES)
+
+
+def has_code_columns(columns):
+    """True if any procedure or diagnosis code column is present."""
+    return any(is_code_column(col) for col in columns)
+
+
+class ProviderCodeCounts:
+    """
+    Sparse provider × code claim-count matrix with its row and column labels.
+
+    Rows follow ``providers``; columns follow ``vocabulary``, a
+    (family, code) MultiIndex, so a procedure and a diagnosis code with the
+    same value stay separate.
+    """
+
+    def __init__(self):
+        self.providers = pd.Index(np.array([], dtype=object), name='Provider')
+        self.vocabulary = pd.MultiIndex.from_arrays(
+            [np.array([], dtype=object), np.array([], dtype=object)], names=['Family', 'Code']
+        )
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.float64)
+        self._stats = None
+
+    @classmethod
+    def fit_claim_features(cls, claims):
+        """
+        Build counts from a claim set and return its per-claim features.
+
+        Returns:
+        --------
+        tuple
+            (ProviderCodeCounts, dict of feature name -> float32 array)
+        """
+        counts = cls()
+        codes = counts._claim_codes(claims, extend=True)
+        counts._add_codes(*codes)
+        return counts, counts._code_features(*codes)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild from to_dict output; arrays are copied so mmapped input can be updated."""
+        counts = cls()
+        if data is None:
+            return counts
+        counts.providers = pd.Index(data["providers"], name='Provider')
+        counts.vocabulary = pd.MultiIndex.from_arrays(
+            [np.asarray(data["families"], dtype=object), np.asarray(data["codes"], dtype=object)],
+            names=['Family', 'Code'],
+        )
+        counts.matrix = sparse.csr_matrix(
+            (np.array(data["data"], dtype=np.float64),
+             np.array(data["indices"], dtype=np.int32),
+             np.array(data["indptr"], dtype=np.int64)),
+            shape=(len(counts.providers), len(counts.vocabulary)),
+        )
+        return counts
+
+    def __len__(self):
+        return self.matrix.nnz
+
+    # --------------------------------------------
+    # Updates
+    # --------------------------------------------
+    def update(self, claims):
+        """Fold a batch of claims into the counts."""
+        self._add_codes(*self._claim_codes(claims, extend=True))
+
+    def _claim_codes(self, claims, extend):
+        """
+        Matrix rows per claim plus (claim, column) for every non-missing code cell.
+
+        Each family's code columns are stacked into one array and factorized
+        once; only the distinct batch values are looked up in the
+        vocabulary. With extend=False unseen providers and codes map to -1.
+
+        Returns:
+        --------
+        tuple
+            (provider_rows per claim, claim index per code, matrix column per code)
+        """
+        n_rows = len(claims)
+        provider_codes, provider_labels = pd.factorize(claims['Provider'])
+        provider_labels = pd.Index(np.asarray(provider_labels, dtype=object))
+        self.providers, positions = _index_positions(self.providers, provider_labels, extend)
+        # Missing providers factorize to -1, which picks the trailing -1
+        provider_rows = np.append(positions, -1)[provider_codes]
+
+        code_claims, code_columns = [], []
+        for family, prefix in CODE_FAMILIES:
+            columns = [col for col in claims.columns if col.startswith(prefix)]
+            if not columns:
+                continue
+            values = np.concatenate([claims[col].to_numpy(dtype=object) for col in columns])
+            present = pd.notna(values)
+            batch_codes, uniques = pd.factorize(values[present])
+            keys = pd.MultiIndex.from_arrays(
+                [np.full(len(uniques), family, dtype=object), np.asarray(uniques, dtype=object)]
+            )
+            self.vocabulary, positions = _index_positions(self.vocabulary, keys, extend)
+            code_claims.append(np.tile(np.arange(n_rows), len(columns))[present])
+            code_columns.append(positions[batch_codes])
+
+        if not code_claims:
+            empty = np.zeros(0, dtype=np.int64)
+            return provider_rows, empty, empty
+        return provider_rows, np.concatenate(code_claims), np.concatenate(code_columns)
+
+    def _add_codes(self, provider_rows, code_claims, code_columns):
+        shape = (len(self.providers), len(self.vocabulary))
+        rows = provider_rows[code_claims]
+        known = (rows >= 0) & (code_columns >= 0)
+        batch = sparse.csr_matrix(
+            (np.ones(int(known.sum())), (rows[known], code_columns[known])), shape=shape
+        )
+        self.matrix.resize(shape)
+        self.matrix = self.matrix + batch
+        self.matrix.sort_indices()
+        self._stats = None
+
+    # --------------------------------------------
+    # Features
+    # --------------------------------------------
+    def claim_features(self, claims):
+        """
+        Per-claim code-mix features against the current counts.
+
+        Claims without codes get NaN CodeFrequency and CodeRarity; claims
+        from unseen providers get NaN throughout.
+        """
+        return self._code_features(*self._claim_codes(claims, extend=False))
+
+    def provider_divergence(self):
+        """KL divergence of each provider's code mix from the pooled mix."""
+        return self._statistics()['divergence']
+
+    def _statistics(self):
+        """Row totals, code rarity and provider divergence, cached until the next update."""
+        if self._stats is not None:
+            return self._stats
+
+        matrix = self.matrix
+        n_providers, n_codes = matrix.shape
+        nnz_rows = np.repeat(np.arange(n_providers, dtype=np.int64), np.diff(matrix.indptr))
+        row_totals = np.bincount(nnz_rows, weights=matrix.data, minlength=n_providers)
+        code_totals = np.bincount(matrix.indices, weights=matrix.data, minlength=n_codes)
+        providers_per_code = np.bincount(matrix.indices, minlength=n_codes)
+        n_active = int((row_totals > 0).sum())
+
+        # KL(provider || pooled), summed over the provider's nonzero codes only
+        share = matrix.data / row_totals[nnz_rows]
+        pooled = code_totals[matrix.indices] / max(code_totals.sum(), 1.0)
+        divergence = np.bincount(nnz_rows, weights=share * np.log(share / pooled), minlength=n_providers)
+        divergence[row_totals == 0] = np.nan
+
+        self._stats = {
+            # Row-major keys of the nonzeros; sorted because indices are sorted per row
+            'nnz_keys': nnz_rows * n_codes + matrix.indices,
+            'row_totals': row_totals,
+            'rarity': np.log((1.0 + n_active) / (1.0 + providers_per_code)),
+            'unseen_rarity': np.log(1.0 + n_active),
+            'divergence': divergence,
+        }
+        return self._stats
+
+    def _entries(self, rows, columns):
+        """Matrix entries at (rows, columns), found by binary search over the nonzeros."""
+        keys = self._statistics()['nnz_keys']
+        values = np.zeros(len(rows))
+        if len(keys) == 0:
+            return values
+        query = rows * self.matrix.shape[1] + columns
+        positions = np.minimum(np.searchsorted(keys, query), len(keys) - 1)
+        found = (columns >= 0) & (keys[positions] == query)
+        values[found] = self.matrix.data[positions[found]]
+        return values
+
+    def _code_features(self, provider_rows, code_claims, code_columns):
+        stats = self._statistics()
+        n_rows = len(provider_rows)
+        known = provider_rows >= 0
+
+        divergence = np.full(n_rows, np.nan, dtype=np.float32)
+        divergence[known] = stats['divergence'][provider_rows[known]]
+
+        # Codes on claims from unseen providers are left out entirely
+        code_rows = provider_rows[code_claims]
+        keep = code_rows >= 0
+        code_claims, code_columns, code_rows = code_claims[keep], code_columns[keep], code_rows[keep]
+
+        share = self._entries(code_rows.astype(np.int64), code_columns) / np.maximum(
+            stats['row_totals'][code_rows], 1.0)
+        rarity = np.where(code_columns >= 0, stats['rarity'][np.maximum(code_columns, 0)],
+                          stats['unseen_rarity'])
+
+        codes_per_claim = np.bincount(code_claims, minlength=n_rows)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frequency = np.bincount(code_claims, weights=share, minlength=n_rows) / codes_per_claim
+            mean_rarity = np.bincount(code_claims, weights=rarity, minlength=n_rows) / codes_per_claim
+        return {
+            'CodeFrequency': frequency.astype(np.float32),
+            'CodeRarity': mean_rarity.astype(np.float32),
+            'ProviderCodeDivergence': divergence,
+        }
+
+    # --------------------------------------------
+    # Export
+    # --------------------------------------------
+    def to_dict(self):
+        """Plain arrays for the model artifact."""
+        return {
+            "providers": self.providers.to_numpy(dtype=object),
+            "families": self.vocabulary.get_level_values(0).to_numpy(dtype=object),
+            "codes": self.vocabulary.get_level_values(1).to_numpy(dtype=object),
+            "data": self.matrix.data.copy(),
+            "indices": self.matrix.indices.copy(),
+            "indptr": self.matrix.indptr.copy(),
+        }
+
+
+def _index_positions(index, labels, extend):
+    """
+    Positions of distinct labels in index, appending unseen labels if extend.
+
+    Returns the (possibly extended) index and the positions; unseen labels
+    are -1 when extend is False.
+    """
+    positions = index.get_indexer(labels)
+    new = positions == -1
+    if extend and new.any():
+        start = len(index)
+        index = index.append(labels[new])
+        positions[new] = np.arange(start, start + int(new.sum()))
+    return index, positions
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Out-of-Core Cross-Claim Features
+================================
+
+Near-duplicate scores, stay overlaps, claim velocity and the provider
+network compare claims with each other, so a claim file read in chunks
+cannot compute them chunk by chunk. ClaimPartitions computes them over the
+whole file without holding it: each chunk is reduced to small fixed-size
+records that are hash-partitioned into spill files on disk, such that
+every comparison happens between records of the same partition,
+
+    stay periods        by beneficiary
+    LSH band keys       by (band, bucket), MinHash signatures in row order
+    claim dates         by provider
+    network edges       by physician / beneficiary
+
+and partitions are then processed one at a time with the same functions
+engineer_features uses. Per-claim results go to memory-mapped columns
+indexed by file row, so both the sample fit and the scoring pass look
+them up by row.
+
+Memory is bounded by the chunk size, the provider tables and the largest
+partition: partitions hold about chunksize claims each, except that one
+very frequent provider, beneficiary or LSH bucket stays in one partition.
+Disk use is about 700 bytes per claim, mostly the 64 MinHash values and
+the 16 band keys.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from duplicate_claims import (
+    DUPLICATE_SCORE_COLUMN,
+    _EMPTY_SIGNATURE,
+    bucket_neighbor_pairs,
+    claim_signature_tokens,
+    lsh_band_keys,
+    minhash_signatures,
+    signature_similarity,
+)
+from provider_network import NETWORK_FEATURE_COLUMNS, PHYSICIAN_COLUMNS, shared_peer_counts
+from stay_overlaps import other_provider_overlaps, stay_periods
+from temporal_features import (
+    DATE_COLUMN,
+    TEMPORAL_FEATURE_COLUMNS,
+    claim_start_days,
+    rolling_window_totals,
+    velocity_features,
+)
+
+
+# Spill record layouts, one file per kind and partition
+STAY_RECORD = np.dtype([('row', np.int64), ('beneficiary', np.uint64), ('provider', np.int64),
+                        ('start', np.int64), ('end', np.int64)])
+BAND_RECORD = np.dtype([('row', np.int64), ('band', np.uint8), ('key', np.uint64)])
+DATE_RECORD = np.dtype([('row', np.int64), ('provider', np.int64), ('day', np.int64),
+                        ('amount', np.float64)])
+EDGE_RECORD = np.dtype([('provider', np.int64), ('neighbor', np.uint64), ('kind', np.uint8)])
+
+# Network edge kinds
+PHYSICIAN_EDGE, BENEFICIARY_EDGE = 0, 1
+
+# Candidate pairs compared at once when scoring duplicates
+SIMILARITY_CHUNK_SIZE = 100_000
+
+
+def _unique_edges(edges):
+    """Edges with repeats dropped (hash-based, unlike np.unique on records)."""
+    duplicated = pd.DataFrame({field: edges[field] for field in EDGE_RECORD.names}).duplicated()
+    return edges[~duplicated.to_numpy()]
+
+
+def _hash_values(values):
+    """uint64 hashes of the present values, with their positions."""
+    values = np.asarray(values, dtype=object)
+    present = np.flatnonzero(pd.notna(values))
+    return present, pd.util.hash_array(values[present])
+
+
+class ClaimPartitions:
+    """
+    Hash-partitioned spill files for the cross-claim features of one claim file.
+
+    Usage:
+        partitions = ClaimPartitions(directory, n_partitions)
+        for chunk in chunks:            # indexed by file row, in file order
+            partitions.add(chunk)
+        provider_network = partitions.finish()
+        features = partitions.claim_features(chunk)
+    """
+
+    def __init__(self, directory, n_partitions, n_hashes=64, bands=16, neighbors=10,
+                 max_neighbor_providers=50):
+        if n_hashes % bands:
+            raise ValueError(f"n_hashes ({n_hashes}) must be a multiple of bands ({bands})")
+        self.directory = directory
+        self.n_partitions = max(int(n_partitions), 1)
+        self.n_hashes = n_hashes
+        self.bands = bands
+        self.neighbors = neighbors
+        self.max_neighbor_providers = max_neighbor_providers
+
+        self.n_rows = 0
+        self.providers = pd.Index([], dtype=object, name='Provider')
+        self.provider_claims = np.zeros(0, dtype=np.int64)
+        self.provider_overlap_rate = np.zeros(0, dtype=np.float32)
+        self.has_beneficiary = False
+        self.has_dates = False
+        self._columns = {}
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _spill(self, kind, records, partitions):
+        """Append records to their partition files, keeping their order within a partition."""
+        order = np.argsort(partitions, kind='stable')
+        records = records[order]
+        bounds = np.searchsorted(partitions[order], np.arange(self.n_partitions + 1))
+        for partition in np.flatnonzero(np.diff(bounds)):
+            with open(self._path(f"{kind}_{partition}.bin"), 'ab') as f:
+                f.write(records[bounds[partition]:bounds[partition + 1]].tobytes())
+
+    def _load(self, kind, partition, dtype):
+        path = self._path(f"{kind}_{partition}.bin")
+        if not os.path.exists(path):
+            return np.zeros(0, dtype=dtype)
+        return np.fromfile(path, dtype=dtype)
+
+    # -------------------------------------------------------------------------
+    # Spilling
+    # -------------------------------------------------------------------------
+
+    def _provider_rows(self, claims):
+        """Global provider code per claim (-1 when missing), growing self.providers."""
+        provider_codes, labels = pd.factorize(claims['Provider'])
+        labels = pd.Index(np.asarray(labels, dtype=object))
+        positions = self.providers.get_indexer(labels)
+        new = positions == -1
+        if new.any():
+            positions[new] = np.arange(len(self.providers), len(self.providers) + int(new.sum()))
+            self.providers = self.providers.append(labels[new]).rename('Provider')
+        # Missing providers factorize to -1, which picks the trailing -1
+        return np.append(positions, -1)[provider_codes]
+
+    def add(self, claims):
+        """
+        Spill the records of the next chunk of the file.
+
+        Parameters:
+        -----------
+        claims : pd.DataFrame
+            The chunk, following the previous one in the file
+        """
+        n_rows = len(claims)
+        rows = np.arange(self.n_rows, self.n_rows + n_rows)
+        provider_rows = self._provider_rows(claims)
+        has_provider = provider_rows >= 0
+        self.provider_claims = np.bincount(
+            provider_rows[has_provider], minlength=len(self.providers)
+        ) + np.pad(self.provider_claims, (0, len(self.providers) - len(self.provider_claims)))
+
+        self.has_beneficiary = 'BeneID' in claims.columns
+        self.has_dates = DATE_COLUMN in claims.columns
+        if self.has_beneficiary:
+            self._spill_stays(claims, rows, provider_rows)
+            self._spill_signatures(claims, rows)
+            self._spill_edges(claims, provider_rows)
+        if self.has_dates:
+            self._spill_dates(claims, rows, provider_rows)
+        self.n_rows += n_rows
+
+    def _spill_stays(self, claims, rows, provider_rows):
+        start, end, valid = stay_periods(claims)
+        present, beneficiary = _hash_values(claims['BeneID'])
+        has_bene = np.zeros(len(claims), dtype=bool)
+        has_bene[present] = True
+        bene_hash = np.zeros(len(claims), dtype=np.uint64)
+        bene_hash[present] = beneficiary
+        valid &= has_bene & (provider_rows >= 0)
+
+        records = np.empty(int(valid.sum()), dtype=STAY_RECORD)
+        records['row'] = rows[valid]
+        records['beneficiary'] = bene_hash[valid]
+        records['provider'] = provider_rows[valid]
+        records['start'] = start[valid]
+        records['end'] = end[valid]
+        self._spill('stays', records, records['beneficiary'] % np.uint64(self.n_partitions))
+
+    def _spill_signatures(self, claims, rows):
+        claim_rows, tokens = claim_signature_tokens(claims)
+        signatures = minhash_signatures(claim_rows, tokens, len(claims), self.n_hashes)
+        with open(self._path('signatures.bin'), 'ab') as f:
+            f.write(signatures.tobytes())
+
+        valid = np.flatnonzero(signatures[:, 0] != _EMPTY_SIGNATURE)
+        keys = lsh_band_keys(signatures[valid], self.bands, claim_start_days(claims)[valid])
+        # Band-major, rows ascending within a band
+        records = np.empty(keys.size, dtype=BAND_RECORD)
+        records['row'] = np.tile(rows[valid], self.bands)
+        records['band'] = np.repeat(np.arange(self.bands), len(valid))
+        records['key'] = keys.ravel()
+        partitions = ((records['key'] >> np.uint64(32)) + records['band']) % np.uint64(self.n_partitions)
+        self._spill('bands', records, partitions)
+
+    def _spill_edges(self, claims, provider_rows):
+        parts = []
+        for kind, columns in [(PHYSICIAN_EDGE, PHYSICIAN_COLUMNS), (BENEFICIARY_EDGE, ['BeneID'])]:
+            columns = [col for col in columns if col in claims.columns]
+            if not columns:
+                continue
+            values = np.concatenate([claims[col].to_numpy(dtype=object) for col in columns])
+            present, neighbors = _hash_values(values)
+            providers = np.tile(provider_rows, len(columns))[present]
+            keep = providers >= 0
+            edges = np.empty(int(keep.sum()), dtype=EDGE_RECORD)
+            edges['provider'] = providers[keep]
+            edges['neighbor'] = neighbors[keep]
+            edges['kind'] = kind
+            parts.append(_unique_edges(edges))
+        if parts:
+            edges = np.concatenate(parts)
+            self._spill('edges', edges, edges['neighbor'] % np.uint64(self.n_partitions))
+
+    def _spill_dates(self, claims, rows, provider_rows):
+        days = claim_start_days(claims)
+        valid = (provider_rows >= 0) & ~np.isnan(days)
+        amounts = claims['InscClaimAmtReimbursed'].to_numpy(dtype=np.float64, na_value=np.nan)
+
+        records = np.empty(int(valid.sum()), dtype=DATE_RECORD)
+        records['row'] = rows[valid]
+        records['provider'] = provider_rows[valid]
+        records['day'] = days[valid].astype(np.int64)
+        records['amount'] = amounts[valid]
+        self._spill('dates', records, records['provider'] % self.n_partitions)
+
+    # -------------------------------------------------------------------------
+    # Features
+    # -------------------------------------------------------------------------
+
+    def _column(self, name, fill):
+        """Memory-mapped float32 feature column over every file row."""
+        column = np.lib.format.open_memmap(self._path(f"{name}.npy"), mode='w+',
+                                           dtype=np.float32, shape=(self.n_rows,))
+        column[:] = fill
+        self._columns[name] = column
+        return column
+
+    def finish(self):
+        """
+        Compute the cross-claim features, one partition at a time.
+
+        Returns:
+        --------
+        pd.DataFrame or None
+            Provider network features indexed by Provider, as
+            provider_network.provider_network_features builds them; None
+            without BeneID
+        """
+        network = None
+        if self.has_beneficiary:
+            self._duplicate_scores()
+            self._stay_overlaps()
+            network = self._provider_network()
+        if self.has_dates:
+            self._claim_velocity()
+        return network
+
+    def _duplicate_scores(self):
+        scores = self._column(DUPLICATE_SCORE_COLUMN, 0)
+        signatures = np.memmap(self._path('signatures.bin'), dtype=np.uint32, mode='r',
+                               shape=(self.n_rows, self.n_hashes))
+        for partition in range(self.n_partitions):
+            records = self._load('bands', partition, BAND_RECORD)
+            for band in range(self.bands):
+                in_band = records[records['band'] == band]
+                first, second = bucket_neighbor_pairs(in_band['key'], in_band['row'], self.neighbors)
+                similarity = signature_similarity(signatures, first, second, SIMILARITY_CHUNK_SIZE)
+                np.maximum.at(scores, first, similarity)
+                np.maximum.at(scores, second, similarity)
+        scores.flush()
+
+    def _stay_overlaps(self):
+        overlap_count = self._column('OverlappingStayCount', 0)
+        overlapped = np.zeros(len(self.providers), dtype=np.int64)
+        for partition in range(self.n_partitions):
+            records = self._load('stays', partition, STAY_RECORD)
+            counts = other_provider_overlaps(records['beneficiary'], records['provider'],
+                                             records['start'], records['end'])
+            overlap_count[records['row']] = counts
+            overlapped += np.bincount(records['provider'][counts > 0], minlength=len(self.providers))
+        overlap_count.flush()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.provider_overlap_rate = (overlapped / self.provider_claims).astype(np.float32)
+
+    def _claim_velocity(self):
+        columns = [self._column(name, np.nan) for name in TEMPORAL_FEATURE_COLUMNS]
+        for partition in range(self.n_partitions):
+            records = self._load('dates', partition, DATE_RECORD)
+            totals = rolling_window_totals(records['provider'], records['day'], records['amount'])
+            features = velocity_features(len(records), np.ones(len(records), dtype=bool),
+                                         totals[7], totals[30])
+            for column, name in zip(columns, TEMPORAL_FEATURE_COLUMNS):
+                column[records['row']] = features[name]
+        for column in columns:
+            column.flush()
+
+    def _provider_network(self):
+        n_providers = len(self.providers)
+        degrees = {kind: np.zeros(n_providers, dtype=np.int64) for kind in (PHYSICIAN_EDGE, BENEFICIARY_EDGE)}
+        projections = {kind: sparse.csr_matrix((n_providers, n_providers), dtype=np.float32)
+                       for kind in degrees}
+        pending = {kind: [] for kind in degrees}
+
+        for partition in range(self.n_partitions):
+            edges = _unique_edges(self._load('edges', partition, EDGE_RECORD))
+            for kind in degrees:
+                kind_edges = edges[edges['kind'] == kind]
+                degrees[kind] += np.bincount(kind_edges['provider'], minlength=n_providers)
+
+                # A neighbor's edges all land in this partition, so this is its full degree
+                neighbor_codes, neighbors = pd.factorize(kind_edges['neighbor'])
+                keep = np.bincount(neighbor_codes, minlength=len(neighbors))[neighbor_codes] \
+                    <= self.max_neighbor_providers
+                adjacency = sparse.csr_matrix(
+                    (np.ones(int(keep.sum()), dtype=np.float32),
+                     (kind_edges['provider'][keep], neighbor_codes[keep])),
+                    shape=(n_providers, len(neighbors)),
+                )
+                pending[kind].append((adjacency @ adjacency.T).tocsr())
+                # Merge once the pending products outgrow the sum, so merging stays linear
+                if sum(part.nnz for part in pending[kind]) > projections[kind].nnz:
+                    projections[kind] = sum(pending[kind], projections[kind]).tocsr()
+                    pending[kind] = []
+
+        for kind in degrees:
+            projections[kind] = sum(pending[kind], projections[kind]).tocsr()
+        _, components = connected_components(projections[PHYSICIAN_EDGE], directed=False)
+
+        return pd.DataFrame({
+            'PhysicianDegree': degrees[PHYSICIAN_EDGE],
+            'BeneficiaryDegree': degrees[BENEFICIARY_EDGE],
+            'SharedPhysicianPeers': shared_peer_counts(projections[PHYSICIAN_EDGE]),
+            'SharedBeneficiaryPeers': shared_peer_counts(projections[BENEFICIARY_EDGE]),
+            'NetworkComponentSize': np.bincount(components)[components],
+        }, index=self.providers, columns=NETWORK_FEATURE_COLUMNS).astype(np.float32)
+
+    def claim_features(self, claims):
+        """
+        Cross-claim features of claims from the file, looked up by file row.
+
+        Parameters:
+        -----------
+        claims : pd.DataFrame
+            Claims indexed by file row (see streaming_pipeline.iter_claim_chunks)
+
+        Returns:
+        --------
+        dict
+            Feature name -> float32 array aligned with claims, in the
+            column order engineer_features adds them
+        """
+        rows = claims.index.to_numpy()
+        features = {}
+        for name, column in self._columns.items():
+            features[name] = np.asarray(column[rows])
+            if name == 'OverlappingStayCount':
+                # Unknown or missing providers pick the trailing NaN
+                positions = self.providers.get_indexer(claims['Provider'])
+                features['ProviderOverlapRate'] = np.append(self.provider_overlap_rate, np.nan)[positions]
+        return features
+
+    def close(self):
+        """Release the memory-mapped columns, so the spill directory can be removed."""
+        self._columns = {}
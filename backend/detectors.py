@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Pluggable Anomaly Detectors
+===========================
+
+Common fit / score / save / load interface for the anomaly detectors the
+pipeline can train, selected by name with ``get_detector``:
+
+    isolation_forest  sklearn IsolationForest, scored with the flat-array
+                      scorer (forest_scorer.py); optionally sharded
+    hbos              Histogram-Based Outlier Score: one equal-width
+                      histogram per feature, fitted and scored in O(n)
+
+Every detector follows the IsolationForest conventions the rest of the
+engine relies on: score_samples is in [-1, 0] with lower meaning more
+abnormal, and offset_ is the contamination percentile of the training
+scores, so decision scores (score_samples - offset_) fall in [-1, 1] and
+go through the same ScoreCalibration.
+
+Usage:
+    detector = get_detector('hbos', contamination=0.1).fit(X_scaled)
+    anomaly_scores, anomaly_flags = detector.score(X_scaled)
+    detector.save('hbos.joblib')
+"""
+
+import os
+
+import joblib
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from forest_scorer import flat_forest_for
+from sharded_training import train_sharded_isolation_forest
+
+
+class AnomalyDetector:
+    """
+    Base class for pipeline anomaly detectors.
+
+    Subclasses implement fit and score_samples and set offset_ in fit.
+    """
+
+    name = None
+
+    def fit(self, X):
+        """Fit on a scaled feature matrix; returns self."""
+        raise NotImplementedError
+
+    def score_samples(self, X):
+        """Normality score in [-1, 0]; lower = more abnormal."""
+        raise NotImplementedError
+
+    def score(self, X):
+        """
+        Anomaly scores and binary flags.
+
+        Returns:
+        --------
+        tuple
+            (anomaly_scores, anomaly_flags): scores are negative for
+            anomalies, flags are 1 = anomaly, 0 = normal
+        """
+        anomaly_scores = self.score_samples(X) - self.offset_
+        return anomaly_scores, (anomaly_scores < 0).astype(np.int64)
+
+    def save(self, path):
+        """Write the fitted detector to disk atomically (uncompressed joblib)."""
+        tmp_path = f"{path}.tmp"
+        joblib.dump(self, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load a detector written by save.
+
+        Raises:
+        -------
+        FileNotFoundError
+            If the file does not exist
+        TypeError
+            If the file does not hold a detector of this class
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Detector file not found: {path}")
+        detector = joblib.load(path, mmap_mode="r" if mmap else None)
+        if not isinstance(detector, cls):
+            raise TypeError(f"{path} holds a {type(detector).__name__}, not a {cls.__name__}")
+        return detector
+
+
+class IsolationForestDetector(AnomalyDetector):
+    """
+    sklearn Isolation Forest behind the detector interface.
+
+    With n_shards > 1 the trees are grown on row shards in worker processes
+    and merged (sharded_training.py). The fitted forest is kept as ``model``.
+    """
+
+    name = 'isolation_forest'
+
+    def __init__(self, n_estimators=200, contamination='auto', max_samples='auto',
+                 bootstrap=False, n_shards=1, random_state=42):
+        self.n_estimators = n_estimators
+        self.contamination = contamination
+        self.max_samples = max_samples
+        self.bootstrap = bootstrap
+        self.n_shards = n_shards
+        self.random_state = random_state
+
+    def fit(self, X):
+        if self.n_shards > 1:
+            self.model = train_sharded_isolation_forest(
+                X,
+                n_estimators=self.n_estimators,
+                max_samples=256 if self.max_samples == 'auto' else self.max_samples,
+                bootstrap=self.bootstrap,
+                contamination=self.contamination,
+                n_shards=self.n_shards,
+                workers=self.n_shards,
+                random_state=self.random_state,
+            )
+        else:
+            self.model = IsolationForest(
+                n_estimators=self.n_estimators,
+                contamination=self.contamination,
+                max_samples=self.max_samples,
+                bootstrap=self.bootstrap,
+                random_state=self.random_state,
+                n_jobs=-1,  # Use all available CPU cores
+                verbose=0
+            ).fit(X)
+        self.offset_ = float(self.model.offset_)
+        return self
+
+    def score_samples(self, X):
+        return flat_forest_for(self.model).score_samples(X)
+
+    def score(self, X):
+        # Scores and flags in a single forest traversal
+        return flat_forest_for(self.model).score(X)
+
+
+class HBOSDetector(AnomalyDetector):
+    """
+    Histogram-Based Outlier Score.
+
+    Each feature gets an equal-width histogram over its training range,
+    normalised so the tallest bin has height 1. A claim's outlier score is
+    the mean over features of -log(height of its bin), scaled by
+    -log(min_height) so each feature contributes at most 1; values outside
+    the training range count as the maximum. All histograms are filled with
+    a single np.bincount over (feature, bin) indices.
+
+    Parameters:
+    -----------
+    n_bins : int or 'auto'
+        Bins per feature; 'auto' uses sqrt(n_samples), capped at 1000
+    contamination : float or 'auto'
+        Expected anomaly share; 'auto' puts offset_ at -0.5 as
+        IsolationForest does
+    min_height : float
+        Floor for normalised bin heights (empty bins)
+    """
+
+    name = 'hbos'
+
+    def __init__(self, n_bins='auto', contamination='auto', min_height=1e-4):
+        self.n_bins = n_bins
+        self.contamination = contamination
+        self.min_height = min_height
+
+    def _bin_indices(self, X):
+        """Bin index per (sample, feature); -1 outside the training range."""
+        positions = np.floor((X - self.low_) / self.width_)
+        # The training maximum belongs to the last bin
+        positions[X == self.high_] = self.n_bins_ - 1
+        outside = ~((positions >= 0) & (positions < self.n_bins_))
+        positions[outside] = -1
+        return positions.astype(np.int64)
+
+    def fit(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        n_samples, n_features = X.shape
+        self.n_bins_ = (min(1000, max(1, int(np.sqrt(n_samples)))) if self.n_bins == 'auto'
+                        else int(self.n_bins))
+        self.n_features_in_ = n_features
+        self.low_ = X.min(axis=0)
+        self.high_ = X.max(axis=0)
+        width = (self.high_ - self.low_) / self.n_bins_
+        # Constant features: every training value lands in bin 0
+        self.width_ = np.where(width > 0, width, 1.0)
+
+        flat_bins = self._bin_indices(X) + np.arange(n_features) * self.n_bins_
+        counts = np.bincount(flat_bins.ravel(), minlength=n_features * self.n_bins_)
+        counts = counts.reshape(n_features, self.n_bins_).astype(np.float64)
+        heights = counts / counts.max(axis=1, keepdims=True)
+
+        # Per-bin contribution in [0, 1]; an extra trailing column for out-of-range values
+        self.contribution_ = np.ones((n_features, self.n_bins_ + 1))
+        self.contribution_[:, :-1] = (np.log(np.maximum(heights, self.min_height))
+                                      / np.log(self.min_height))
+
+        if self.contamination == 'auto':
+            self.offset_ = -0.5
+        else:
+            self.offset_ = float(np.percentile(self.score_samples(X), 100.0 * self.contamination))
+        return self
+
+    def score_samples(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected an array with {self.n_features_in_} features, got shape {X.shape}")
+        bins = self._bin_indices(X)
+        # -1 picks the out-of-range column
+        contributions = self.contribution_[np.arange(self.n_features_in_), bins]
+        return -contributions.mean(axis=1)
+
+
+DETECTORS = {
+    IsolationForestDetector.name: IsolationForestDetector,
+    HBOSDetector.name: HBOSDetector,
+}
+
+
+def get_detector(name, **params):
+    """
+    Instantiate a detector by name.
+
+    Raises:
+    -------
+    ValueError
+        If no detector has that name
+    """
+    if name not in DETECTORS:
+        raise ValueError(f"Unknown detector '{name}' (available: {sorted(DETECTORS)})")
+    return DETECTORS[name](**params)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Feature Drift Monitoring
+========================
+
+Stores a compact per-feature reference distribution at training time and
+measures how far incoming claims have drifted from it, so retraining can
+be triggered by the data rather than the calendar.
+
+The reference is, per model feature, the training quantiles at n_quantiles
+equal-probability cut points and the training count in each resulting bin
+(ties can make bins unequal, so counts are kept). A batch is binned on the
+same edges with one searchsorted per feature and a single bincount over
+(feature, bin); all drift metrics then come from the two count tables:
+
+    PSI  Population Stability Index over psi_bins coarse bins
+         (< 0.1 stable, 0.1-0.25 moderate, >= 0.25 drifted)
+    KS   Kolmogorov-Smirnov distance between the binned CDFs
+
+Because the bins are fixed, batch counts add up: DriftMonitor accumulates
+every scored claim and reports drift for all of them at any time.
+
+Features a batch could not compute (its raw columns are missing, so every
+claim gets the same default) are skipped for that batch rather than
+counted: they would show as drift of the data feed, not of the claims.
+Features no counted claim has yet are reported as unmonitored.
+
+Usage:
+    reference = fit_feature_reference(X_train, feature_columns)
+    monitor = DriftMonitor(reference).update(new_claims_features)
+    print(monitor.summary()["retrain_recommended"])
+"""
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_QUANTILES = 100
+PSI_BINS = 10
+
+# PSI at or above these marks moderate / significant drift
+PSI_MODERATE = 0.1
+PSI_DRIFT = 0.25
+KS_DRIFT = 0.1
+
+# Floor for bin shares in PSI, so empty bins stay finite
+_MIN_SHARE = 1e-4
+
+
+def _bin_counts(X, edges):
+    """Counts per (feature, bin) for X binned on per-feature inner edges."""
+    n_features, n_edges = edges.shape
+    n_bins = n_edges + 1
+    bins = np.empty(X.shape, dtype=np.int64)
+    for feature in range(n_features):
+        bins[:, feature] = np.searchsorted(edges[feature], X[:, feature], side='right')
+    bins += np.arange(n_features) * n_bins
+    return np.bincount(bins.ravel(), minlength=n_features * n_bins).reshape(n_features, n_bins)
+
+
+def fit_feature_reference(X, feature_columns, n_quantiles=DEFAULT_QUANTILES):
+    """
+    Reference quantile edges and bin counts for each model feature.
+
+    Parameters:
+    -----------
+    X : array-like
+        Training feature matrix before scaling, missing values filled
+    feature_columns : list
+        Column names of X, in model order
+    n_quantiles : int
+        Equal-probability bins per feature; a multiple of PSI_BINS
+
+    Returns:
+    --------
+    dict
+        Plain-array reference for the model artifact
+    """
+    X = np.asarray(X, dtype=np.float64)
+    cut_points = np.linspace(0.0, 1.0, n_quantiles + 1)[1:-1]
+    edges = np.quantile(X, cut_points, axis=0).T
+    return {
+        "feature_columns": list(feature_columns),
+        "edges": edges,
+        "counts": _bin_counts(X, edges),
+    }
+
+
+def drift_metrics(reference_counts, counts, psi_bins=PSI_BINS):
+    """
+    PSI and KS per feature from reference and observed bin counts.
+
+    Returns:
+    --------
+    tuple
+        (psi, ks) arrays with one value per feature; NaN if counts is empty
+    """
+    reference_share = reference_counts / np.maximum(reference_counts.sum(axis=1, keepdims=True), 1)
+    total = counts.sum(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = counts / total
+
+    ks = np.abs(np.cumsum(reference_share, axis=1) - np.cumsum(share, axis=1)).max(axis=1)
+
+    starts = np.arange(0, reference_counts.shape[1], reference_counts.shape[1] // psi_bins)
+    expected = np.maximum(np.add.reduceat(reference_share, starts, axis=1), _MIN_SHARE)
+    actual = np.maximum(np.add.reduceat(share, starts, axis=1), _MIN_SHARE)
+    psi = ((actual - expected) * np.log(actual / expected)).sum(axis=1)
+    return psi, ks
+
+
+class DriftMonitor:
+    """
+    Running drift of scored claims against a training reference.
+
+    Parameters:
+    -----------
+    reference : dict
+        Output of fit_feature_reference (e.g. artifact["feature_reference"])
+    """
+
+    def __init__(self, reference):
+        self.feature_columns = list(reference["feature_columns"])
+        self.edges = np.asarray(reference["edges"], dtype=np.float64)
+        self.reference_counts = np.asarray(reference["counts"], dtype=np.int64)
+        self.counts = np.zeros_like(self.reference_counts)
+
+    def batch_counts(self, features, fill_values=None, skip=()):
+        """
+        Reference-bin counts for a batch of engineered claim features.
+
+        Parameters:
+        -----------
+        features : pd.DataFrame
+            Engineered features of the batch
+        fill_values : dict, optional
+            Fill values for missing features, as used for scoring
+        skip : iterable of str
+            Features left uncounted, e.g. defaults the batch could not compute
+
+        Returns:
+        --------
+        np.ndarray
+            (n_features, n_bins) counts
+
+        Raises:
+        -------
+        ValueError
+            If any model feature is missing from the batch
+        """
+        missing_features = [col for col in self.feature_columns if col not in features.columns]
+        if missing_features:
+            raise ValueError(f"Missing model features: {missing_features}")
+
+        X = features[self.feature_columns]
+        if fill_values is not None:
+            X = X.fillna(fill_values)
+        counts = _bin_counts(X.to_numpy(dtype=np.float64), self.edges)
+        skip = set(skip)
+        counts[[col in skip for col in self.feature_columns]] = 0
+        return counts
+
+    def update(self, features, fill_values=None, skip=()):
+        """Add a batch to the running counts; see batch_counts."""
+        self.counts += self.batch_counts(features, fill_values, skip)
+        return self
+
+    def report(self, counts=None):
+        """
+        Per-feature drift of the accumulated claims (or of given counts).
+
+        Returns:
+        --------
+        pd.DataFrame
+            feature, claims, psi, ks and status ('stable', 'moderate' or
+            'drift') of each feature with counted claims, most drifted first
+        """
+        counts = self.counts if counts is None else counts
+        psi, ks = drift_metrics(self.reference_counts, counts)
+        status = np.where((psi >= PSI_DRIFT) | (ks >= KS_DRIFT), 'drift',
+                          np.where(psi >= PSI_MODERATE, 'moderate', 'stable'))
+        report = pd.DataFrame({
+            'feature': self.feature_columns,
+            'claims': counts.sum(axis=1),
+            'psi': psi,
+            'ks': ks,
+            'status': status,
+        })
+        report = report[report['claims'] > 0]
+        return report.sort_values('psi', ascending=False, ignore_index=True)
+
+    def summary(self, counts=None):
+        """
+        Retraining signal for the accumulated claims (or for given counts).
+
+        Returns:
+        --------
+        dict
+            Claims monitored, whether retraining is recommended, the drifted
+            features, the features without counted claims and the
+            per-feature report as records (empty when no claims have been
+            seen)
+        """
+        counts = self.counts if counts is None else counts
+        feature_claims = counts.sum(axis=1)
+        n_claims = int(feature_claims.max()) if len(counts) else 0
+        if n_claims == 0:
+            return {"claims_monitored": 0, "retrain_recommended": False,
+                    "drifted_features": [], "unmonitored_features": list(self.feature_columns),
+                    "features": []}
+        report = self.report(counts)
+        drifted = report.loc[report['status'] == 'drift', 'feature'].tolist()
+        return {
+            "claims_monitored": n_claims,
+            "retrain_recommended": bool(drifted),
+            "drifted_features": drifted,
+            "unmonitored_features": [col for col, n in zip(self.feature_columns, feature_claims) if n == 0],
+            "features": report.to_dict(orient="records"),
+        }
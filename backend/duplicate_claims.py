@@ -0,0 +1,611 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Claim Detection with MinHash and LSH
+===================================================
+
+Finds resubmitted claims that drop_duplicates misses: the same
+beneficiary and provider billed again with a shifted date, a slightly
+changed amount or the codes in a different order.
+
+Each claim becomes a set of signature tokens:
+    beneficiary, provider, every procedure and diagnosis code (as a set,
+    so order does not matter), two overlapping amount buckets and two
+    overlapping claim-start date windows.
+
+Overlapping buckets mean a small change in amount or date still leaves one
+shared token. Tokens are MinHashed into n_hashes values per claim and LSH
+banding groups claims whose signatures agree on a whole band. Within each
+band bucket only the nearest `neighbors` claims by date are paired, so the
+candidate count stays linear in the number of claims even for very
+frequent beneficiaries. Candidates are then scored by the share of equal
+MinHash values, an estimate of the Jaccard similarity of their token sets.
+
+ClaimSignatureIndex keeps the signatures of recent claims with per-band
+sorted bucket tables, so claims scored later get the score they would
+have had with those claims in the same batch (see claim_scoring.py).
+
+Usage:
+    python duplicate_claims.py --data cleaned_claims.csv --output duplicate_pairs.csv
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from code_features import CODE_FAMILIES
+from temporal_features import claim_start_days
+
+
+DUPLICATE_SCORE_COLUMN = 'DuplicateClaimScore'
+
+# Mersenne prime 2^61 - 1 for the universal hash family
+_PRIME = np.uint64((1 << 61) - 1)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+# MinHash value of claims without tokens; such claims never match
+_EMPTY_SIGNATURE = np.iinfo(np.uint32).max
+# Day key of undated claims, sorting after every date
+_NO_DAY = np.uint64(0xFFFFFFFF)
+
+# Stored signatures dated this many days before the latest one are dropped.
+# Within a bucket, training pairs a claim with its nearest claims by date
+# however old, which for a beneficiary's repeat claims can be months back.
+DEFAULT_HISTORY_DAYS = 365
+
+
+# =============================================================================
+# Signature Tokens
+# =============================================================================
+
+def _hash_tokens(values, component):
+    """32-bit token hashes of values, salted by signature component."""
+    hashed = pd.util.hash_array(np.asarray(values))
+    with np.errstate(over='ignore'):
+        hashed = (hashed ^ np.uint64(component)) * _MIX
+    return hashed >> np.uint64(32)
+
+
+def _bucket_tokens(claim_rows, buckets, component):
+    """Tokens for a value bucketed twice, the second grid shifted by half a bucket."""
+    return [
+        (claim_rows, _hash_tokens(np.floor(buckets).astype(np.int64), component)),
+        (claim_rows, _hash_tokens(np.floor(buckets + 0.5).astype(np.int64), component + 1)),
+    ]
+
+
+def claim_signature_tokens(claims, amount_tolerance=0.1, date_window_days=7):
+    """
+    Hashed signature tokens for every claim.
+
+    Parameters:
+    -----------
+    claims : pd.DataFrame
+        Claims with BeneID and optionally Provider, code columns,
+        InscClaimAmtReimbursed and ClaimStartDt
+    amount_tolerance : float
+        Relative width of an amount bucket
+    date_window_days : int
+        Width of a date window in days
+
+    Returns:
+    --------
+    tuple
+        (claim_rows, token_hashes) arrays, sorted by claim row
+    """
+    n_rows = len(claims)
+    rows = np.arange(n_rows)
+    parts = []
+
+    for component, column in [(1, 'BeneID'), (2, 'Provider')]:
+        if column in claims.columns:
+            values = claims[column].to_numpy(dtype=object)
+            present = pd.notna(values)
+            parts.append((rows[present], _hash_tokens(values[present], component)))
+
+    for component, (_, prefix) in enumerate(CODE_FAMILIES, start=3):
+        columns = [col for col in claims.columns if col.startswith(prefix)]
+        if not columns:
+            continue
+        values = np.concatenate([claims[col].to_numpy(dtype=object) for col in columns])
+        present = pd.notna(values)
+        parts.append((np.tile(rows, len(columns))[present], _hash_tokens(values[present], component)))
+
+    if 'InscClaimAmtReimbursed' in claims.columns:
+        amounts = claims['InscClaimAmtReimbursed'].to_numpy(dtype=np.float64, na_value=np.nan)
+        present = ~np.isnan(amounts) & (amounts >= 0)
+        buckets = np.log1p(amounts[present]) / np.log1p(amount_tolerance)
+        parts.extend(_bucket_tokens(rows[present], buckets, component=10))
+
+    days = claim_start_days(claims)
+    present = ~np.isnan(days)
+    parts.extend(_bucket_tokens(rows[present], days[present] / date_window_days, component=20))
+
+    if not parts:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty.astype(np.uint64)
+    claim_rows = np.concatenate([part[0] for part in parts])
+    tokens = np.concatenate([part[1] for part in parts])
+    order = np.argsort(claim_rows, kind='stable')
+    return claim_rows[order], tokens[order]
+
+
+# =============================================================================
+# MinHash and LSH
+# =============================================================================
+
+def minhash_signatures(claim_rows, tokens, n_claims, n_hashes=64, random_state=42):
+    """
+    MinHash signature per claim over its token set.
+
+    Uses the universal family (a * x + b) mod (2^61 - 1); for each hash
+    function the per-claim minimum is taken with one np.minimum.reduceat
+    over the claim-sorted tokens, and its top 32 bits are kept. Claims
+    without tokens get the maximum value in every position and never match.
+
+    Returns:
+    --------
+    np.ndarray
+        (n_claims, n_hashes) uint32 signatures
+    """
+    rng = np.random.default_rng(random_state)
+    a = rng.integers(1, 1 << 31, n_hashes, dtype=np.uint64)
+    b = rng.integers(0, 1 << 61, n_hashes, dtype=np.uint64)
+
+    signatures = np.full((n_claims, n_hashes), _EMPTY_SIGNATURE, dtype=np.uint32)
+    if len(tokens) == 0:
+        return signatures
+    counts = np.bincount(claim_rows, minlength=n_claims)
+    has_tokens = counts > 0
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[has_tokens]
+
+    for i in range(n_hashes):
+        hashed = (a[i] * tokens + b[i]) % _PRIME
+        signatures[has_tokens, i] = np.minimum.reduceat(hashed, starts) >> np.uint64(29)
+    return signatures
+
+
+def _day_keys(days):
+    """uint64 sort keys below 2^32 for days since the epoch; undated claims last."""
+    days = np.asarray(days, dtype=np.float64)
+    keys = np.full(len(days), _NO_DAY, dtype=np.uint64)
+    dated = ~np.isnan(days)
+    keys[dated] = np.clip(np.floor(days[dated]) + (1 << 31), 0, (1 << 32) - 2).astype(np.uint64)
+    return keys
+
+
+def _band_keys(signatures, band, rows_per_band, day_keys):
+    """
+    Sort keys for one LSH band: the 32-bit bucket in the high half, the day below.
+
+    Sorting by these keys orders claims by bucket, then by date.
+    """
+    block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band]
+    key = np.zeros(len(signatures), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for column in block.T:
+            key = (key ^ column) * _MIX
+    return ((key >> np.uint64(32)) << np.uint64(32)) | day_keys
+
+
+def lsh_candidate_pairs(signatures, bands=16, neighbors=10, days=None):
+    """
+    Candidate near-duplicate pairs from LSH banding.
+
+    Claims sharing all rows of any band land in the same bucket. Within a
+    bucket, claims are sorted by ``days`` (claim start, days since the
+    epoch) and each is paired with the next ``neighbors`` claims only,
+    keeping the pair count linear in the number of claims.
+
+    Returns:
+    --------
+    tuple
+        (first, second) claim row arrays with first < second, deduplicated
+    """
+    n_claims, n_hashes = signatures.shape
+    if n_hashes % bands:
+        raise ValueError(f"n_hashes ({n_hashes}) must be a multiple of bands ({bands})")
+    rows_per_band = n_hashes // bands
+    day_keys = _day_keys(np.zeros(n_claims) if days is None else days)
+    valid = np.flatnonzero(signatures[:, 0] != _EMPTY_SIGNATURE)
+
+    pair_keys = []
+    for band in range(bands):
+        keys = _band_keys(signatures, band, rows_per_band, day_keys)
+        first, second = bucket_neighbor_pairs(keys[valid], valid, neighbors)
+        pair_keys.append(np.minimum(first, second).astype(np.int64) * n_claims + np.maximum(first, second))
+
+    pair_keys = np.unique(np.concatenate(pair_keys))
+    return pair_keys // n_claims, pair_keys % n_claims
+
+
+def lsh_band_keys(signatures, bands=16, days=None):
+    """
+    (bands, n_claims) LSH sort keys of every band, see _band_keys.
+
+    Raises:
+    -------
+    ValueError
+        If the signature length is not a multiple of bands
+    """
+    n_claims, n_hashes = signatures.shape
+    if n_hashes % bands:
+        raise ValueError(f"n_hashes ({n_hashes}) must be a multiple of bands ({bands})")
+    rows_per_band = n_hashes // bands
+    day_keys = _day_keys(np.zeros(n_claims) if days is None else days)
+    keys = np.empty((bands, n_claims), dtype=np.uint64)
+    for band in range(bands):
+        keys[band] = _band_keys(signatures, band, rows_per_band, day_keys)
+    return keys
+
+
+def bucket_neighbor_pairs(keys, rows, neighbors=10):
+    """
+    Pairs of claims at most ``neighbors`` places apart within an LSH bucket of one band.
+
+    Parameters:
+    -----------
+    keys : np.ndarray
+        Band keys of the claims (see lsh_band_keys)
+    rows : np.ndarray
+        Their claim rows, ascending; equal keys are ordered by row
+    neighbors : int
+        Claims paired per claim within a bucket
+
+    Returns:
+    --------
+    tuple
+        (first, second) claim row arrays, first sorting before second
+    """
+    order = np.argsort(keys, kind='stable')
+    sorted_rows = rows[order]
+    sorted_buckets = keys[order] >> np.uint64(32)
+    firsts, seconds = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+    for offset in range(1, min(neighbors, len(sorted_rows) - 1) + 1):
+        same = sorted_buckets[:-offset] == sorted_buckets[offset:]
+        firsts.append(sorted_rows[:-offset][same])
+        seconds.append(sorted_rows[offset:][same])
+    return np.concatenate(firsts).astype(np.int64), np.concatenate(seconds).astype(np.int64)
+
+
+def signature_similarity(signatures, first, second, chunk_size=1_000_000):
+    """Estimated Jaccard similarity: share of equal MinHash values per pair."""
+    similarity = np.empty(len(first), dtype=np.float32)
+    for start in range(0, len(first), chunk_size):
+        stop = start + chunk_size
+        similarity[start:stop] = (signatures[first[start:stop]] == signatures[second[start:stop]]).mean(axis=1)
+    return similarity
+
+
+# =============================================================================
+# Detection
+# =============================================================================
+
+def find_near_duplicate_claims(claims, threshold=0.5, n_hashes=64, bands=16, neighbors=10,
+                               amount_tolerance=0.1, date_window_days=7, random_state=42):
+    """
+    Near-duplicate claim pairs and per-claim duplicate scores.
+
+    Parameters:
+    -----------
+    claims : pd.DataFrame
+        Claims with at least BeneID
+    threshold : float
+        Minimum estimated similarity for a pair to be reported
+    n_hashes : int
+        MinHash values per claim
+    bands : int
+        LSH bands; n_hashes / bands rows per band. More bands catch lower
+        similarities at the cost of more candidates.
+    neighbors : int
+        Claims paired per claim within an LSH bucket
+    amount_tolerance : float
+        Relative amount bucket width
+    date_window_days : int
+        Date window width in days
+    random_state : int
+        Seed for the hash functions
+
+    Returns:
+    --------
+    tuple
+        (pairs_df with ClaimRowA, ClaimRowB and Similarity at or above the
+        threshold, per-claim DuplicateClaimScore as float32: the highest
+        similarity to any candidate, 0 if none)
+    """
+    n_claims = len(claims)
+    claim_rows, tokens = claim_signature_tokens(claims, amount_tolerance, date_window_days)
+    signatures = minhash_signatures(claim_rows, tokens, n_claims, n_hashes, random_state)
+    first, second = lsh_candidate_pairs(signatures, bands, neighbors, days=claim_start_days(claims))
+    similarity = signature_similarity(signatures, first, second)
+
+    scores = np.zeros(n_claims, dtype=np.float32)
+    np.maximum.at(scores, first, similarity)
+    np.maximum.at(scores, second, similarity)
+
+    keep = similarity >= threshold
+    pairs = pd.DataFrame({
+        'ClaimRowA': first[keep],
+        'ClaimRowB': second[keep],
+        'Similarity': similarity[keep],
+    })
+    return pairs, scores
+
+
+def duplicate_claim_scores(claims, **kwargs):
+    """Per-claim DuplicateClaimScore; see find_near_duplicate_claims."""
+    return find_near_duplicate_claims(claims, **kwargs)[1]
+
+
+
+# =============================================================================
+# Stored Signatures
+# =============================================================================
+
+class ClaimSignatureIndex:
+    """
+    MinHash signatures of recent claims, for scoring new claims against them.
+
+    Each LSH band has a table of the stored claims sorted by bucket and
+    date, so a new claim's bucket neighbors are found by binary search.
+    Claims added since the tables were built sit in a small tail that is
+    sorted with each query, and are merged into the tables in bulk.
+    claim_features gives new claims exactly the DuplicateClaimScore that
+    find_near_duplicate_claims would give them on all claims added so far
+    plus their own batch (retention aside), in time proportional to the
+    batch and tail.
+
+    Parameters:
+    -----------
+    history_days : int or None
+        When the tables are rebuilt, claims starting more than this many
+        days before the latest stored claim, and undated claims, are
+        dropped (None keeps all)
+    n_hashes, bands, neighbors, amount_tolerance, date_window_days, random_state
+        See find_near_duplicate_claims
+    tail_limit : int
+        Claims kept in the tail before the tables are rebuilt (at least an
+        eighth of the indexed claims)
+    """
+
+    def __init__(self, history_days=DEFAULT_HISTORY_DAYS, n_hashes=64, bands=16, neighbors=10,
+                 amount_tolerance=0.1, date_window_days=7, random_state=42, tail_limit=4096):
+        if n_hashes % bands:
+            raise ValueError(f"n_hashes ({n_hashes}) must be a multiple of bands ({bands})")
+        self.history_days = history_days
+        self.n_hashes = n_hashes
+        self.bands = bands
+        self.neighbors = neighbors
+        self.amount_tolerance = amount_tolerance
+        self.date_window_days = date_window_days
+        self.random_state = random_state
+        self.tail_limit = tail_limit
+
+        self._signatures = np.zeros((0, n_hashes), dtype=np.uint32)
+        self._days = np.zeros(0, dtype=np.float64)
+        self.size = 0
+        # Per band: sorted band keys and their rows, covering rows [0, indexed)
+        self._keys = np.zeros((bands, 0), dtype=np.uint64)
+        self._rows = np.zeros((bands, 0), dtype=np.int64)
+        self.indexed = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild from to_dict output; arrays are copied so mmapped input can be updated."""
+        if data is None:
+            return cls()
+        index = cls(**{name: data[name] for name in [
+            "history_days", "n_hashes", "bands", "neighbors",
+            "amount_tolerance", "date_window_days", "random_state",
+        ]})
+        index._signatures = np.array(data["signatures"], dtype=np.uint32)
+        index._days = np.array(data["days"], dtype=np.float64)
+        index.size = len(index._days)
+        index._keys, index._rows = data["band_keys"], data["band_rows"]
+        index.indexed = index._keys.shape[1]
+        return index
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def signatures(self):
+        """(size, n_hashes) uint32 view of the stored signatures."""
+        return self._signatures[:self.size]
+
+    @property
+    def days(self):
+        """Claim start days of the stored claims (NaN when undated)."""
+        return self._days[:self.size]
+
+    def claim_signatures(self, claims):
+        """(signatures, start days) of claims, with this index's settings."""
+        claim_rows, tokens = claim_signature_tokens(claims, self.amount_tolerance, self.date_window_days)
+        signatures = minhash_signatures(claim_rows, tokens, len(claims), self.n_hashes, self.random_state)
+        return signatures, claim_start_days(claims)
+
+    # --------------------------------------------
+    # Updates
+    # --------------------------------------------
+    def update(self, claims):
+        """Add a batch of claims; claims without signature tokens are skipped."""
+        signatures, days = self.claim_signatures(claims)
+        valid = signatures[:, 0] != _EMPTY_SIGNATURE
+        signatures, days = signatures[valid], days[valid]
+
+        needed = self.size + len(days)
+        if needed > len(self._days):
+            capacity = max(needed, 2 * len(self._days))
+            grown = np.zeros((capacity, self.n_hashes), dtype=np.uint32)
+            grown[:self.size] = self.signatures
+            self._signatures = grown
+            self._days = np.concatenate([self.days, np.full(capacity - self.size, np.nan)])
+        self._signatures[self.size:needed] = signatures
+        self._days[self.size:needed] = days
+        self.size = needed
+
+        # Tail grows with the tables, so rebuild cost stays amortized O(log n) per claim
+        if self.size - self.indexed > max(self.tail_limit, self.indexed // 8):
+            self.rebuild()
+
+    def rebuild(self):
+        """Apply the retention limit and index every stored claim in the band tables."""
+        if self.history_days is not None and self.size:
+            days = self.days
+            latest = np.nanmax(days) if (~np.isnan(days)).any() else np.nan
+            keep = np.flatnonzero(days >= latest - self.history_days)
+            if len(keep) < self.size:
+                self._signatures = self.signatures[keep]
+                self._days = days[keep]
+                self.size = len(keep)
+
+        rows_per_band = self.n_hashes // self.bands
+        day_keys = _day_keys(self.days)
+        keys = np.empty((self.bands, self.size), dtype=np.uint64)
+        rows = np.empty((self.bands, self.size), dtype=np.int64)
+        for band in range(self.bands):
+            band_keys = _band_keys(self.signatures, band, rows_per_band, day_keys)
+            rows[band] = np.argsort(band_keys, kind='stable')
+            keys[band] = band_keys[rows[band]]
+        self._keys, self._rows = keys, rows
+        self.indexed = self.size
+
+    # --------------------------------------------
+    # Features
+    # --------------------------------------------
+    def _band_candidates(self, band, extra_keys, is_batch):
+        """
+        Bucket neighbors of the batch claims in one band.
+
+        The stored claims sort as one sequence: the indexed claims by band
+        key, and the tail and batch claims (``extra``, later rows) after
+        indexed claims with an equal key. A claim's candidates are the
+        claims of its bucket at most ``neighbors`` places away in that
+        sequence, as in lsh_candidate_pairs.
+
+        Returns:
+        --------
+        tuple
+            (extra positions of batch claims, candidate rows): candidate
+            rows below self.size are stored rows, the others are
+            self.size + extra position
+        """
+        table_keys, table_rows = self._keys[band], self._rows[band]
+        neighbors = self.neighbors
+        order = np.argsort(extra_keys, kind='stable')
+        sorted_keys = extra_keys[order]
+        n_extra = len(order)
+        # Place of every extra claim in the merged sequence
+        inserted = np.searchsorted(table_keys, sorted_keys, side='right')
+        merged = inserted + np.arange(n_extra)
+
+        queries = np.flatnonzero(is_batch[order])
+        offsets = np.concatenate([np.arange(-neighbors, 0), np.arange(1, neighbors + 1)])
+        firsts, seconds = [], []
+
+        # Extra claims: neighbors within the sorted tail and batch
+        other = queries[:, None] + offsets
+        inside = (other >= 0) & (other < n_extra)
+        query = np.broadcast_to(queries[:, None], other.shape)[inside]
+        other = other[inside]
+        close = ((np.abs(merged[other] - merged[query]) <= neighbors)
+                 & (sorted_keys[other] >> np.uint64(32) == sorted_keys[query] >> np.uint64(32)))
+        firsts.append(order[query[close]])
+        seconds.append(self.size + order[other[close]])
+
+        # Indexed claims: the neighbors of the insertion point
+        table = inserted[queries][:, None] + np.arange(-neighbors, neighbors)
+        inside = (table >= 0) & (table < len(table_keys))
+        query = np.broadcast_to(queries[:, None], table.shape)[inside]
+        table = table[inside]
+        table_merged = table + np.searchsorted(sorted_keys, table_keys[table], side='left')
+        close = ((np.abs(table_merged - merged[query]) <= neighbors)
+                 & (table_keys[table] >> np.uint64(32) == sorted_keys[query] >> np.uint64(32)))
+        firsts.append(order[query[close]])
+        seconds.append(table_rows[table[close]])
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def claim_features(self, claims):
+        """
+        DuplicateClaimScore of claims not yet added, as if they were added.
+
+        Returns:
+        --------
+        np.ndarray
+            float32 scores, as duplicate_claim_scores
+        """
+        signatures, days = self.claim_signatures(claims)
+        n_claims = len(claims)
+        tail = np.arange(self.indexed, self.size)
+        extra_signatures = np.concatenate([self.signatures[tail], signatures])
+        extra_days = np.concatenate([self.days[tail], days])
+        is_batch = np.arange(len(extra_days)) >= len(tail)
+        valid = extra_signatures[:, 0] != _EMPTY_SIGNATURE
+        extra = np.flatnonzero(valid)
+
+        rows_per_band = self.n_hashes // self.bands
+        day_keys = _day_keys(extra_days[extra])
+        pair_keys = []
+        n_rows = self.size + len(extra_days)
+        for band in range(self.bands):
+            keys = _band_keys(extra_signatures[extra], band, rows_per_band, day_keys)
+            first, second = self._band_candidates(band, keys, is_batch[extra])
+            # Rows of the extra claims are their extra positions after the stored ones
+            second = np.where(second >= self.size, self.size + extra[np.maximum(second - self.size, 0)], second)
+            pair_keys.append(extra[first].astype(np.int64) * n_rows + second)
+
+        scores = np.zeros(n_claims, dtype=np.float32)
+        pair_keys = np.unique(np.concatenate(pair_keys)) if pair_keys else np.zeros(0, dtype=np.int64)
+        if len(pair_keys) == 0:
+            return scores
+        first, second = pair_keys // n_rows, pair_keys % n_rows
+        stored = second < self.size
+        other = np.empty((len(second), self.n_hashes), dtype=np.uint32)
+        other[stored] = self.signatures[second[stored]]
+        other[~stored] = extra_signatures[second[~stored] - self.size]
+        similarity = (extra_signatures[first] == other).mean(axis=1).astype(np.float32)
+        np.maximum.at(scores, first - len(tail), similarity)
+        return scores
+
+    # --------------------------------------------
+    # Export
+    # --------------------------------------------
+    def to_dict(self):
+        """Plain arrays for the model artifact; claims beyond the band tables stay in the tail."""
+        return {
+            "history_days": self.history_days,
+            "n_hashes": self.n_hashes,
+            "bands": self.bands,
+            "neighbors": self.neighbors,
+            "amount_tolerance": self.amount_tolerance,
+            "date_window_days": self.date_window_days,
+            "random_state": self.random_state,
+            "signatures": self.signatures.copy(),
+            "days": self.days.copy(),
+            "band_keys": self._keys.copy(),
+            "band_rows": self._rows.copy(),
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find near-duplicate claims")
+    parser.add_argument("--data", help="Path to the cleaned claims CSV", default="cleaned_claims.csv")
+    parser.add_argument("--output", help="Duplicate pairs CSV", default="duplicate_pairs.csv")
+    parser.add_argument("--threshold", type=float, default=0.5, help="Minimum estimated similarity")
+
+    args = parser.parse_args()
+
+    try:
+        claims = pd.read_csv(args.data)
+        pairs, _ = find_near_duplicate_claims(claims, threshold=args.threshold)
+        if 'ClaimID' in claims.columns:
+            claim_ids = claims['ClaimID'].to_numpy()
+            pairs.insert(0, 'ClaimIDA', claim_ids[pairs['ClaimRowA']])
+            pairs.insert(1, 'ClaimIDB', claim_ids[pairs['ClaimRowB']])
+        pairs.sort_values('Similarity', ascending=False).to_csv(args.output, index=False)
+        print(f"✓ {len(pairs):,} near-duplicate pairs written to {args.output}")
+    except Exception as e:
+        print(f"Duplicate detection failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Flat-Array Isolation Forest Scorer
+==================================
+
+Exports a fitted sklearn IsolationForest into contiguous NumPy node arrays
+and scores batches with a vectorized, level-by-level traversal of all
+trees at once. Scores and anomaly flags come out of a single pass, instead
+of walking the forest once for decision_function and again for predict.
+
+Layout:
+    All trees are concatenated into one node table. Node i has a global
+    feature index, a split threshold, its children at children[2i] (left)
+    and children[2i + 1] (right), and the path-length value of the leaf
+    (depth + c(n_node_samples) - 1). Leaves point to themselves, so every
+    sample can take exactly max_depth steps without branching on leaf
+    status.
+
+Scores match IsolationForest.decision_function: per-tree leaf values are
+accumulated in the same tree order and with the same float64 arithmetic.
+"""
+
+import weakref
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+
+def average_path_length(n_samples):
+    """
+    Average path length c(n) of an unsuccessful BST search over n samples
+    (the Isolation Forest path-length correction for unsplit leaves).
+    """
+    n_samples = np.asarray(n_samples, dtype=np.float64)
+    result = np.zeros_like(n_samples)
+    result[n_samples == 2] = 1.0
+    large = n_samples > 2
+    result[large] = (
+        2.0 * (np.log(n_samples[large] - 1.0) + np.euler_gamma)
+        - 2.0 * (n_samples[large] - 1.0) / n_samples[large]
+    )
+    return result
+
+
+class FlatIsolationForest:
+    """
+    Isolation Forest stored as flat node arrays for vectorized scoring.
+
+    Build with ``FlatIsolationForest.from_model(fitted_forest)``.
+    """
+
+    # Samples x trees handled per traversal block; small enough that the
+    # per-block node and value arrays stay in cache
+    BLOCK_ELEMENTS = 1 << 16
+
+    def __init__(self, feature, threshold, children, missing_go_to_left, leaf_value,
+                 roots, max_depth, n_features, max_samples, offset):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.missing_go_to_left = missing_go_to_left
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.n_features = n_features
+        self.max_samples = max_samples
+        self.offset = offset
+        self.n_trees = len(roots)
+        self._denominator = self.n_trees * float(average_path_length([max_samples])[0])
+
+    @classmethod
+    def from_model(cls, model):
+        """
+        Export a fitted sklearn IsolationForest.
+
+        Parameters:
+        -----------
+        model : IsolationForest
+            Fitted forest
+
+        Returns:
+        --------
+        FlatIsolationForest
+        """
+        if not isinstance(model, IsolationForest) or not hasattr(model, "estimators_"):
+            raise TypeError("Expected a fitted sklearn IsolationForest")
+
+        features, thresholds, children, missing_left, leaf_values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator, tree_features in zip(model.estimators_, model.estimators_features_):
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            is_leaf = tree.children_left == -1
+            node_ids = np.arange(offset, offset + n_nodes, dtype=np.int64)
+
+            # Map tree-local feature indices back to columns of X
+            feature = np.where(is_leaf, 0, np.asarray(tree_features)[np.maximum(tree.feature, 0)])
+            features.append(feature)
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+            tree_children = np.empty((n_nodes, 2), dtype=np.int64)
+            tree_children[:, 0] = np.where(is_leaf, node_ids, tree.children_left + offset)
+            tree_children[:, 1] = np.where(is_leaf, node_ids, tree.children_right + offset)
+            children.append(tree_children.ravel())
+            missing_left.append(np.asarray(tree.missing_go_to_left, dtype=bool))
+
+            # Same expression and dtype as sklearn's per-tree depth update
+            depths = tree.compute_node_depths()
+            path_lengths = average_path_length(tree.n_node_samples)
+            leaf_values.append(depths + path_lengths - 1.0)
+
+            roots.append(offset)
+            max_depth = max(max_depth, tree.max_depth)
+            offset += n_nodes
+
+        index_dtype = np.int32 if offset < np.iinfo(np.int32).max else np.int64
+        return cls(
+            feature=np.concatenate(features).astype(index_dtype),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            children=np.concatenate(children).astype(index_dtype),
+            missing_go_to_left=np.concatenate(missing_left),
+            leaf_value=np.concatenate(leaf_values),
+            roots=np.asarray(roots, dtype=index_dtype),
+            max_depth=int(max_depth),
+            n_features=int(model.n_features_in_),
+            max_samples=int(model.max_samples_),
+            offset=float(model.offset_),
+        )
+
+    # --------------------------------------------
+    # Traversal
+    # --------------------------------------------
+    def _leaf_values(self, X):
+        """Leaf path-length value for every (sample, tree) pair of a block."""
+        n_samples = X.shape[0]
+        has_nan = np.isnan(X).any()
+        flat_X = X.ravel()
+        row_offset = (np.arange(n_samples, dtype=np.int64) * self.n_features)[:, None]
+
+        node = np.broadcast_to(self.roots, (n_samples, self.n_trees)).copy()
+        for _ in range(self.max_depth):
+            values = flat_X[row_offset + self.feature[node]]
+            if has_nan:
+                go_right = ~((values <= self.threshold[node])
+                             | (np.isnan(values) & self.missing_go_to_left[node]))
+            else:
+                go_right = values > self.threshold[node]
+            node = self.children[2 * node + go_right]
+        return self.leaf_value[node]
+
+    def _path_length_sums(self, X):
+        depths = np.zeros(X.shape[0])
+        leaf_values = self._leaf_values(X)
+        # Accumulate tree by tree, in the order sklearn does
+        for tree_idx in range(self.n_trees):
+            depths += leaf_values[:, tree_idx]
+        return depths
+
+    # --------------------------------------------
+    # PUBLIC METHODS
+    # --------------------------------------------
+    def score_samples(self, X):
+        """Equivalent of IsolationForest.score_samples (lower = more abnormal)."""
+        # sklearn validates and scores in float32
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"Expected an array with {self.n_features} features, got shape {X.shape}")
+
+        block_rows = max(1, self.BLOCK_ELEMENTS // self.n_trees)
+        depths = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], block_rows):
+            stop = start + block_rows
+            depths[start:stop] = self._path_length_sums(X[start:stop])
+
+        return -(2 ** -np.divide(
+            depths, self._denominator, out=np.ones_like(depths), where=self._denominator != 0
+        ))
+
+    def decision_function(self, X):
+        """Equivalent of IsolationForest.decision_function (negative = anomaly)."""
+        return self.score_samples(X) - self.offset
+
+    def score(self, X):
+        """
+        Anomaly scores and binary flags in one traversal.
+
+        Returns:
+        --------
+        tuple
+            (anomaly_scores, anomaly_flags) with flags 1 = anomaly, 0 = normal,
+            matching decision_function and predict of the source model
+        """
+        anomaly_scores = self.decision_function(X)
+        anomaly_flags = (anomaly_scores < 0).astype(np.int64)
+        return anomaly_scores, anomaly_flags
+
+
+_flat_forests = weakref.WeakKeyDictionary()
+
+
+def flat_forest_for(model):
+    """Flat export of a fitted forest, cached for the lifetime of the model."""
+    if isinstance(model, FlatIsolationForest):
+        return model
+    flat = _flat_forests.get(model)
+    if flat is None:
+        flat = FlatIsolationForest.from_model(model)
+        _flat_forests[model] = flat
+    return flat
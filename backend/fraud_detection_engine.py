@@ -10,27 +10,119 @@ Author: Fraud Detection Team
 Version: 1.0.0
 """
 
+import os
+import time
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import confusion_matrix, precision_score, recall_score, f1_score
+from sklearn.metrics import precision_score, recall_score, f1_score
+from code_features import CODE_FEATURE_COLUMNS, ProviderCodeCounts, has_code_columns, is_code_column
+from duplicate_claims import DUPLICATE_SCORE_COLUMN, duplicate_claim_scores
+from stay_overlaps import OVERLAP_FEATURE_COLUMNS, STAY_DATE_COLUMNS, stay_overlap_features
+from temporal_features import TEMPORAL_FEATURE_COLUMNS, claim_timeline, temporal_claim_features
+from provider_network import (
+    NETWORK_FEATURE_COLUMNS, PHYSICIAN_COLUMNS, network_claim_features, provider_network_features
+)
+from detectors import AnomalyDetector, IsolationForestDetector, get_detector
+from claim_explanations import DEFAULT_TOP_N, explain_claims
+from ranking_evaluation import evaluate_ranking
+from forest_scorer import flat_forest_for
+from pipeline_instrumentation import PipelineInstrumentation, logger, set_verbosity
+from risk_calibration import ScoreCalibration
 import warnings
 warnings.filterwarnings('ignore')
 
 
+# Numeric indicators fed to the anomaly detector, in model column order.
+# These are numeric indicators that could signal fraudulent behavior
+FEATURE_COLUMNS = [
+    'InscClaimAmtReimbursed',      # Claim amount (unusual amounts are suspicious)
+    'ClaimDurationInDays',          # Duration of claim processing
+    'ProviderAvgClaimAmount',       # Provider's average claim amount
+    'ProviderClaimCount',           # Provider's claim volume
+    'ClaimAmountDeviation',         # Deviation from global average
+    'ProcedureFrequency',           # How often provider uses procedures
+    'TotalChronicConditions',       # Patient's chronic condition burden
+    'IPAnnualReimbursementAmt',     # Inpatient annual reimbursement
+    'OPAnnualReimbursementAmt'      # Outpatient annual reimbursement
+]
+
+# Raw optional columns used as features when present in the dataset
+OPTIONAL_INPUT_COLUMNS = ['AdmissionDurationInDays', 'Age']
+
+# Appended to FEATURE_COLUMNS when present; the code-mix features exist
+# whenever the dataset has procedure or diagnosis code columns, the
+# duplicate score, stay-overlap and network features whenever it has BeneID,
+# the claim-velocity features whenever it has ClaimStartDt
+OPTIONAL_FEATURE_COLUMNS = (
+    OPTIONAL_INPUT_COLUMNS + CODE_FEATURE_COLUMNS + [DUPLICATE_SCORE_COLUMN]
+    + OVERLAP_FEATURE_COLUMNS + NETWORK_FEATURE_COLUMNS + TEMPORAL_FEATURE_COLUMNS
+)
+
+# Raw input columns the pipeline reads, besides the ChronicCond_ flags and
+# the ClmProcedureCode_/ClmDiagnosisCode_ columns.
+# Used for column projection when loading columnar files.
+PIPELINE_INPUT_COLUMNS = [
+    'ClaimID', 'BeneID', 'Provider', 'InscClaimAmtReimbursed', 'PotentialFraud',
+    'ClaimDurationInDays', 'IPAnnualReimbursementAmt', 'OPAnnualReimbursementAmt'
+] + [col for pair in STAY_DATE_COLUMNS for col in pair] + PHYSICIAN_COLUMNS + OPTIONAL_INPUT_COLUMNS
+
+COLUMNAR_EXTENSIONS = ('.feather', '.arrow', '.parquet')
+
+
 # =============================================================================
 # STEP 1: Load Dataset
 # =============================================================================
 
-def load_data(filepath='cleaned_claims.csv'):
+def is_pipeline_input(column):
+    """True if the detection pipeline reads this raw column."""
+    return (column in PIPELINE_INPUT_COLUMNS or column.startswith('ChronicCond_')
+            or is_code_column(column))
+
+
+def pipeline_input_columns(available_columns):
+    """Subset of available_columns that the pipeline actually reads."""
+    return [col for col in available_columns if is_pipeline_input(col)]
+
+
+def _read_columnar(filepath, columns=None):
+    """
+    Read an Arrow IPC (Feather) or Parquet file, memory-mapped where possible.
+    
+    Uncompressed Arrow IPC files are memory-mapped, so numeric columns are
+    not copied until pandas needs them. Dtypes pinned at write time
+    (categoricals, float32, int8) are preserved.
+    """
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+    
+    if filepath.endswith('.parquet'):
+        schema_names = pq.read_schema(filepath).names
+        if columns == 'pipeline':
+            columns = pipeline_input_columns(schema_names)
+        table = pq.read_table(filepath, columns=columns, memory_map=True)
+    else:
+        if columns == 'pipeline':
+            schema_names = feather.read_table(filepath, memory_map=True).schema.names
+            columns = pipeline_input_columns(schema_names)
+        table = feather.read_table(filepath, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def load_data(filepath='cleaned_claims.csv', columns=None):
     """
     Load and validate the cleaned claims dataset.
     
+    Columnar files (.feather/.arrow/.parquet) written by main_pipeline are
+    read with pinned dtypes and memory mapping; anything else is read as CSV.
+    
     Parameters:
     -----------
     filepath : str
-        Path to the cleaned claims CSV file
+        Path to the cleaned claims file
+    columns : list or 'pipeline', optional
+        Columns to load. 'pipeline' projects down to the columns the
+        detection pipeline uses. Defaults to all columns.
         
     Returns:
     --------
@@ -44,18 +136,22 @@ def load_data(filepath='cleaned_claims.csv'):
     ValueError
         If required columns are missing
     """
-    print("=" * 60)
-    print("STEP 1: Loading Dataset")
-    print("=" * 60)
+    logger.info("=" * 60)
+    logger.info("STEP 1: Loading Dataset")
+    logger.info("=" * 60)
     
-    # Load the dataset
-    try:
-        df = pd.read_csv(filepath)
-        print(f"✓ Successfully loaded {filepath}")
-        print(f"  - Shape: {df.shape[0]:,} rows × {df.shape[1]} columns")
-    except FileNotFoundError:
+    if not os.path.exists(filepath):
         raise FileNotFoundError(f"Dataset file not found: {filepath}")
     
+    # Load the dataset
+    if filepath.endswith(COLUMNAR_EXTENSIONS):
+        df = _read_columnar(filepath, columns)
+    else:
+        usecols = is_pipeline_input if columns == 'pipeline' else columns
+        df = pd.read_csv(filepath, usecols=usecols)
+    logger.info(f"✓ Successfully loaded {filepath}")
+    logger.info(f"  - Shape: {df.shape[0]:,} rows × {df.shape[1]} columns")
+    
     # Validate required columns exist
     required_columns = ['Provider', 'InscClaimAmtReimbursed', 'PotentialFraud']
     missing_columns = [col for col in required_columns if col not in df.columns]
@@ -63,15 +159,15 @@ def load_data(filepath='cleaned_claims.csv'):
     if missing_columns:
         raise ValueError(f"Missing required columns: {missing_columns}")
     
-    print(f"✓ Required columns validated")
+    logger.info(f"✓ Required columns validated")
     
     # Convert PotentialFraud from Yes/No to 1/0
     # This is our ground truth label for evaluation (not used in training)
-    df['PotentialFraud'] = df['PotentialFraud'].map({'Yes': 1, 'No': 0})
+    df['PotentialFraud'] = df['PotentialFraud'].astype(object).map({'Yes': 1, 'No': 0})
     fraud_count = df['PotentialFraud'].sum()
-    print(f"✓ Converted PotentialFraud to binary (1/0)")
-    print(f"  - Fraudulent claims: {fraud_count:,} ({fraud_count/len(df)*100:.2f}%)")
-    print(f"  - Normal claims: {len(df) - fraud_count:,} ({(len(df)-fraud_count)/len(df)*100:.2f}%)")
+    logger.info(f"✓ Converted PotentialFraud to binary (1/0)")
+    logger.info(f"  - Fraudulent claims: {fraud_count:,} ({fraud_count/len(df)*100:.2f}%)")
+    logger.info(f"  - Normal claims: {len(df) - fraud_count:,} ({(len(df)-fraud_count)/len(df)*100:.2f}%)")
     
     return df
 
@@ -80,12 +176,30 @@ def load_data(filepath='cleaned_claims.csv'):
 # STEP 2: Feature Engineering
 # =============================================================================
 
+def _broadcast_group_stat(group_values, codes, out):
+    """
+    Write a per-group statistic to every row of its group.
+    
+    Rows with code -1 (missing key) get NaN, matching a left merge.
+    """
+    np.take(group_values.astype(out.dtype, copy=False), codes, out=out, mode='clip')
+    out[codes < 0] = np.nan
+    return out
+
+
 def engineer_features(df):
     """
     Perform comprehensive feature engineering for fraud detection.
     
     Creates provider-level aggregates, peer comparisons, procedure frequencies,
-    and chronic condition counts to capture anomalous patterns.
+    procedure/diagnosis code-mix features, near-duplicate claim scores,
+    overlapping beneficiary stays, provider network features, rolling claim
+    velocity and chronic condition counts to capture anomalous patterns.
+    
+    Provider and procedure keys are converted to integer codes once and all
+    aggregates are computed with np.bincount and written into preallocated
+    float32 columns, so no intermediate frames are merged back in. The
+    input dataframe is not modified.
     
     Parameters:
     -----------
@@ -95,86 +209,200 @@ def engineer_features(df):
     Returns:
     --------
     pd.DataFrame
-        Dataframe with engineered features merged
+        Dataframe with engineered features added. The global average claim
+        amount is stored in ``df.attrs['GlobalAvgClaimAmount']``.
     """
-    print("\n" + "=" * 60)
-    print("STEP 2: Feature Engineering")
-    print("=" * 60)
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP 2: Feature Engineering")
+    logger.info("=" * 60)
     
-    df = df.copy()
+    # Shallow copy: new columns are added without copying existing data
+    df = df.copy(deep=False)
+    n_rows = len(df)
     
     # -------------------------------------------------------------------------
     # 2.1 Provider-Level Aggregates
     # -------------------------------------------------------------------------
-    print("\n2.1 Computing Provider-Level Aggregates...")
-    
-    provider_stats = df.groupby('Provider').agg({
-        'InscClaimAmtReimbursed': ['mean', 'count'],
-        'PotentialFraud': 'mean'  # For validation only
-    }).reset_index()
-    
-    # Flatten column names
-    provider_stats.columns = ['Provider', 'ProviderAvgClaimAmount', 
-                              'ProviderClaimCount', 'ProviderFraudRate']
-    
-    # Merge back to main dataframe
-    df = df.merge(provider_stats, on='Provider', how='left')
-    print(f"  ✓ ProviderAvgClaimAmount: Average claim amount per provider")
-    print(f"  ✓ ProviderClaimCount: Number of claims per provider")
-    print(f"  ✓ ProviderFraudRate: Historical fraud rate per provider (validation only)")
+    logger.info("\n2.1 Computing Provider-Level Aggregates...")
+    
+    # Integer provider codes (-1 for missing); categorical columns reuse their codes
+    provider_codes, providers = pd.factorize(df['Provider'])
+    n_providers = len(providers)
+    has_provider = provider_codes >= 0
+    
+    amounts = df['InscClaimAmtReimbursed'].to_numpy(dtype=np.float64, na_value=np.nan)
+    has_amount = has_provider & ~np.isnan(amounts)
+    amount_codes = provider_codes[has_amount]
+    provider_count = np.bincount(amount_codes, minlength=n_providers)
+    provider_sum = np.bincount(amount_codes, weights=amounts[has_amount], minlength=n_providers)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        provider_avg = provider_sum / provider_count
+    
+    fraud = df['PotentialFraud'].to_numpy(dtype=np.float64, na_value=np.nan)
+    has_fraud = has_provider & ~np.isnan(fraud)
+    fraud_codes = provider_codes[has_fraud]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        provider_fraud_rate = (
+            np.bincount(fraud_codes, weights=fraud[has_fraud], minlength=n_providers)
+            / np.bincount(fraud_codes, minlength=n_providers)
+        )
+    
+    df['ProviderAvgClaimAmount'] = _broadcast_group_stat(
+        provider_avg, provider_codes, np.empty(n_rows, dtype=np.float32))
+    df['ProviderClaimCount'] = _broadcast_group_stat(
+        provider_count, provider_codes, np.empty(n_rows, dtype=np.float32))
+    df['ProviderFraudRate'] = _broadcast_group_stat(
+        provider_fraud_rate, provider_codes, np.empty(n_rows, dtype=np.float32))
+    logger.info(f"  ✓ ProviderAvgClaimAmount: Average claim amount per provider")
+    logger.info(f"  ✓ ProviderClaimCount: Number of claims per provider")
+    logger.info(f"  ✓ ProviderFraudRate: Historical fraud rate per provider (validation only)")
     
     # -------------------------------------------------------------------------
     # 2.2 Peer Average Comparison
     # -------------------------------------------------------------------------
-    print("\n2.2 Computing Peer Average Comparison...")
+    logger.info("\n2.2 Computing Peer Average Comparison...")
     
-    # Global average claim amount across all providers
-    global_avg = df['InscClaimAmtReimbursed'].mean()
-    df['GlobalAvgClaimAmount'] = global_avg
-    df['ClaimAmountDeviation'] = df['InscClaimAmtReimbursed'] - global_avg
+    # Global average claim amount across all providers, kept as metadata
+    # rather than a constant column
+    global_avg = float(np.nanmean(amounts)) if n_rows else np.nan
+    df.attrs['GlobalAvgClaimAmount'] = global_avg
+    deviation = np.empty(n_rows, dtype=np.float32)
+    np.subtract(amounts, global_avg, out=deviation, casting='same_kind')
+    df['ClaimAmountDeviation'] = deviation
     
-    print(f"  ✓ GlobalAvgClaimAmount: ${global_avg:,.2f}")
-    print(f"  ✓ ClaimAmountDeviation: Deviation from global average")
+    logger.info(f"  ✓ GlobalAvgClaimAmount: ${global_avg:,.2f}")
+    logger.info(f"  ✓ ClaimAmountDeviation: Deviation from global average")
     
     # -------------------------------------------------------------------------
     # 2.3 Procedure Frequency per Provider
     # -------------------------------------------------------------------------
-    print("\n2.3 Computing Procedure Frequency per Provider...")
+    logger.info("\n2.3 Computing Procedure Frequency per Provider...")
     
     # Check if procedure code column exists
     procedure_col = 'ClmProcedureCode_1'
     if procedure_col in df.columns:
-        # Count frequency of each procedure per provider
-        procedure_freq = df.groupby(['Provider', procedure_col]).size().reset_index(name='ProcedureFrequency')
+        # Count frequency of each procedure per provider via a combined
+        # (provider, procedure) integer key
+        procedure_codes, procedures = pd.factorize(df[procedure_col])
+        has_pair = has_provider & (procedure_codes >= 0)
+        pair_keys = provider_codes.astype(np.int64) * max(len(procedures), 1) + procedure_codes
+        pair_codes, _ = pd.factorize(pair_keys[has_pair])
+        pair_counts = np.bincount(pair_codes)
         
-        # Merge back to main dataframe
-        df = df.merge(procedure_freq, on=['Provider', procedure_col], how='left')
-        print(f"  ✓ ProcedureFrequency: How often each provider uses specific procedures")
+        frequency = np.full(n_rows, np.nan, dtype=np.float32)
+        frequency[has_pair] = pair_counts[pair_codes]
+        df['ProcedureFrequency'] = frequency
+        logger.info(f"  ✓ ProcedureFrequency: How often each provider uses specific procedures")
     else:
         # If procedure column doesn't exist, set frequency to 1 (neutral)
-        df['ProcedureFrequency'] = 1
-        print(f"  ⚠ {procedure_col} not found, using default value")
+        df['ProcedureFrequency'] = np.ones(n_rows, dtype=np.float32)
+        logger.warning(f"  ⚠ {procedure_col} not found, using default value")
+    
+    # -------------------------------------------------------------------------
+    # 2.4 Procedure and Diagnosis Code Mix
+    # -------------------------------------------------------------------------
+    logger.info("\n2.4 Computing Procedure and Diagnosis Code Mix...")
+    
+    if has_code_columns(df.columns):
+        # One sparse provider x code count matrix over all code columns
+        code_counts, code_features = ProviderCodeCounts.fit_claim_features(df)
+        for name, values in code_features.items():
+            df[name] = values
+        logger.info(f"  ✓ Provider x code matrix: {code_counts.matrix.shape[0]:,} providers × "
+                    f"{code_counts.matrix.shape[1]:,} codes, {len(code_counts):,} nonzeros")
+        logger.info(f"  ✓ CodeFrequency: Share of the provider's coding taken by the claim's codes")
+        logger.info(f"  ✓ CodeRarity: How few providers bill the claim's codes")
+        logger.info(f"  ✓ ProviderCodeDivergence: Provider code mix vs. the pooled peer mix")
+    else:
+        logger.warning(f"  ⚠ No ClmProcedureCode_/ClmDiagnosisCode_ columns found, skipping")
+    
+    # -------------------------------------------------------------------------
+    # 2.5 Near-Duplicate Claims
+    # -------------------------------------------------------------------------
+    logger.info("\n2.5 Detecting Near-Duplicate Claims...")
+    
+    if 'BeneID' in df.columns:
+        # MinHash/LSH over beneficiary, provider, codes, amount and date tokens
+        duplicate_scores = duplicate_claim_scores(df)
+        df[DUPLICATE_SCORE_COLUMN] = duplicate_scores
+        logger.info(f"  ✓ {DUPLICATE_SCORE_COLUMN}: Highest estimated similarity to another claim")
+        logger.info(f"    Claims with a likely near-duplicate (≥0.8): {(duplicate_scores >= 0.8).sum():,}")
+    else:
+        logger.warning(f"  ⚠ BeneID not found, skipping near-duplicate detection")
+    
+    # -------------------------------------------------------------------------
+    # 2.6 Overlapping Beneficiary Stays
+    # -------------------------------------------------------------------------
+    logger.info("\n2.6 Detecting Overlapping Beneficiary Stays...")
+    
+    if 'BeneID' in df.columns:
+        # Sort-sweep interval join per beneficiary, no self-merge
+        overlap_features = stay_overlap_features(df)
+        for name, values in overlap_features.items():
+            df[name] = values
+        overlapping = int((overlap_features['OverlappingStayCount'] > 0).sum())
+        logger.info(f"  ✓ OverlappingStayCount: Other providers' claims overlapping the same beneficiary's stay")
+        logger.info(f"  ✓ ProviderOverlapRate: Share of each provider's claims with such an overlap")
+        logger.info(f"    Claims with an overlapping stay: {overlapping:,}")
+    else:
+        logger.warning(f"  ⚠ BeneID not found, skipping stay overlap detection")
     
     # -------------------------------------------------------------------------
-    # 2.4 Chronic Condition Count
+    # 2.7 Provider Network Features
     # -------------------------------------------------------------------------
-    print("\n2.4 Computing Chronic Condition Count...")
+    logger.info("\n2.7 Computing Provider Network Features...")
+    
+    if 'BeneID' in df.columns:
+        # Sparse provider x physician / provider x beneficiary graphs
+        network = provider_network_features(df)
+        for name, values in network_claim_features(df, network).items():
+            df[name] = values
+        logger.info(f"  ✓ PhysicianDegree / BeneficiaryDegree: Distinct physicians and beneficiaries per provider")
+        logger.info(f"  ✓ SharedPhysicianPeers / SharedBeneficiaryPeers: Providers sharing them")
+        logger.info(f"  ✓ NetworkComponentSize: Largest shared-physician ring: "
+                    f"{int(network['NetworkComponentSize'].max()) if len(network) else 0:,} providers")
+    else:
+        logger.warning(f"  ⚠ BeneID not found, skipping provider network features")
+    
+    # -------------------------------------------------------------------------
+    # 2.8 Claim Velocity
+    # -------------------------------------------------------------------------
+    logger.info("\n2.8 Computing Claim Velocity...")
+    
+    if 'ClaimStartDt' in df.columns:
+        # Trailing 7/30-day windows per provider over claims sorted by date
+        velocity = temporal_claim_features(df)
+        for name, values in velocity.items():
+            df[name] = values
+        logger.info(f"  ✓ ClaimCount7d / ClaimCount30d: Provider's claims in the trailing 7/30 days")
+        logger.info(f"  ✓ ClaimAmount7d / ClaimAmount30d: Their total amounts")
+        logger.info(f"  ✓ ClaimBurstScore: 7-day vs. 30-day claim rate")
+    else:
+        logger.warning(f"  ⚠ ClaimStartDt not found, skipping claim velocity features")
+    
+    # -------------------------------------------------------------------------
+    # 2.9 Chronic Condition Count
+    # -------------------------------------------------------------------------
+    logger.info("\n2.9 Computing Chronic Condition Count...")
     
     # Identify all chronic condition columns
     chronic_cols = [col for col in df.columns if col.startswith('ChronicCond_')]
     
+    total_conditions = np.zeros(n_rows, dtype=np.float32)
     if chronic_cols:
         # Sum all chronic condition indicators for each patient
-        df['TotalChronicConditions'] = df[chronic_cols].sum(axis=1)
-        print(f"  ✓ TotalChronicConditions: Sum of {len(chronic_cols)} chronic condition indicators")
-        print(f"    Average conditions per claim: {df['TotalChronicConditions'].mean():.2f}")
+        for col in chronic_cols:
+            total_conditions += df[col].to_numpy(dtype=np.float32, na_value=0)
+        df['TotalChronicConditions'] = total_conditions
+        logger.info(f"  ✓ TotalChronicConditions: Sum of {len(chronic_cols)} chronic condition indicators")
+        logger.info(f"    Average conditions per claim: {total_conditions.mean():.2f}")
     else:
         # If no chronic condition columns, set to 0
-        df['TotalChronicConditions'] = 0
-        print(f"  ⚠ No ChronicCond_ columns found, using default value")
+        df['TotalChronicConditions'] = total_conditions
+        logger.warning(f"  ⚠ No ChronicCond_ columns found, using default value")
     
-    print(f"\n✓ Feature engineering complete")
-    print(f"  - Final dataframe shape: {df.shape[0]:,} rows × {df.shape[1]} columns")
+    logger.info(f"\n✓ Feature engineering complete")
+    logger.info(f"  - Final dataframe shape: {df.shape[0]:,} rows × {df.shape[1]} columns")
     
     return df
 
@@ -197,41 +425,29 @@ def select_and_scale_features(df):
     tuple
         (scaled_features_array, feature_columns_list, fitted_scaler)
     """
-    print("\n" + "=" * 60)
-    print("STEP 3 & 4: Feature Selection and Scaling")
-    print("=" * 60)
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP 3 & 4: Feature Selection and Scaling")
+    logger.info("=" * 60)
     
     # Define features for anomaly detection
-    # These are numeric indicators that could signal fraudulent behavior
-    feature_columns = [
-        'InscClaimAmtReimbursed',      # Claim amount (unusual amounts are suspicious)
-        'ClaimDurationInDays',          # Duration of claim processing
-        'ProviderAvgClaimAmount',       # Provider's average claim amount
-        'ProviderClaimCount',           # Provider's claim volume
-        'ClaimAmountDeviation',         # Deviation from global average
-        'ProcedureFrequency',           # How often provider uses procedures
-        'TotalChronicConditions',       # Patient's chronic condition burden
-        'IPAnnualReimbursementAmt',     # Inpatient annual reimbursement
-        'OPAnnualReimbursementAmt'      # Outpatient annual reimbursement
-    ]
+    feature_columns = list(FEATURE_COLUMNS)
     
     # Add optional columns if they exist
-    optional_columns = ['AdmissionDurationInDays', 'Age']
-    for col in optional_columns:
+    for col in OPTIONAL_FEATURE_COLUMNS:
         if col in df.columns:
             feature_columns.append(col)
-            print(f"✓ Including optional feature: {col}")
+            logger.info(f"✓ Including optional feature: {col}")
     
     # Filter to only columns that exist in the dataframe
     available_features = [col for col in feature_columns if col in df.columns]
     missing_features = [col for col in feature_columns if col not in df.columns]
     
     if missing_features:
-        print(f"⚠ Missing features (will be excluded): {missing_features}")
+        logger.warning(f"⚠ Missing features (will be excluded): {missing_features}")
     
-    print(f"\n✓ Selected {len(available_features)} features for modeling:")
+    logger.info(f"\n✓ Selected {len(available_features)} features for modeling:")
     for i, feature in enumerate(available_features, 1):
-        print(f"  {i}. {feature}")
+        logger.info(f"  {i}. {feature}")
     
     # Extract feature matrix
     X = df[available_features].copy()
@@ -241,16 +457,16 @@ def select_and_scale_features(df):
     missing_count = X.isnull().sum().sum()
     if missing_count > 0:
         X = X.fillna(X.median())
-        print(f"\n⚠ Filled {missing_count} missing values with median")
+        logger.warning(f"\n⚠ Filled {missing_count} missing values with median")
     
     # Apply StandardScaler to normalize features
     # This ensures all features contribute equally to distance calculations
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X)
     
-    print(f"\n✓ Applied StandardScaler normalization")
-    print(f"  - Mean of scaled features: ~0")
-    print(f"  - Std of scaled features: ~1")
+    logger.info(f"\n✓ Applied StandardScaler normalization")
+    logger.info(f"  - Mean of scaled features: ~0")
+    logger.info(f"  - Std of scaled features: ~1")
     
     return X_scaled, available_features, scaler
 
@@ -259,12 +475,18 @@ def select_and_scale_features(df):
 # STEP 5: Isolation Forest Model Training
 # =============================================================================
 
-def train_isolation_model(X_scaled, df):
+def train_isolation_model(X_scaled, df, n_estimators=200, contamination=None, max_samples='auto',
+                          bootstrap=False, n_shards=1):
     """
     Train Isolation Forest model for anomaly detection.
     
-    The contamination parameter is set based on the actual fraud ratio
-    in the dataset, capped at 25% to avoid over-aggressive flagging.
+    By default the contamination parameter is set based on the actual fraud
+    ratio in the dataset, capped at 25% to avoid over-aggressive flagging.
+    hyperparameter_sweep.py searches for better settings.
+    
+    With n_shards > 1 the trees are grown on row shards in separate worker
+    processes and merged into one forest (sharded_training.py), which keeps
+    very large claim sets from being fitted on one process.
     
     Parameters:
     -----------
@@ -272,104 +494,216 @@ def train_isolation_model(X_scaled, df):
         Scaled feature matrix
     df : pd.DataFrame
         Original dataframe with PotentialFraud column
+    n_estimators : int
+        Number of trees
+    contamination : float, optional
+        Expected anomaly share; defaults to the capped fraud ratio
+    max_samples : int or 'auto'
+        Samples drawn to build each tree
+    bootstrap : bool
+        Draw each tree's samples with replacement
+    n_shards : int
+        Row shards fitted in parallel worker processes (1 = single fit)
         
     Returns:
     --------
     tuple
         (trained_model, anomaly_scores, anomaly_flags)
     """
-    print("\n" + "=" * 60)
-    print("STEP 5: Isolation Forest Model Training")
-    print("=" * 60)
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP 5: Isolation Forest Model Training")
+    logger.info("=" * 60)
     
     # Calculate fraud ratio from ground truth
     # This helps set appropriate contamination level
     fraud_ratio = df['PotentialFraud'].mean()
-    contamination = min(0.25, fraud_ratio)  # Cap at 25% to be conservative
+    if contamination is None:
+        contamination = min(0.25, fraud_ratio)  # Cap at 25% to be conservative
     
-    print(f"✓ Calculated fraud ratio: {fraud_ratio:.4f} ({fraud_ratio*100:.2f}%)")
-    print(f"✓ Setting contamination parameter: {contamination:.4f}")
+    logger.info(f"✓ Calculated fraud ratio: {fraud_ratio:.4f} ({fraud_ratio*100:.2f}%)")
+    logger.info(f"✓ Setting contamination parameter: {contamination:.4f}")
     
     # Initialize Isolation Forest
-    # n_estimators=200 provides good balance of accuracy and speed
+    # n_estimators=200 (the default) provides good balance of accuracy and speed
     # random_state=42 ensures reproducibility
-    iso_forest = IsolationForest(
-        n_estimators=200,
+    logger.info(f"\n✓ Training Isolation Forest...")
+    logger.info(f"  - n_estimators: {n_estimators}")
+    logger.info(f"  - contamination: {contamination:.4f}")
+    logger.info(f"  - max_samples: {max_samples}")
+    logger.info(f"  - bootstrap: {bootstrap}")
+    logger.info(f"  - random_state: 42")
+    
+    if n_shards > 1:
+        logger.info(f"  - shards: {n_shards}")
+    
+    # Fit the model
+    iso_forest = IsolationForestDetector(
+        n_estimators=n_estimators,
         contamination=contamination,
+        max_samples=max_samples,
+        bootstrap=bootstrap,
+        n_shards=n_shards,
         random_state=42,
-        n_jobs=-1,  # Use all available CPU cores
-        verbose=0
-    )
+    ).fit(X_scaled).model
     
-    print(f"\n✓ Training Isolation Forest...")
-    print(f"  - n_estimators: 200")
-    print(f"  - contamination: {contamination:.4f}")
-    print(f"  - random_state: 42")
+    anomaly_scores, anomaly_flags = score_isolation_model(iso_forest, X_scaled)
     
-    # Fit the model
-    iso_forest.fit(X_scaled)
+    # Statistics
+    flagged_count = anomaly_flags.sum()
+    logger.info(f"\n✓ Model training complete")
+    logger.info(f"  - Claims flagged as anomalous: {flagged_count:,} ({flagged_count/len(df)*100:.2f}%)")
+    logger.info(f"  - Claims classified as normal: {len(df) - flagged_count:,} ({(len(df)-flagged_count)/len(df)*100:.2f}%)")
     
-    # Generate anomaly scores (decision_function)
-    # Negative values indicate anomalies, positive values indicate normal
-    anomaly_scores = iso_forest.decision_function(X_scaled)
+    return iso_forest, anomaly_scores, anomaly_flags
+
+
+def train_anomaly_detector(X_scaled, df, detector='isolation_forest', contamination=None, **params):
+    """
+    Train the anomaly detector selected by name.
     
-    # Generate anomaly flags (-1 for anomaly, 1 for normal)
-    anomaly_flags_raw = iso_forest.predict(X_scaled)
+    'isolation_forest' goes through train_isolation_model and returns the
+    sklearn forest; other detectors (see detectors.py) are returned as
+    fitted AnomalyDetector objects. Both work with score_isolation_model.
     
-    # Convert to binary (1 = fraud/anomaly, 0 = normal)
-    # This matches the PotentialFraud encoding (1 = fraud, 0 = normal)
-    anomaly_flags = np.where(anomaly_flags_raw == -1, 1, 0)
+    Parameters:
+    -----------
+    X_scaled : np.ndarray
+        Scaled feature matrix
+    df : pd.DataFrame
+        Original dataframe with PotentialFraud column
+    detector : str
+        Detector name from detectors.DETECTORS
+    contamination : float, optional
+        Expected anomaly share; defaults to the capped fraud ratio
+    **params
+        Detector settings (e.g. n_estimators, n_bins)
+        
+    Returns:
+    --------
+    tuple
+        (trained_model, anomaly_scores, anomaly_flags)
+    """
+    if detector == IsolationForestDetector.name:
+        return train_isolation_model(X_scaled, df, contamination=contamination, **params)
+    
+    logger.info("\n" + "=" * 60)
+    logger.info(f"STEP 5: {detector} Detector Training")
+    logger.info("=" * 60)
+    
+    if contamination is None:
+        contamination = min(0.25, df['PotentialFraud'].mean())
+    model = get_detector(detector, contamination=contamination, **params).fit(X_scaled)
+    anomaly_scores, anomaly_flags = model.score(X_scaled)
     
-    # Statistics
     flagged_count = anomaly_flags.sum()
-    print(f"\n✓ Model training complete")
-    print(f"  - Claims flagged as anomalous: {flagged_count:,} ({flagged_count/len(df)*100:.2f}%)")
-    print(f"  - Claims classified as normal: {len(df) - flagged_count:,} ({(len(df)-flagged_count)/len(df)*100:.2f}%)")
+    logger.info(f"✓ Trained {detector} detector (contamination: {contamination:.4f})")
+    logger.info(f"  - Claims flagged as anomalous: {flagged_count:,} ({flagged_count/len(df)*100:.2f}%)")
     
-    return iso_forest, anomaly_scores, anomaly_flags
+    return model, anomaly_scores, anomaly_flags
+
+
+def score_isolation_model(model, X_scaled):
+    """
+    Score a scaled feature matrix with a fitted Isolation Forest or detector.
+    
+    The forest is exported once to flat node arrays (forest_scorer) and
+    scores and flags are produced in a single traversal. Results match
+    decision_function and predict of the sklearn model. AnomalyDetector
+    objects are scored with their own score method.
+    
+    Parameters:
+    -----------
+    model : IsolationForest, FlatIsolationForest or AnomalyDetector
+        Fitted Isolation Forest or detector
+    X_scaled : np.ndarray
+        Scaled feature matrix
+        
+    Returns:
+    --------
+    tuple
+        (anomaly_scores, anomaly_flags)
+    """
+    # Anomaly scores follow decision_function: negative values indicate
+    # anomalies, positive values indicate normal.
+    # Flags are binary (1 = fraud/anomaly, 0 = normal), matching the
+    # PotentialFraud encoding (1 = fraud, 0 = normal)
+    if isinstance(model, AnomalyDetector):
+        return model.score(X_scaled)
+    return flat_forest_for(model).score(X_scaled)
+
+
+def transform_with_fitted_scaler(df, feature_columns, fill_values, scaler):
+    """
+    Build the scaled feature matrix using statistics fitted at training time.
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Dataframe with engineered features
+    feature_columns : list
+        Feature columns in the order the model was trained on
+    fill_values : dict
+        Training medians used to fill missing values
+    scaler : StandardScaler
+        Scaler fitted at training time
+        
+    Returns:
+    --------
+    np.ndarray
+        Scaled feature matrix
+        
+    Raises:
+    -------
+    ValueError
+        If any model feature is missing from the dataframe
+    """
+    missing_features = [col for col in feature_columns if col not in df.columns]
+    if missing_features:
+        raise ValueError(f"Missing model features: {missing_features}")
+    
+    X = df[feature_columns].fillna(fill_values)
+    return scaler.transform(X)
 
 
 # =============================================================================
 # STEP 6: Risk Score Normalization
 # =============================================================================
 
-def compute_risk_scores(anomaly_scores):
+def compute_risk_scores(anomaly_scores, calibration):
     """
     Convert anomaly scores to 0-100 RiskScore scale.
     
     Higher scores indicate higher fraud risk.
-    The transformation inverts and scales the anomaly scores so that
-    more negative anomaly scores (more anomalous) become higher risk scores.
+    Scores are mapped through the calibration fitted on the training
+    scores, so more negative anomaly scores (more anomalous) become higher
+    risk scores and a claim's RiskScore does not depend on the batch it
+    was scored in.
     
     Parameters:
     -----------
     anomaly_scores : np.ndarray
         Raw anomaly scores from Isolation Forest
+    calibration : ScoreCalibration
+        Calibration fitted on the training anomaly scores
         
     Returns:
     --------
     np.ndarray
-        Normalized risk scores (0-100 scale)
+        Calibrated risk scores (0-100 scale)
     """
-    print("\n" + "=" * 60)
-    print("STEP 6: Risk Score Normalization")
-    print("=" * 60)
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP 6: Risk Score Calibration")
+    logger.info("=" * 60)
     
     # Anomaly scores are typically in range [-0.5, 0.5]
     # More negative = more anomalous = higher risk
+    risk_scores = calibration.transform(anomaly_scores)
     
-    # Min-max scaling to 0-100 range
-    # We invert so that higher scores = higher risk
-    min_score = anomaly_scores.min()
-    max_score = anomaly_scores.max()
-    
-    # Invert and scale: (max - score) / (max - min) * 100
-    risk_scores = ((max_score - anomaly_scores) / (max_score - min_score)) * 100
-    
-    print(f"✓ Converted anomaly scores to 0-100 RiskScore")
-    print(f"  - Original score range: [{min_score:.4f}, {max_score:.4f}]")
-    print(f"  - Risk score range: [{risk_scores.min():.2f}, {risk_scores.max():.2f}]")
-    print(f"  - Mean risk score: {risk_scores.mean():.2f}")
+    logger.info(f"✓ Converted anomaly scores to 0-100 RiskScore")
+    logger.info(f"  - Calibrated on {calibration.total:,} training scores")
+    logger.info(f"  - Original score range: [{anomaly_scores.min():.4f}, {anomaly_scores.max():.4f}]")
+    logger.info(f"  - Risk score range: [{risk_scores.min():.2f}, {risk_scores.max():.2f}]")
+    logger.info(f"  - Mean risk score: {risk_scores.mean():.2f}")
     
     return risk_scores
 
@@ -399,9 +733,9 @@ def aggregate_provider_risk(df, risk_scores, anomaly_flags):
     pd.DataFrame
         Provider-level risk summary
     """
-    print("\n" + "=" * 60)
-    print("STEP 7: Provider-Level Risk Aggregation")
-    print("=" * 60)
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP 7: Provider-Level Risk Aggregation")
+    logger.info("=" * 60)
     
     # Add risk scores and flags to dataframe
     df = df.copy()
@@ -427,14 +761,14 @@ def aggregate_provider_risk(df, risk_scores, anomaly_flags):
     # Sort by average risk score (descending)
     provider_risk = provider_risk.sort_values('AvgRiskScore', ascending=False)
     
-    print(f"✓ Aggregated risk metrics for {len(provider_risk)} providers")
-    print(f"\nTop 5 Highest Risk Providers:")
-    print(provider_risk.head().to_string())
+    logger.info(f"✓ Aggregated risk metrics for {len(provider_risk)} providers")
+    logger.info(f"\nTop 5 Highest Risk Providers:")
+    logger.info(provider_risk.head().to_string())
     
-    print(f"\nRisk Score Statistics:")
-    print(f"  - Highest risk provider: {provider_risk['AvgRiskScore'].max():.2f}")
-    print(f"  - Lowest risk provider: {provider_risk['AvgRiskScore'].min():.2f}")
-    print(f"  - Average risk across providers: {provider_risk['AvgRiskScore'].mean():.2f}")
+    logger.info(f"\nRisk Score Statistics:")
+    logger.info(f"  - Highest risk provider: {provider_risk['AvgRiskScore'].max():.2f}")
+    logger.info(f"  - Lowest risk provider: {provider_risk['AvgRiskScore'].min():.2f}")
+    logger.info(f"  - Average risk across providers: {provider_risk['AvgRiskScore'].mean():.2f}")
     
     # Select and reorder final columns
     provider_risk = provider_risk[[
@@ -449,7 +783,56 @@ def aggregate_provider_risk(df, risk_scores, anomaly_flags):
 # STEP 8: Model Evaluation
 # =============================================================================
 
-def evaluate_model(df, anomaly_flags):
+def compare_detectors(X_scaled, df, detectors=('isolation_forest', 'hbos'), detector_params=None):
+    """
+    Fit and score each detector on the same matrix, side by side.
+    
+    Parameters:
+    -----------
+    X_scaled : np.ndarray
+        Scaled feature matrix
+    df : pd.DataFrame
+        Dataframe with PotentialFraud ground truth labels
+    detectors : sequence of str
+        Detector names from detectors.DETECTORS
+    detector_params : dict, optional
+        Detector name -> settings passed to get_detector
+        
+    Returns:
+    --------
+    pd.DataFrame
+        One row per detector: fit seconds, scoring throughput (claims/s),
+        flagged count, precision, recall and F1
+    """
+    y_true = df['PotentialFraud'].to_numpy()
+    contamination = min(0.25, float(np.mean(y_true)))
+    rows = []
+    for name in detectors:
+        params = {'contamination': contamination, **(detector_params or {}).get(name, {})}
+        detector = get_detector(name, **params)
+        
+        start = time.perf_counter()
+        detector.fit(X_scaled)
+        fit_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        _, flags = detector.score(X_scaled)
+        score_seconds = time.perf_counter() - start
+        
+        rows.append({
+            'detector': name,
+            'fit_seconds': fit_seconds,
+            'claims_per_second': len(X_scaled) / score_seconds if score_seconds > 0 else float('inf'),
+            'flagged': int(flags.sum()),
+            'precision': precision_score(y_true, flags, zero_division=0),
+            'recall': recall_score(y_true, flags, zero_division=0),
+            'f1_score': f1_score(y_true, flags, zero_division=0),
+        })
+    return pd.DataFrame(rows)
+
+
+def evaluate_model(df, anomaly_flags, X_scaled=None, compare_with=None,
+                   anomaly_scores=None, provider_summary=None):
     """
     Evaluate anomaly detection performance against ground truth.
     
@@ -459,50 +842,61 @@ def evaluate_model(df, anomaly_flags):
         Dataframe with PotentialFraud ground truth labels
     anomaly_flags : np.ndarray
         Predicted anomaly flags
+    X_scaled : np.ndarray, optional
+        Scaled feature matrix, required for compare_with
+    compare_with : sequence of str, optional
+        Detector names to fit and compare side by side (compare_detectors);
+        the table is returned under 'detector_comparison'
+    anomaly_scores : np.ndarray, optional
+        Claim anomaly scores; when given, the whole ranking is evaluated
+        (ranking_evaluation.evaluate_ranking) and returned under 'ranking'
+    provider_summary : pd.DataFrame, optional
+        Output of aggregate_provider_risk, for provider precision@k
         
     Returns:
     --------
     dict
         Dictionary containing evaluation metrics
     """
-    print("\n" + "=" * 60)
-    print("STEP 8: Model Evaluation")
-    print("=" * 60)
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP 8: Model Evaluation")
+    logger.info("=" * 60)
     
     # Ground truth
     y_true = df['PotentialFraud'].values
     y_pred = anomaly_flags
     
-    # Confusion Matrix
+    # Confusion Matrix from one bincount over (actual, predicted)
     # Format: [[TN, FP], [FN, TP]]
-    cm = confusion_matrix(y_true, y_pred)
+    cm = np.bincount(2 * np.asarray(y_true, dtype=np.int64) + np.asarray(y_pred, dtype=np.int64),
+                     minlength=4).reshape(2, 2)
     tn, fp, fn, tp = cm.ravel()
     
-    print("Confusion Matrix:")
-    print(f"                 Predicted")
-    print(f"                 Normal  Fraud")
-    print(f"Actual Normal    {tn:6d}  {fp:6d}  (Specificity: {tn/(tn+fp)*100:.2f}%)")
-    print(f"       Fraud     {fn:6d}  {tp:6d}  (Sensitivity: {tp/(tp+fn)*100:.2f}%)")
+    logger.info("Confusion Matrix:")
+    logger.info(f"                 Predicted")
+    logger.info(f"                 Normal  Fraud")
+    logger.info(f"Actual Normal    {tn:6d}  {fp:6d}  (Specificity: {tn/(tn+fp)*100:.2f}%)")
+    logger.info(f"       Fraud     {fn:6d}  {tp:6d}  (Sensitivity: {tp/(tp+fn)*100:.2f}%)")
     
-    # Calculate metrics
-    precision = precision_score(y_true, y_pred, zero_division=0)
-    recall = recall_score(y_true, y_pred, zero_division=0)
-    f1 = f1_score(y_true, y_pred, zero_division=0)
+    # Calculate metrics from the confusion counts
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
     
     # Accuracy
     accuracy = (tp + tn) / (tp + tn + fp + fn)
     
-    print(f"\nPerformance Metrics:")
-    print(f"  ✓ Accuracy:  {accuracy:.4f}  ({accuracy*100:.2f}%)")
-    print(f"  ✓ Precision: {precision:.4f}  ({precision*100:.2f}%)")
-    print(f"  ✓ Recall:    {recall:.4f}  ({recall*100:.2f}%)")
-    print(f"  ✓ F1-Score:  {f1:.4f}  ({f1*100:.2f}%)")
+    logger.info(f"\nPerformance Metrics:")
+    logger.info(f"  ✓ Accuracy:  {accuracy:.4f}  ({accuracy*100:.2f}%)")
+    logger.info(f"  ✓ Precision: {precision:.4f}  ({precision*100:.2f}%)")
+    logger.info(f"  ✓ Recall:    {recall:.4f}  ({recall*100:.2f}%)")
+    logger.info(f"  ✓ F1-Score:  {f1:.4f}  ({f1*100:.2f}%)")
     
     # Interpretation
-    print(f"\nInterpretation:")
-    print(f"  - Precision: Of all claims flagged as fraud, {precision*100:.1f}% were actually fraudulent")
-    print(f"  - Recall: Of all actual fraudulent claims, {recall*100:.1f}% were detected")
-    print(f"  - F1-Score: Harmonic mean of precision and recall")
+    logger.info(f"\nInterpretation:")
+    logger.info(f"  - Precision: Of all claims flagged as fraud, {precision*100:.1f}% were actually fraudulent")
+    logger.info(f"  - Recall: Of all actual fraudulent claims, {recall*100:.1f}% were detected")
+    logger.info(f"  - F1-Score: Harmonic mean of precision and recall")
     
     metrics = {
         'confusion_matrix': cm,
@@ -516,35 +910,205 @@ def evaluate_model(df, anomaly_flags):
         'f1_score': f1
     }
     
+    if compare_with:
+        if X_scaled is None:
+            raise ValueError("X_scaled is required to compare detectors")
+        comparison = compare_detectors(X_scaled, df, compare_with)
+        logger.info(f"\nDetector Comparison:")
+        logger.info(comparison.to_string(index=False, float_format=lambda v: f"{v:,.4f}"))
+        metrics['detector_comparison'] = comparison
+    
+    if anomaly_scores is not None:
+        ranking = evaluate_ranking(df, anomaly_scores, provider_summary)
+        logger.info(f"\nRanked Queue Metrics (average precision: {ranking['average_precision']:.4f}):")
+        logger.info(ranking['precision_at_k'].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        if 'provider_precision_at_k' in ranking:
+            logger.info("\nProvider precision@k:")
+            logger.info(ranking['provider_precision_at_k'].to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+        metrics['ranking'] = ranking
+    
     return metrics
 
+
+# =============================================================================
+# STEP 9: Claim Explanations
+# =============================================================================
+
+def explain_flagged_claims(df, model, X_scaled, feature_columns, anomaly_scores, anomaly_flags,
+                           top_n=DEFAULT_TOP_N, time_budget=None):
+    """
+    Top contributing features of the most anomalous flagged claims.
+    
+    Parameters:
+    -----------
+    df : pd.DataFrame
+        Claim-level dataframe aligned with X_scaled
+    model : IsolationForest or AnomalyDetector
+        Fitted model that produced anomaly_scores
+    X_scaled : np.ndarray
+        Scaled feature matrix
+    feature_columns : list
+        Model feature columns
+    anomaly_scores : np.ndarray
+        Anomaly scores (negative = anomaly)
+    anomaly_flags : np.ndarray
+        Binary anomaly flags
+    top_n : int or None
+        Flagged claims to explain, most anomalous first; None for all
+    time_budget : float, optional
+        Seconds after which the remaining claims are left unexplained
+        
+    Returns:
+    --------
+    pd.DataFrame
+        ClaimID and Provider (when present) with the columns of
+        claim_explanations.explain_claims
+    """
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP 9: Claim Explanations")
+    logger.info("=" * 60)
+    
+    start = time.perf_counter()
+    explanations = explain_claims(
+        model, X_scaled, feature_columns, anomaly_scores,
+        rows=np.flatnonzero(anomaly_flags), top_n=top_n, time_budget=time_budget,
+    )
+    id_cols = [col for col in ['ClaimID', 'Provider'] if col in df.columns]
+    for position, col in enumerate(id_cols):
+        explanations.insert(position, col, df[col].to_numpy()[explanations['Row'].to_numpy()])
+    
+    logger.info(f"✓ Explained {int(explanations['Explained'].sum()):,} flagged claims "
+                f"in {time.perf_counter() - start:.2f}s")
+    if explanations['Explained'].any():
+        logger.info("\nMost common top feature among explained claims:")
+        logger.info(explanations['TopFeature1'].value_counts().head().to_string())
+    
+    return explanations
+
 # =============================================================================
 # MAIN EXECUTION PIPELINE
 # =============================================================================
 
-def run_pipeline(data_path="cleaned_claims.csv"):
-    df = load_data(data_path)
+def run_pipeline(data_path="cleaned_claims.csv", model_artifact=None, columns=None,
+                 verbose=1, trace_memory=False, model_params=None, detector='isolation_forest',
+                 compare_with=None, explain_top_n=DEFAULT_TOP_N, explain_time_budget=None):
+    """
+    Run the end-to-end detection pipeline.
     
-    # Step 2: Feature Engineering
-    df_engineered = engineer_features(df)
+    Parameters:
+    -----------
+    data_path : str
+        Path to the cleaned claims file (columnar or CSV)
+    model_artifact : dict, optional
+        Artifact from model_artifact.load_model_artifact. When given, claims
+        are scored with the persisted scaler and Isolation Forest instead of
+        refitting them.
+    columns : list or 'pipeline', optional
+        Column projection passed to load_data
+    verbose : int
+        0 = warnings only, 1 = step progress, 2 = per-stage debug timings
+    trace_memory : bool
+        Record peak traced memory per stage (slower)
+    model_params : dict, optional
+        Detector settings passed to train_anomaly_detector, e.g. the best
+        Isolation Forest configuration from hyperparameter_sweep.py
+    detector : str
+        Anomaly detector to train ('isolation_forest' or 'hbos')
+    compare_with : sequence of str, optional
+        Detectors to fit side by side during evaluation (compare_detectors)
+    explain_top_n : int or None
+        Flagged claims to explain (explain_flagged_claims); 0 to skip
+    explain_time_budget : float, optional
+        Seconds allowed for the explanations
+        
+    Returns:
+    --------
+    dict
+        Claim-level dataframe, provider summary, metrics, the fitted
+        model, scaler, feature columns and risk-score calibration, daily and
+        monthly claim aggregates by ClaimStartDt under "timeline", the top
+        features of the most anomalous flagged claims under "explanations", and
+        per-stage timing and memory records under "stage_metrics"
+    """
+    set_verbosity(verbose)
+    instrumentation = PipelineInstrumentation(trace_memory=trace_memory)
     
-    # Step 3 & 4: Feature Selection + Scaling
-    X_scaled, feature_cols, scaler = select_and_scale_features(df_engineered)
+    with instrumentation.stage("load_data") as record:
+        df = load_data(data_path, columns=columns)
+        record["rows_out"] = len(df)
     
-    # Step 5: Train Isolation Model
-    model, anomaly_scores, anomaly_flags = train_isolation_model(X_scaled, df_engineered)
+    # Step 2: Feature Engineering
+    with instrumentation.stage("engineer_features", rows_in=len(df)) as record:
+        df_engineered = engineer_features(df)
+        record["rows_out"] = len(df_engineered)
+    
+    if model_artifact is None:
+        # Step 3 & 4: Feature Selection + Scaling
+        with instrumentation.stage("select_and_scale_features", rows_in=len(df_engineered)) as record:
+            X_scaled, feature_cols, scaler = select_and_scale_features(df_engineered)
+            record["rows_out"] = len(X_scaled)
+        
+        # Step 5: Train Anomaly Detector
+        stage_name = "train_isolation_model" if detector == 'isolation_forest' else f"train_{detector}"
+        with instrumentation.stage(stage_name, rows_in=len(X_scaled)) as record:
+            model, anomaly_scores, anomaly_flags = train_anomaly_detector(
+                X_scaled, df_engineered, detector, **(model_params or {})
+            )
+            calibration = ScoreCalibration.from_scores(anomaly_scores)
+            record["rows_out"] = len(anomaly_scores)
+    else:
+        # Steps 3-5 with the persisted scaler and model
+        feature_cols = model_artifact["feature_columns"]
+        scaler = model_artifact["scaler"]
+        model = model_artifact["model"]
+        calibration = ScoreCalibration.from_dict(model_artifact["score_calibration"])
+        with instrumentation.stage("transform_with_fitted_scaler", rows_in=len(df_engineered)) as record:
+            X_scaled = transform_with_fitted_scaler(
+                df_engineered, feature_cols, model_artifact["fill_values"], scaler
+            )
+            record["rows_out"] = len(X_scaled)
+        with instrumentation.stage("score_isolation_model", rows_in=len(X_scaled)) as record:
+            anomaly_scores, anomaly_flags = score_isolation_model(model, X_scaled)
+            record["rows_out"] = len(anomaly_scores)
+        logger.info(f"\n✓ Scored {len(df_engineered):,} claims with model artifact "
+                    f"v{model_artifact['model_version']}")
     
     # Step 6: Compute Risk Scores
-    risk_scores = compute_risk_scores(anomaly_scores)
+    with instrumentation.stage("compute_risk_scores", rows_in=len(anomaly_scores)) as record:
+        risk_scores = compute_risk_scores(anomaly_scores, calibration)
+        record["rows_out"] = len(risk_scores)
     
     # Step 7: Provider Aggregation
-    provider_summary = aggregate_provider_risk(df_engineered, risk_scores, anomaly_flags)
+    with instrumentation.stage("aggregate_provider_risk", rows_in=len(df_engineered)) as record:
+        provider_summary = aggregate_provider_risk(df_engineered, risk_scores, anomaly_flags)
+        record["rows_out"] = len(provider_summary)
     
     # Step 8: Evaluate Model
-    metrics = evaluate_model(df_engineered, anomaly_flags)
+    with instrumentation.stage("evaluate_model", rows_in=len(df_engineered)) as record:
+        metrics = evaluate_model(df_engineered, anomaly_flags, X_scaled, compare_with,
+                                 anomaly_scores=anomaly_scores, provider_summary=provider_summary)
+        record["rows_out"] = 1
+    
+    with instrumentation.stage("claim_timeline", rows_in=len(df_engineered)) as record:
+        timeline = {
+            "daily": claim_timeline(df_engineered, anomaly_flags, freq='D'),
+            "monthly": claim_timeline(df_engineered, anomaly_flags, freq='M'),
+        }
+        record["rows_out"] = len(timeline["daily"])
+    
+    explanations = None
+    if explain_top_n != 0:
+        with instrumentation.stage("explain_flagged_claims", rows_in=int(anomaly_flags.sum())) as record:
+            explanations = explain_flagged_claims(
+                df_engineered, model, X_scaled, feature_cols, anomaly_scores, anomaly_flags,
+                top_n=explain_top_n, time_budget=explain_time_budget,
+            )
+            record["rows_out"] = len(explanations)
+    
+    instrumentation.log_summary()
     
     # Save outputs
-    print("\n💾 Saving output files...")
+    logger.info("\n💾 Saving output files...")
     
     df_engineered["RiskScore"] = risk_scores
     df_engineered["AnomalyFlag"] = anomaly_flags
@@ -554,5 +1118,13 @@ def run_pipeline(data_path="cleaned_claims.csv"):
     return {
         "df": df_engineered,
         "provider_summary": provider_summary,
-        "metrics": metrics
+        "metrics": metrics,
+        "model": model,
+        "detector": detector if model_artifact is None else model_artifact.get("detector", "isolation_forest"),
+        "scaler": scaler,
+        "feature_columns": feature_cols,
+        "calibration": calibration,
+        "timeline": timeline,
+        "explanations": explanations,
+        "stage_metrics": instrumentation.records
     }
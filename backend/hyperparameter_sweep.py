@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Parallel Isolation Forest Hyperparameter Sweep
+==============================================
+
+Searches n_estimators, max_samples and contamination against the
+evaluate_model metrics plus provider-level precision@k.
+
+The scaled feature matrix, labels and provider codes are placed in
+shared memory once; pool workers attach to them as read-only numpy views,
+so no worker receives a copy of the data.
+
+Contamination only moves the decision threshold (offset_ is a percentile
+of the training score_samples), not the trees. Each worker therefore fits
+one forest per (n_estimators, max_samples) pair and evaluates every
+contamination value against the same scores.
+
+Usage:
+    python hyperparameter_sweep.py --data cleaned_claims.feather --workers 4
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from fraud_detection_engine import engineer_features, load_data, select_and_scale_features
+from forest_scorer import flat_forest_for
+from pipeline_instrumentation import logger, set_verbosity
+from shared_arrays import attach_shared_arrays, shared_arrays, worker_arrays
+
+
+DEFAULT_N_ESTIMATORS = (100, 200, 400)
+DEFAULT_MAX_SAMPLES = (256, 1024)
+DEFAULT_CONTAMINATION_FACTORS = (0.5, 0.75, 1.0, 1.25, 1.5)
+DEFAULT_TOP_K = (10, 50, 100)
+
+
+# =============================================================================
+# Metrics
+# =============================================================================
+
+def classification_metrics(y_true, flags):
+    """Precision, recall and F1 for binary flags (1 = fraud)."""
+    tp = int(np.count_nonzero(flags & y_true))
+    fp = int(np.count_nonzero(flags)) - tp
+    fn = int(np.count_nonzero(y_true)) - tp
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {'precision': precision, 'recall': recall, 'f1_score': f1, 'flagged': tp + fp}
+
+
+def provider_precision_at_k(score_samples, provider_codes, provider_fraud, top_k):
+    """
+    Share of actually fraudulent providers among the k providers with the
+    most anomalous mean claim score, for each k. Claims without a provider
+    (code -1) are left out.
+    """
+    n_providers = len(provider_fraud)
+    has_provider = provider_codes >= 0
+    provider_codes = provider_codes[has_provider]
+    sums = np.bincount(provider_codes, weights=score_samples[has_provider], minlength=n_providers)
+    counts = np.bincount(provider_codes, minlength=n_providers)
+    mean_scores = sums / np.maximum(counts, 1)
+    # score_samples: lower = more abnormal
+    ranked = np.argsort(mean_scores, kind='stable')
+    return {
+        f'precision_at_{k}': float(provider_fraud[ranked[:k]].mean()) if k <= n_providers else np.nan
+        for k in top_k
+    }
+
+
+# =============================================================================
+# Worker Task
+# =============================================================================
+
+def evaluate_configuration(n_estimators, max_samples, contaminations, top_k, random_state):
+    """
+    Fit one forest on the shared matrix and evaluate every contamination.
+
+    Runs in a pool worker; reads X, y, provider codes and provider labels
+    from the shared arrays.
+
+    Returns:
+    --------
+    list
+        One result dict per contamination value
+    """
+    arrays = worker_arrays()
+    X = arrays['X']
+    y_true = arrays['y'].astype(bool)
+
+    start = time.perf_counter()
+    model = IsolationForest(
+        n_estimators=n_estimators,
+        max_samples=min(max_samples, len(X)),
+        contamination='auto',
+        random_state=random_state,
+        n_jobs=1,
+    )
+    model.fit(X)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    score_samples = flat_forest_for(model).score_samples(X)
+    score_seconds = time.perf_counter() - start
+
+    provider_metrics = provider_precision_at_k(
+        score_samples, arrays['provider_codes'], arrays['provider_fraud'], top_k
+    )
+
+    results = []
+    for contamination in contaminations:
+        # Same threshold IsolationForest.fit sets for this contamination
+        offset = np.percentile(score_samples, 100.0 * contamination)
+        flags = score_samples < offset
+        results.append({
+            'n_estimators': n_estimators,
+            'max_samples': max_samples,
+            'contamination': contamination,
+            **classification_metrics(y_true, flags),
+            **provider_metrics,
+            'fit_seconds': fit_seconds,
+            'score_seconds': score_seconds,
+        })
+    return results
+
+
+# =============================================================================
+# Sweep
+# =============================================================================
+
+def pareto_front(results, metric):
+    """Configurations no other configuration beats on both fit time and metric."""
+    ordered = results.sort_values(['fit_seconds', metric], ascending=[True, False])
+    best_so_far = -np.inf
+    on_front = []
+    for index, value in ordered[metric].items():
+        if value > best_so_far:
+            on_front.append(index)
+            best_so_far = value
+    return results.index.isin(on_front)
+
+
+def run_hyperparameter_sweep(data_path="cleaned_claims.csv", n_estimators_grid=DEFAULT_N_ESTIMATORS,
+                             max_samples_grid=DEFAULT_MAX_SAMPLES, contamination_grid=None,
+                             top_k=DEFAULT_TOP_K, metric='f1_score', workers=None,
+                             random_state=42, verbose=1):
+    """
+    Sweep Isolation Forest settings over a process pool.
+
+    Parameters:
+    -----------
+    data_path : str
+        Path to the cleaned claims file (columnar or CSV)
+    n_estimators_grid : iterable of int
+        Tree counts to try
+    max_samples_grid : iterable of int
+        Per-tree sample sizes to try
+    contamination_grid : iterable of float, optional
+        Contamination values; defaults to multiples of the label fraud ratio
+    top_k : iterable of int
+        Provider ranking depths for precision@k
+    metric : str
+        Result column used to pick the best configuration
+    workers : int, optional
+        Pool size (default: number of CPUs)
+    random_state : int
+        Seed shared by every fit, so configurations differ only in settings
+    verbose : int
+        See fraud_detection_engine.run_pipeline
+
+    Returns:
+    --------
+    dict
+        "results" (one row per configuration), "best" (the row maximising
+        metric) and "fraud_ratio"
+    """
+    set_verbosity(verbose)
+
+    df = engineer_features(load_data(data_path, columns="pipeline"))
+    X_scaled, _, _ = select_and_scale_features(df)
+
+    y_true = df['PotentialFraud'].to_numpy(dtype=np.int8)
+    # Claims without a provider get code -1 and count towards no provider
+    provider_codes, providers = pd.factorize(df['Provider'])
+    has_provider = provider_codes >= 0
+    provider_fraud = np.bincount(provider_codes[has_provider], weights=y_true[has_provider],
+                                 minlength=len(providers)) > 0
+    fraud_ratio = float(y_true.mean())
+    del df
+
+    if contamination_grid is None:
+        contamination_grid = sorted({
+            round(min(0.5, fraud_ratio * factor), 4) for factor in DEFAULT_CONTAMINATION_FACTORS
+        })
+    contamination_grid = [c for c in contamination_grid if 0 < c <= 0.5]
+    tasks = list(itertools.product(n_estimators_grid, max_samples_grid))
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+
+    logger.info("\n" + "=" * 60)
+    logger.info("Hyperparameter Sweep")
+    logger.info("=" * 60)
+    logger.info(f"✓ {len(tasks)} forests x {len(contamination_grid)} contamination values "
+                f"on {len(X_scaled):,} claims, {workers} workers")
+
+    # IsolationForest fits in float32; sharing float32 keeps workers from
+    # each converting their own copy
+    arrays = {
+        'X': X_scaled.astype(np.float32),
+        'y': y_true,
+        'provider_codes': provider_codes.astype(np.int32),
+        'provider_fraud': provider_fraud,
+    }
+    start = time.perf_counter()
+    rows = []
+    with shared_arrays(arrays) as specs:
+        del arrays, X_scaled
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_shared_arrays,
+                                 initargs=(specs,)) as pool:
+            futures = [
+                pool.submit(evaluate_configuration, n_estimators, max_samples,
+                            contamination_grid, tuple(top_k), random_state)
+                for n_estimators, max_samples in tasks
+            ]
+            for future in futures:
+                config_rows = future.result()
+                rows.extend(config_rows)
+                logger.info(f"  ✓ n_estimators={config_rows[0]['n_estimators']}, "
+                            f"max_samples={config_rows[0]['max_samples']} "
+                            f"({config_rows[0]['fit_seconds']:.2f}s fit)")
+    sweep_seconds = time.perf_counter() - start
+
+    results = pd.DataFrame(rows)
+    results['pareto'] = pareto_front(results, metric)
+    results = results.sort_values(metric, ascending=False).reset_index(drop=True)
+    best = results.iloc[0].to_dict()
+
+    logger.info(f"\n✓ Sweep finished in {sweep_seconds:.2f}s")
+    logger.info("\nTime / quality trade-off (* = Pareto-optimal on fit time vs "
+                f"{metric}):")
+    columns = ['n_estimators', 'max_samples', 'contamination', 'precision', 'recall',
+               'f1_score'] + [f'precision_at_{k}' for k in top_k] + ['fit_seconds']
+    table = results.sort_values('fit_seconds', kind='stable')
+    logger.info(table[columns].assign(
+        pareto=np.where(table['pareto'], '*', '')
+    ).to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    logger.info(f"\n✓ Best by {metric}: n_estimators={best['n_estimators']}, "
+                f"max_samples={best['max_samples']}, contamination={best['contamination']:.4f} "
+                f"({metric} {best[metric]:.4f})")
+
+    return {"results": results, "best": best, "fraud_ratio": fraud_ratio}
+
+
+def best_model_params(best):
+    """train_isolation_model / run_pipeline(model_params=...) settings for a sweep result."""
+    return {
+        "n_estimators": int(best["n_estimators"]),
+        "max_samples": int(best["max_samples"]),
+        "contamination": float(best["contamination"]),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Isolation Forest hyperparameter sweep")
+    parser.add_argument("--data", help="Path to the cleaned claims file", default="cleaned_claims.csv")
+    parser.add_argument("--n-estimators", type=int, nargs="+", default=list(DEFAULT_N_ESTIMATORS))
+    parser.add_argument("--max-samples", type=int, nargs="+", default=list(DEFAULT_MAX_SAMPLES))
+    parser.add_argument("--contamination", type=float, nargs="+",
+                        help="Contamination values (default: multiples of the fraud ratio)")
+    parser.add_argument("--top-k", type=int, nargs="+", default=list(DEFAULT_TOP_K))
+    parser.add_argument("--metric", default="f1_score", help="Column used to pick the best configuration")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--output", help="Write the full results table to this CSV")
+
+    args = parser.parse_args()
+
+    try:
+        sweep = run_hyperparameter_sweep(
+            args.data, args.n_estimators, args.max_samples, args.contamination,
+            args.top_k, args.metric, args.workers
+        )
+        if args.output:
+            sweep["results"].to_csv(args.output, index=False)
+            print(f"✓ Sweep results written to {args.output}")
+    except Exception as e:
+        print(f"Sweep failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
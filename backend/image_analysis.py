@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Off-Loop Image Analysis
+=======================
+
+Decoding (PDF rendering included) and perceptual hashing of uploaded
+claim images are CPU-bound, so the API runs them in a bounded process
+pool instead of on the asyncio event loop. Only the three hashes come
+back to the parent, which keeps the historical hash index as the single
+writer.
+
+ImageAnalysisPool admits at most max_pending jobs (running plus queued).
+Beyond that, ``reserve`` fails immediately and the endpoint answers 503,
+so a burst of large uploads sheds load instead of piling up latency.
+
+A worker that dies mid-job (a decoder crash on a malformed PDF, the OOM
+killer) breaks the whole ProcessPoolExecutor. ``run`` then discards it,
+so the next job starts a fresh pool, and fails the affected jobs with
+ImageAnalysisWorkerLost, which the endpoint also answers with 503.
+
+Uploads up to IMAGE_UPLOAD_SPOOL_LIMIT bytes are decoded straight from
+memory (hash_image_bytes); larger ones are spooled to a temporary file
+first (hash_image_file), so a worker never holds a huge upload in RAM.
+
+Settings (environment):
+    IMAGE_ANALYSIS_WORKERS      Worker processes (default: min(4, CPU count))
+    IMAGE_ANALYSIS_MAX_PENDING  Jobs admitted at once (default: 4 per worker)
+    IMAGE_UPLOAD_SPOOL_LIMIT    Largest upload hashed in memory (default: 20 MB)
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Workers import this module fresh, so the engine path is set up here
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../ayushman_dashboard'))
+from image_hash_engine import ImageForensicsEngine
+
+
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+UPLOAD_SPOOL_LIMIT = int(os.environ.get("IMAGE_UPLOAD_SPOOL_LIMIT", 20 * 1024 * 1024))
+
+
+def hash_image_file(file_path):
+    """Load an image or PDF and return its (pHash, dHash, wHash); runs in a worker."""
+    engine = ImageForensicsEngine()
+    return engine._generate_hashes(engine._load_file_as_image(file_path))
+
+
+def hash_image_bytes(data, filename=""):
+    """Decode an in-memory image or PDF and return its (pHash, dHash, wHash); runs in a worker."""
+    engine = ImageForensicsEngine()
+    return engine._generate_hashes(engine._load_bytes_as_image(data, filename))
+
+
+class ImageAnalysisBusy(Exception):
+    """Raised when the pool already holds max_pending jobs."""
+
+
+class ImageAnalysisWorkerLost(Exception):
+    """Raised when a worker process died during the job; the pool is rebuilt."""
+
+
+class ImageAnalysisPool:
+    """
+    Process pool with a cap on admitted jobs.
+
+    Parameters:
+    -----------
+    workers : int
+        Worker processes
+    max_pending : int
+        Jobs admitted at once, running or queued
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_pending=None):
+        self.workers = max(1, int(workers))
+        self.max_pending = max(self.workers, int(max_pending or 4 * self.workers))
+        self.pending = 0
+        self._executor = None
+
+    @classmethod
+    def from_env(cls):
+        """Pool configured from IMAGE_ANALYSIS_WORKERS and IMAGE_ANALYSIS_MAX_PENDING."""
+        return cls(
+            workers=int(os.environ.get("IMAGE_ANALYSIS_WORKERS", DEFAULT_WORKERS)),
+            max_pending=int(os.environ.get("IMAGE_ANALYSIS_MAX_PENDING", 0)) or None,
+        )
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def reserve(self):
+        """
+        Admit one job; pair with release().
+
+        Raises:
+        -------
+        ImageAnalysisBusy
+            If max_pending jobs are already admitted
+        """
+        # Only called from the event loop thread, so no lock is needed
+        if self.pending >= self.max_pending:
+            raise ImageAnalysisBusy(f"{self.pending} image analyses pending (limit {self.max_pending})")
+        self.pending += 1
+
+    def release(self):
+        self.pending -= 1
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) in a worker process and await the result.
+
+        Raises:
+        -------
+        ImageAnalysisWorkerLost
+            If a worker died and broke the pool; the next call starts a new one
+        """
+        executor = self.start()._executor
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool as e:
+            # Jobs failing together all hold the same broken executor; only the
+            # first discards it, so a pool started since is left alone
+            if self._executor is executor:
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise ImageAnalysisWorkerLost(f"Image analysis worker died: {e}") from e
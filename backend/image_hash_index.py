@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Packed-Bit Image Hash Index
+===========================
+
+Similarity search over the (pHash, dHash, wHash) triples of previously
+seen claim images. Each 64-bit perceptual hash is stored as one uint64, so
+an image is a row of three integers, and Hamming distances to every stored
+image come from a vectorized XOR and popcount over blocks of rows instead
+of a Python loop over imagehash objects.
+
+Similarity follows ImageForensicsEngine._calculate_similarity: the mean of
+the three Hamming distances, mapped to 0-100 as (1 - mean / 64) * 100.
+
+Near-duplicate lookups are sublinear through multi-index hashing: each
+hash is cut into four 16-bit chunks, and the twelve chunks of an image are
+keys in one sorted lookup table. If two images differ in at most 11 bits
+over all three hashes, at least one of the twelve chunks is identical
+(pigeonhole), so probing the table for the query's chunks finds every
+image with similarity >= 100 * (1 - 11 / 192) = 94.27%. Looser queries,
+and best-match queries without such a candidate, fall back to the exact
+full scan. Newly added images sit in a small unindexed tail that is
+always scanned, and are merged into the table in bulk.
+
+Most lookups are of novel images, which have no such candidate, so a
+best match is only sublinear when the caller sets min_similarity above
+94.27% (nothing less similar is wanted). Below that, a novel image costs
+a full scan. Random hash pairs already average about 50% similarity, so
+looser bands cannot be indexed usefully with chunk tables.
+
+Usage:
+    index = ImageHashIndex()
+    index.add(ph, dh, wh)
+    similarity, position = index.best_match(ph, dh, wh)
+"""
+
+import numpy as np
+
+
+HASH_BITS = 64
+HASHES_PER_IMAGE = 3
+MAX_DISTANCE = HASH_BITS * HASHES_PER_IMAGE
+
+# Multi-index hashing: CHUNKS_PER_HASH chunks of CHUNK_BITS bits per hash
+CHUNK_BITS = 16
+CHUNKS_PER_HASH = HASH_BITS // CHUNK_BITS
+N_CHUNKS = CHUNKS_PER_HASH * HASHES_PER_IMAGE
+# Largest total distance the chunk table is guaranteed to find, as a similarity
+MIH_RADIUS = N_CHUNKS - 1
+MIH_SIMILARITY = round((1.0 - MIH_RADIUS / MAX_DISTANCE) * 100.0, 2)
+
+_POPCOUNT8 = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    """Set bits per element of a uint64 array."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(values.shape + (8,)).sum(axis=-1, dtype=np.uint8)
+
+
+def hash_to_uint64(image_hash):
+    """
+    Pack a 64-bit imagehash.ImageHash into a uint64 (same bit order as str(hash)).
+
+    Raises:
+    -------
+    ValueError
+        If the hash does not have 64 bits
+    """
+    bits = np.asarray(image_hash.hash, dtype=bool).ravel()
+    if bits.size != HASH_BITS:
+        raise ValueError(f"Expected a {HASH_BITS}-bit hash, got {bits.size} bits")
+    return np.packbits(bits).view('>u8').astype(np.uint64)[0]
+
+
+def similarity_from_distance(total_distance):
+    """0-100 similarity from the summed Hamming distance of the three hashes."""
+    similarity = (1.0 - np.asarray(total_distance) / MAX_DISTANCE) * 100.0
+    return np.round(np.clip(similarity, 0.0, 100.0), 2)
+
+
+def max_distance_for(min_similarity):
+    """Largest summed Hamming distance with a similarity of at least min_similarity."""
+    return int(np.floor((1.0 - min_similarity / 100.0) * MAX_DISTANCE))
+
+
+def _chunk_keys(hashes):
+    """Multi-index keys (chunk slot << CHUNK_BITS | chunk value) per row, (n, N_CHUNKS)."""
+    hashes = hashes.reshape(-1, HASHES_PER_IMAGE, 1)
+    shifts = np.arange(CHUNKS_PER_HASH, dtype=np.uint64) * np.uint64(CHUNK_BITS)
+    chunks = (hashes >> shifts) & np.uint64((1 << CHUNK_BITS) - 1)
+    slots = np.arange(N_CHUNKS, dtype=np.uint64) << np.uint64(CHUNK_BITS)
+    # Keys stay below N_CHUNKS << CHUNK_BITS, so int64 is exact
+    return (chunks.reshape(-1, N_CHUNKS) | slots).astype(np.int64)
+
+
+class ImageHashIndex:
+    """
+    Growable array of packed (pHash, dHash, wHash) rows with similarity queries.
+
+    Parameters:
+    -----------
+    capacity : int
+        Initial row capacity; doubled as needed
+    tail_limit : int
+        Unindexed rows kept before they are merged into the chunk table
+        (at least an eighth of the indexed rows)
+    block_rows : int
+        Rows per XOR/popcount block in full scans
+    """
+
+    def __init__(self, capacity=1024, tail_limit=4096, block_rows=1 << 16):
+        self._hashes = np.zeros((max(1, capacity), HASHES_PER_IMAGE), dtype=np.uint64)
+        self.size = 0
+        self.tail_limit = tail_limit
+        self.block_rows = block_rows
+        # Sorted chunk keys and their row positions, covering rows [0, indexed)
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._positions = np.zeros(0, dtype=np.int64)
+        self.indexed = 0
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def hashes(self):
+        """(size, 3) uint64 view of the stored rows."""
+        return self._hashes[:self.size]
+
+    @staticmethod
+    def pack(ph, dh, wh):
+        """Packed uint64 row for one image's hash triple."""
+        return np.array([hash_to_uint64(ph), hash_to_uint64(dh), hash_to_uint64(wh)], dtype=np.uint64)
+
+    # --------------------------------------------
+    # Updates
+    # --------------------------------------------
+    def add(self, ph, dh, wh, **metadata):
+        """Append one image's hashes; returns its row position."""
+        return self.add_packed(self.pack(ph, dh, wh)[None, :], **metadata)[0]
+
+    def add_packed(self, rows, **metadata):
+        """Append packed (n, 3) uint64 rows; returns their positions."""
+        rows = np.asarray(rows, dtype=np.uint64).reshape(-1, HASHES_PER_IMAGE)
+        positions = np.arange(self.size, self.size + len(rows))
+        self._store_rows(rows, **metadata)
+        self._merge_tail()
+        return positions
+
+    def _store_rows(self, rows, **metadata):
+        """Append rows to the in-memory array (metadata is not kept)."""
+        needed = self.size + len(rows)
+        if needed > len(self._hashes):
+            grown = np.zeros((max(needed, 2 * len(self._hashes)), HASHES_PER_IMAGE), dtype=np.uint64)
+            grown[:self.size] = self.hashes
+            self._hashes = grown
+        self._hashes[self.size:needed] = rows
+        self.size = needed
+
+    def _merge_tail(self):
+        """Rebuild the chunk table once the unindexed tail outgrows its limit."""
+        # Tail grows with the table, so rebuild cost stays amortized O(log n) per row
+        if self.size - self.indexed > max(self.tail_limit, self.indexed // 8):
+            self.rebuild_chunk_table()
+
+    def match_and_add(self, ph, dh, wh, min_similarity=0.0, **metadata):
+        """
+        Best match of an image against the index, then add the image.
+
+        Returns:
+        --------
+        tuple
+            (similarity, position) of the best match before the add, as best_match
+        """
+        match = self.best_match(ph, dh, wh, min_similarity)
+        self.add(ph, dh, wh, **metadata)
+        return match
+
+    def rebuild_chunk_table(self):
+        """Index every stored row in the multi-index chunk table."""
+        keys = _chunk_keys(self.hashes).ravel()
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._positions = (order // N_CHUNKS).astype(np.int64)
+        self.indexed = self.size
+
+    # --------------------------------------------
+    # Queries
+    # --------------------------------------------
+    def distances(self, query, rows=None):
+        """
+        Summed Hamming distance of the query triple to stored rows.
+
+        Parameters:
+        -----------
+        query : np.ndarray
+            Packed (3,) uint64 query, see pack
+        rows : np.ndarray, optional
+            Row positions to compare; all rows by default
+
+        Returns:
+        --------
+        np.ndarray
+            int64 distances in [0, 192], aligned with rows
+        """
+        query = np.asarray(query, dtype=np.uint64)
+        hashes = self.hashes
+        n_rows = len(hashes) if rows is None else len(rows)
+        result = np.empty(n_rows, dtype=np.int64)
+        for start in range(0, n_rows, self.block_rows):
+            stop = min(start + self.block_rows, n_rows)
+            block = hashes[start:stop] if rows is None else hashes[rows[start:stop]]
+            result[start:stop] = popcount64(block ^ query).sum(axis=1, dtype=np.int64)
+        return result
+
+    def _candidates(self, query):
+        """Rows sharing a chunk with the query, plus the unindexed tail."""
+        query_keys = _chunk_keys(np.asarray(query, dtype=np.uint64)).ravel()
+        lower = np.searchsorted(self._keys, query_keys, side='left')
+        upper = np.searchsorted(self._keys, query_keys, side='right')
+        matched = [self._positions[lo:hi] for lo, hi in zip(lower, upper) if hi > lo]
+        tail = np.arange(self.indexed, self.size)
+        return np.unique(np.concatenate(matched + [tail]))
+
+    def within(self, query, min_similarity):
+        """
+        Rows at or above a similarity, most similar first.
+
+        Returns:
+        --------
+        tuple
+            (positions, similarities)
+        """
+        max_distance = max_distance_for(min_similarity)
+        rows = self._candidates(query) if max_distance <= MIH_RADIUS else np.arange(self.size)
+        distance = self.distances(query, rows)
+        keep = distance <= max_distance
+        rows, distance = rows[keep], distance[keep]
+        order = np.argsort(distance, kind='stable')
+        return rows[order], similarity_from_distance(distance[order])
+
+    def top_k(self, query, k):
+        """
+        The k most similar rows, most similar first.
+
+        Returns:
+        --------
+        tuple
+            (positions, similarities)
+        """
+        distance = self.distances(query)
+        k = min(k, len(distance))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        top = np.argpartition(distance, k - 1)[:k]
+        top = top[np.argsort(distance[top], kind='stable')]
+        return top, similarity_from_distance(distance[top])
+
+    def best_match(self, ph, dh, wh, min_similarity=0.0):
+        """
+        Most similar stored image to an imagehash triple, if similar enough.
+
+        Probes the chunk table first; a candidate within MIH_RADIUS is
+        provably the global best. Without one, all rows are scanned, unless
+        min_similarity is above MIH_SIMILARITY: then no stored image can
+        reach it and the lookup stays sublinear.
+
+        Parameters:
+        -----------
+        ph, dh, wh : imagehash.ImageHash
+            The query image's hashes
+        min_similarity : float
+            Lowest similarity (0-100) worth reporting
+
+        Returns:
+        --------
+        tuple
+            (similarity, position); (0, None) for an empty index or when
+            no stored image reaches min_similarity
+        """
+        if self.size == 0:
+            return 0, None
+        query = self.pack(ph, dh, wh)
+        max_distance = max_distance_for(min_similarity)
+        rows = self._candidates(query)
+        distance = self.distances(query, rows)
+        near = len(rows) > 0 and distance.min() <= MIH_RADIUS
+        if not near and max_distance > MIH_RADIUS and len(rows) < self.size:
+            # No near-identical candidate, but looser matches are wanted
+            rows = np.arange(self.size)
+            distance = self.distances(query)
+        if len(rows) == 0 or distance.min() > max_distance:
+            return 0, None
+        best = int(np.argmin(distance))
+        return float(similarity_from_distance(distance[best])), int(rows[best])
@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Durable Image Hash Store
+========================
+
+Persists the (pHash, dHash, wHash) triples of analyzed claim images so
+duplicate detection survives restarts and sees the same history from
+every API worker process.
+
+Layout:
+    <path>           16-byte header (magic, format version, record size)
+                     followed by fixed-width records: three uint64 hashes,
+                     a UNIX timestamp, claim and provider IDs and a CRC32
+                     of the record
+    <path>.mih.npy   Optional (2, n) int64 multi-index chunk table (sorted
+                     keys, row positions) over the first records, written
+                     by compaction (see image_hash_index.py)
+
+Appends are a single O_APPEND write of whole records under an exclusive
+flock, fsync'd before the lock is released. A crash can only leave a
+partial record at the end of the file: readers ignore it and the next
+append truncates it first. Readers memory-map the records read-only, so
+opening the store and its chunk table costs the same at any size; the map
+is extended when another worker has appended.
+
+Compaction runs offline (API stopped): it drops records failing their
+checksum, applies the retention limits, rewrites the log atomically and
+rebuilds the chunk table. It is the only place the chunk table is built:
+API workers never rebuild it, since that would mean sorting every record
+under the log lock, once per worker. Records appended since the last
+compaction are scanned as the tail on every lookup, so lookup cost grows
+with the tail until the next compaction.
+
+Usage:
+    python image_hash_store.py compact image_hashes.bin --max-records 1000000
+    python image_hash_store.py stats image_hashes.bin
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+from image_hash_index import HASHES_PER_IMAGE, N_CHUNKS, ImageHashIndex, _chunk_keys
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+
+STORE_MAGIC = b"AVHSTORE"
+STORE_FORMAT_VERSION = 1
+HEADER_SIZE = 16
+
+ID_BYTES = 24
+RECORD_DTYPE = np.dtype([
+    ('hashes', '<u8', (HASHES_PER_IMAGE,)),
+    ('timestamp', '<f8'),
+    ('claim_id', f'S{ID_BYTES}'),
+    ('provider_id', f'S{ID_BYTES}'),
+    ('checksum', '<u4'),
+    ('reserved', '<u4'),
+])
+RECORD_SIZE = RECORD_DTYPE.itemsize
+# Bytes covered by a record's checksum
+_CHECKED_BYTES = RECORD_DTYPE.fields['checksum'][1]
+
+DEFAULT_STORE_PATH = "image_hashes.bin"
+
+
+def _header():
+    return (STORE_MAGIC + np.array([STORE_FORMAT_VERSION, RECORD_SIZE], dtype='<u4').tobytes())
+
+
+def _checksums(records):
+    """CRC32 of each record's data fields."""
+    raw = records.view(np.uint8).reshape(len(records), RECORD_SIZE)[:, :_CHECKED_BYTES]
+    return np.fromiter((zlib.crc32(row.tobytes()) for row in raw), dtype=np.uint32, count=len(records))
+
+
+def _valid_tail(records):
+    """Whether the last record (if any) passes its checksum."""
+    return len(records) == 0 or _checksums(records[-1:])[0] == records['checksum'][-1]
+
+
+def make_records(hashes, claim_ids=None, provider_ids=None, timestamps=None):
+    """
+    Checksummed records for packed (n, 3) uint64 hash rows.
+
+    IDs longer than 24 bytes are truncated.
+    """
+    hashes = np.asarray(hashes, dtype=np.uint64).reshape(-1, HASHES_PER_IMAGE)
+    records = np.zeros(len(hashes), dtype=RECORD_DTYPE)
+    records['hashes'] = hashes
+    records['timestamp'] = time.time() if timestamps is None else timestamps
+    for field, values in [('claim_id', claim_ids), ('provider_id', provider_ids)]:
+        if values is not None:
+            records[field] = [str(value or '').encode('utf-8')[:ID_BYTES] for value in np.atleast_1d(values)]
+    records['checksum'] = _checksums(records)
+    return records
+
+
+class ImageHashStore:
+    """
+    Append-only, memory-mapped log of image hash records.
+
+    Parameters:
+    -----------
+    path : str
+        Log file; created (with its header) if missing
+    fsync : bool
+        fsync each append before returning
+
+    Raises:
+    -------
+    ValueError
+        If the file is not a store of this format
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH, fsync=True):
+        self.path = path
+        self.fsync = fsync
+        self._lock_depth = 0
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        with self.lock():
+            if os.fstat(self._fd).st_size == 0:
+                os.write(self._fd, _header())
+                os.fsync(self._fd)
+        header = os.pread(self._fd, HEADER_SIZE, 0)
+        if header != _header():
+            os.close(self._fd)
+            raise ValueError(f"{path} is not an image hash store (format v{STORE_FORMAT_VERSION})")
+        self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self.refresh()
+
+    def __len__(self):
+        return len(self.records)
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    @property
+    def hashes(self):
+        """(n, 3) uint64 view of the stored hashes."""
+        return self.records['hashes']
+
+    @contextmanager
+    def lock(self):
+        """
+        Exclusive lock on the log across processes.
+
+        Reentrant within one thread; callers serialize their own threads.
+        """
+        if self._lock_depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._lock_depth += 1
+        try:
+            yield self
+        finally:
+            self._lock_depth -= 1
+            if self._lock_depth == 0 and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def refresh(self):
+        """Remap the log if other processes appended; returns the record count."""
+        n_records = max(0, (os.fstat(self._fd).st_size - HEADER_SIZE) // RECORD_SIZE)
+        if n_records > len(self.records):
+            records = np.memmap(self.path, dtype=RECORD_DTYPE, mode='r',
+                                offset=HEADER_SIZE, shape=(n_records,))
+            # A last record torn by a crash is left out; the next append drops it
+            if not _valid_tail(records):
+                records = records[:-1]
+            self.records = records
+        return len(self.records)
+
+    def append(self, records):
+        """
+        Durably append records; take lock() around it to pair with a query.
+
+        Returns:
+        --------
+        int
+            Record count after the append
+        """
+        records = np.ascontiguousarray(records, dtype=RECORD_DTYPE)
+        with self.lock():
+            size = os.fstat(self._fd).st_size
+            aligned = HEADER_SIZE + (size - HEADER_SIZE) // RECORD_SIZE * RECORD_SIZE
+            if aligned > HEADER_SIZE:
+                last = np.frombuffer(os.pread(self._fd, RECORD_SIZE, aligned - RECORD_SIZE), dtype=RECORD_DTYPE)
+                if not _valid_tail(last):
+                    aligned -= RECORD_SIZE
+            if size != aligned:
+                # Drop what a crash left of the last record so records stay aligned
+                os.ftruncate(self._fd, aligned)
+            os.write(self._fd, records.tobytes())
+            if self.fsync:
+                os.fsync(self._fd)
+        return self.refresh()
+
+
+class StoredImageHashIndex(ImageHashIndex):
+    """
+    ImageHashIndex over an ImageHashStore.
+
+    Rows are the store's memory-mapped records; the compacted chunk table
+    is memory-mapped from <path>.mih.npy when present, and records
+    appended since are scanned as the tail. The table is never rebuilt
+    in process, only by compact_store.
+    """
+
+    def __init__(self, store, block_rows=1 << 16):
+        self.store = store
+        self.block_rows = block_rows
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._positions = np.zeros(0, dtype=np.int64)
+        self.indexed = 0
+
+        table_path = chunk_table_path(store.path)
+        if os.path.exists(table_path):
+            table = np.load(table_path, mmap_mode='r')
+            # A table over more records than the log has is from another generation
+            if table.ndim == 2 and table.shape[0] == 2 and table.shape[1] // N_CHUNKS <= len(store):
+                self._keys, self._positions = table[0], table[1]
+                self.indexed = table.shape[1] // N_CHUNKS
+
+    @classmethod
+    def open(cls, path=DEFAULT_STORE_PATH, fsync=True):
+        return cls(ImageHashStore(path, fsync=fsync))
+
+    @property
+    def size(self):
+        return len(self.store)
+
+    @property
+    def hashes(self):
+        return self.store.hashes
+
+    def _store_rows(self, rows, claim_id=None, provider_id=None):
+        self.store.append(make_records(rows, claim_id, provider_id))
+
+    def _merge_tail(self):
+        # Left to offline compaction: a rebuild here would hold the log lock
+        # for a full sort and give each worker its own private table
+        pass
+
+    def match_and_add(self, ph, dh, wh, min_similarity=0.0, **metadata):
+        # Hold the log lock so workers see each other's uploads in order
+        with self.store.lock():
+            self.store.refresh()
+            return super().match_and_add(ph, dh, wh, min_similarity, **metadata)
+
+    def metadata(self, position):
+        """Claim ID, provider ID and timestamp of a stored record."""
+        record = self.store.records[position]
+        return {
+            "claim_id": record['claim_id'].decode('utf-8'),
+            "provider_id": record['provider_id'].decode('utf-8'),
+            "timestamp": float(record['timestamp']),
+        }
+
+
+def chunk_table_path(path):
+    return f"{path}.mih.npy"
+
+
+def compact_store(path, max_records=None, max_age_days=None):
+    """
+    Rewrite a store offline: drop corrupt and expired records, rebuild the chunk table.
+
+    Parameters:
+    -----------
+    path : str
+        Store log
+    max_records : int, optional
+        Keep only the newest max_records records
+    max_age_days : float, optional
+        Drop records older than this
+
+    Returns:
+    --------
+    dict
+        Records before, dropped as corrupt, dropped by retention, and kept
+    """
+    store = ImageHashStore(path)
+    try:
+        with store.lock():
+            store.refresh()
+            records = np.array(store.records)
+            valid = _checksums(records) == records['checksum']
+            kept = records[valid]
+            if max_age_days is not None:
+                kept = kept[kept['timestamp'] >= time.time() - max_age_days * 86400.0]
+            if max_records is not None:
+                kept = kept[max(0, len(kept) - max_records):]
+
+            keys = _chunk_keys(kept['hashes']).ravel()
+            order = np.argsort(keys, kind='stable')
+            table = np.vstack([keys[order], order // N_CHUNKS]).astype(np.int64)
+
+            # Old table first, so a crash never pairs a table with the wrong log
+            table_path = chunk_table_path(path)
+            if os.path.exists(table_path):
+                os.remove(table_path)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(_header())
+                f.write(kept.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            tmp_table_path = f"{path}.mih.tmp.npy"
+            np.save(tmp_table_path, table)
+            os.replace(tmp_table_path, table_path)
+    finally:
+        store.close()
+    return {
+        "records": int(len(records)),
+        "corrupt": int((~valid).sum()),
+        "expired": int(valid.sum() - len(kept)),
+        "kept": int(len(kept)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the durable image hash store")
+    parser.add_argument("command", choices=["compact", "stats"])
+    parser.add_argument("path", nargs="?", default=DEFAULT_STORE_PATH, help="Store log file")
+    parser.add_argument("--max-records", type=int, help="Keep only the newest N records")
+    parser.add_argument("--max-age-days", type=float, help="Drop records older than this")
+
+    args = parser.parse_args()
+
+    try:
+        if args.command == "compact":
+            result = compact_store(args.path, args.max_records, args.max_age_days)
+            print(f"✓ Compacted {args.path}: kept {result['kept']:,} of {result['records']:,} records "
+                  f"({result['corrupt']:,} corrupt, {result['expired']:,} expired)")
+        else:
+            index = StoredImageHashIndex.open(args.path)
+            print(f"{args.path}: {len(index):,} records, {index.indexed:,} in the chunk table, "
+                  f"{len(index) - index.indexed:,} in the scanned tail")
+    except Exception as e:
+        print(f"Image hash store {args.command} failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Versioned Model Artifact for the Fraud Detection Engine
+=======================================================
+
+Trains the anomaly detector (Isolation Forest by default) once and exports
+everything needed to score claims later without refitting: the fitted
+model and scaler, the selected feature list, median fill values, the
+risk-score calibration, provider aggregates, the sparse provider × code
+counts, provider network features, the MinHash signatures, stay periods
+and dates of recent claims and the per-feature reference distribution
+used for drift monitoring.
+
+The artifact is a single uncompressed joblib file so the API can load it
+with ``mmap_mode='r'``; the tree node arrays are then memory-mapped rather
+than copied into the process.
+
+Usage:
+    python model_artifact.py --data cleaned_claims.csv --output fraud_model.joblib
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+import sklearn
+
+from code_features import ProviderCodeCounts, has_code_columns
+from detectors import DETECTORS
+from drift_monitor import fit_feature_reference
+from duplicate_claims import ClaimSignatureIndex
+from fraud_detection_engine import (
+    FEATURE_COLUMNS,
+    OPTIONAL_FEATURE_COLUMNS,
+    run_pipeline,
+)
+from pipeline_instrumentation import logger
+from provider_network import NETWORK_FEATURE_COLUMNS, provider_network_features
+from stay_overlaps import BeneficiaryStays
+from temporal_features import DATE_COLUMN, ProviderClaimWindows
+
+# Bump whenever the artifact layout changes; older files are refused.
+ARTIFACT_FORMAT_VERSION = 7
+
+DEFAULT_ARTIFACT_PATH = "fraud_model.joblib"
+
+
+def feature_schema_hash(feature_columns):
+    """Stable fingerprint of an ordered feature list."""
+    return hashlib.sha256("|".join(feature_columns).encode("utf-8")).hexdigest()
+
+
+def _provider_aggregates(df):
+    """
+    Per-provider claim count, amount sum and sum of squared deviations.
+
+    The (count, sum, M2) triple is the running state claim_scoring merges
+    new batches into.
+    """
+    grouped = df.groupby('Provider')['InscClaimAmtReimbursed'].agg(['count', 'sum', 'var'])
+    counts = grouped['count'].to_numpy(dtype=np.int64)
+    return {
+        "providers": grouped.index.to_numpy(dtype=object),
+        "claim_count": counts,
+        "claim_amount_sum": grouped['sum'].to_numpy(dtype=np.float64),
+        "claim_amount_m2": grouped['var'].fillna(0).to_numpy(dtype=np.float64) * (counts - 1),
+    }
+
+
+def _global_claim_stats(df):
+    """Dataset-wide claim count, amount sum and sum of squared deviations."""
+    amounts = df['InscClaimAmtReimbursed']
+    count = int(amounts.count())
+    return {
+        "count": count,
+        "sum": float(amounts.sum()),
+        "m2": float(amounts.var(ddof=0) * count) if count else 0.0,
+    }
+
+
+def _procedure_frequency(df, procedure_col='ClmProcedureCode_1'):
+    """Claim counts per (provider, procedure) pair, as plain arrays."""
+    if procedure_col not in df.columns:
+        return None
+    counts = df.groupby(['Provider', procedure_col]).size()
+    return {
+        "providers": counts.index.get_level_values(0).to_numpy(dtype=object),
+        "procedures": counts.index.get_level_values(1).to_numpy(),
+        "claim_count": counts.to_numpy(dtype=np.int64),
+    }
+
+
+def _provider_code_counts(df):
+    """Sparse provider × code counts over all code columns, as plain arrays."""
+    if not has_code_columns(df.columns):
+        return None
+    counts = ProviderCodeCounts()
+    counts.update(df)
+    return counts.to_dict()
+
+
+def _provider_network(df):
+    """Provider-level network features, as plain arrays."""
+    if 'BeneID' not in df.columns:
+        return None
+    network = provider_network_features(df)
+    return {
+        "providers": network.index.to_numpy(dtype=object),
+        **{name: network[name].to_numpy() for name in NETWORK_FEATURE_COLUMNS},
+    }
+
+
+def _claim_signatures(df):
+    """MinHash signatures of recent claims with their LSH band tables, as plain arrays."""
+    if 'BeneID' not in df.columns:
+        return None
+    signatures = ClaimSignatureIndex()
+    signatures.update(df)
+    signatures.rebuild()
+    return signatures.to_dict()
+
+
+def _beneficiary_stays(df):
+    """Recent stay periods per beneficiary and provider overlap counts, as plain arrays."""
+    if 'BeneID' not in df.columns:
+        return None
+    stays = BeneficiaryStays()
+    stays.update(df)
+    return stays.to_dict()
+
+
+def _provider_claim_windows(df):
+    """Dates and amounts of recent claims per provider, as plain arrays."""
+    if DATE_COLUMN not in df.columns:
+        return None
+    windows = ProviderClaimWindows()
+    windows.update(df)
+    return windows.to_dict()
+
+
+def build_model_artifact(results):
+    """
+    Assemble an artifact from the output of ``run_pipeline``.
+
+    Parameters:
+    -----------
+    results : dict
+        Result dictionary returned by fraud_detection_engine.run_pipeline
+
+    Returns:
+    --------
+    dict
+        Artifact ready for save_model_artifact
+    """
+    df = results["df"]
+    feature_columns = list(results["feature_columns"])
+    fill_values = df[feature_columns].median().astype(float).to_dict()
+
+    return {
+        "format_version": ARTIFACT_FORMAT_VERSION,
+        "model_version": datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
+        "sklearn_version": sklearn.__version__,
+        "feature_columns": feature_columns,
+        "feature_schema_hash": feature_schema_hash(feature_columns),
+        "fill_values": fill_values,
+        "feature_reference": fit_feature_reference(df[feature_columns].fillna(fill_values), feature_columns),
+        "detector": results.get("detector", "isolation_forest"),
+        "model": results["model"],
+        "scaler": results["scaler"],
+        "score_calibration": results["calibration"].to_dict(),
+        "global_avg_claim_amount": float(df['InscClaimAmtReimbursed'].mean()),
+        "global_claim_stats": _global_claim_stats(df),
+        "provider_aggregates": _provider_aggregates(df),
+        "procedure_frequency": _procedure_frequency(df),
+        "provider_code_counts": _provider_code_counts(df),
+        "provider_network": _provider_network(df),
+        "claim_signatures": _claim_signatures(df),
+        "beneficiary_stays": _beneficiary_stays(df),
+        "claim_windows": _provider_claim_windows(df),
+    }
+
+
+def save_model_artifact(artifact, path=DEFAULT_ARTIFACT_PATH):
+    """
+    Write an artifact to disk atomically.
+
+    The file is left uncompressed so that numpy arrays inside it can be
+    memory-mapped on load.
+    """
+    tmp_path = f"{path}.tmp"
+    joblib.dump(artifact, tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"✓ Saved model artifact v{artifact['model_version']} to {path}")
+    return path
+
+
+def validate_feature_schema(artifact, expected_features=None):
+    """
+    Check that an artifact's feature schema matches this engine.
+
+    Parameters:
+    -----------
+    artifact : dict
+        Loaded artifact
+    expected_features : list, optional
+        Exact feature list the caller needs. When omitted, the artifact must
+        use the engine's core features followed by known optional ones.
+
+    Raises:
+    -------
+    ValueError
+        If the format version or feature schema does not match
+    """
+    version = artifact.get("format_version")
+    if version != ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"Unsupported artifact format version {version} "
+            f"(expected {ARTIFACT_FORMAT_VERSION})"
+        )
+
+    feature_columns = list(artifact["feature_columns"])
+    if artifact.get("feature_schema_hash") != feature_schema_hash(feature_columns):
+        raise ValueError("Artifact feature schema hash does not match its feature list")
+
+    if expected_features is not None:
+        if feature_columns != list(expected_features):
+            raise ValueError(
+                f"Artifact features {feature_columns} do not match "
+                f"expected features {list(expected_features)}"
+            )
+        return
+
+    core = feature_columns[:len(FEATURE_COLUMNS)]
+    extra = feature_columns[len(FEATURE_COLUMNS):]
+    unknown = [col for col in extra if col not in OPTIONAL_FEATURE_COLUMNS]
+    if core != FEATURE_COLUMNS or unknown:
+        raise ValueError(
+            f"Artifact features {feature_columns} do not match the engine schema"
+        )
+
+
+def load_model_artifact(path=DEFAULT_ARTIFACT_PATH, expected_features=None, mmap=True):
+    """
+    Load and validate a model artifact.
+
+    Parameters:
+    -----------
+    path : str
+        Path to the artifact file
+    expected_features : list, optional
+        See validate_feature_schema
+    mmap : bool
+        Memory-map numpy arrays (tree nodes, aggregates) read-only
+
+    Returns:
+    --------
+    dict
+        Validated artifact
+
+    Raises:
+    -------
+    FileNotFoundError
+        If the artifact does not exist
+    ValueError
+        If the artifact's schema does not match
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model artifact not found: {path}")
+
+    artifact = joblib.load(path, mmap_mode="r" if mmap else None)
+    validate_feature_schema(artifact, expected_features)
+    return artifact
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train and export the fraud detection model")
+    parser.add_argument("--data", help="Path to the cleaned claims CSV", default="cleaned_claims.csv")
+    parser.add_argument("--output", help="Artifact output path", default=DEFAULT_ARTIFACT_PATH)
+    parser.add_argument("--detector", help="Anomaly detector to train", default="isolation_forest",
+                        choices=sorted(DETECTORS))
+
+    args = parser.parse_args()
+
+    try:
+        results = run_pipeline(args.data, detector=args.detector)
+        save_model_artifact(build_model_artifact(results), args.output)
+    except Exception as e:
+        print(f"Export failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Pipeline Logging and Stage Instrumentation
+==========================================
+
+Shared logger for the detection pipeline plus a lightweight recorder that
+measures each pipeline stage: wall time, CPU time, rows in/out and memory.
+
+Memory is reported two ways:
+    - peak_traced_mb: peak Python/numpy allocations inside the stage
+      (tracemalloc; only when trace_memory=True because tracing slows
+      allocation-heavy code)
+    - max_rss_mb: process resident-set high-water mark after the stage
+      (where the platform provides it)
+
+Usage:
+    instrumentation = PipelineInstrumentation()
+    with instrumentation.stage("load_data") as record:
+        df = load_data(path)
+        record["rows_out"] = len(df)
+    instrumentation.records  # list of dicts, one per stage
+"""
+
+import logging
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    StreamHandler writing to the current sys.stdout.
+
+    The stream is looked up on every record instead of being bound at
+    import, so contextlib.redirect_stdout still captures pipeline output.
+    """
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+logger = logging.getLogger("fraud_detection")
+if not logger.handlers:
+    _handler = _StdoutHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+VERBOSITY_LEVELS = {0: logging.WARNING, 1: logging.INFO, 2: logging.DEBUG}
+
+
+def set_verbosity(verbose):
+    """
+    Set pipeline log verbosity.
+
+    0 shows warnings only, 1 shows step progress (the default) and 2 adds
+    debug output.
+    """
+    logger.setLevel(VERBOSITY_LEVELS[min(max(int(verbose), 0), 2)])
+
+
+def _max_rss_mb():
+    """Resident-set high-water mark of this process in MB, or None."""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return max_rss / 1e6 if sys.platform == "darwin" else max_rss / 1e3
+
+
+class PipelineInstrumentation:
+    """
+    Records timing and memory for each pipeline stage.
+
+    Parameters:
+    -----------
+    trace_memory : bool
+        Track peak allocations per stage with tracemalloc
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Measure the enclosed block as one stage.
+
+        Yields the stage record; set ``record["rows_out"]`` inside the block.
+        """
+        record = {
+            "stage": name,
+            "rows_in": rows_in,
+            "rows_out": None,
+            "wall_time_s": None,
+            "cpu_time_s": None,
+            "peak_traced_mb": None,
+            "max_rss_mb": None,
+        }
+
+        started_tracing = False
+        if self.trace_memory:
+            if tracemalloc.is_tracing():
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.start()
+                started_tracing = True
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_time_s"] = round(time.perf_counter() - wall_start, 4)
+            record["cpu_time_s"] = round(time.process_time() - cpu_start, 4)
+            if self.trace_memory:
+                _, peak = tracemalloc.get_traced_memory()
+                record["peak_traced_mb"] = round(peak / 1e6, 2)
+                if started_tracing:
+                    tracemalloc.stop()
+            rss = _max_rss_mb()
+            record["max_rss_mb"] = round(rss, 1) if rss is not None else None
+            self.records.append(record)
+            logger.debug(
+                f"[{name}] wall {record['wall_time_s']:.3f}s, cpu {record['cpu_time_s']:.3f}s, "
+                f"rows {record['rows_in']} -> {record['rows_out']}"
+            )
+
+    def total_wall_time(self):
+        return sum(record["wall_time_s"] for record in self.records)
+
+    def log_summary(self):
+        """Log a per-stage timing table."""
+        logger.info("\n" + "=" * 60)
+        logger.info("Stage Timing Summary")
+        logger.info("=" * 60)
+        logger.info(f"{'Stage':<28}{'Wall (s)':>10}{'CPU (s)':>10}{'Rows out':>12}")
+        for record in self.records:
+            rows_out = f"{record['rows_out']:,}" if record["rows_out"] is not None else "-"
+            logger.info(
+                f"{record['stage']:<28}{record['wall_time_s']:>10.3f}"
+                f"{record['cpu_time_s']:>10.3f}{rows_out:>12}"
+            )
+        logger.info(f"{'Total':<28}{self.total_wall_time():>10.3f}")
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Persisted Risk-Score Calibration
+================================
+
+Maps Isolation Forest anomaly scores to the 0-100 RiskScore through an
+empirical CDF of the training scores, instead of min-max scaling against
+whatever batch is being scored.
+
+The CDF is a fixed-bin histogram over the full decision_function range
+[-1, 1]. Because every calibration shares the same bin edges:
+    - applying it is O(1) per claim (one bin lookup plus interpolation),
+      so a claim gets the same RiskScore whether it is scored alone or in
+      a batch of millions
+    - calibrations fitted on separate data shards merge exactly by adding
+      their bin counts
+
+RiskScore is the percentage of training claims that scored as less
+anomalous than the claim, i.e. 100 * (1 - CDF(anomaly_score)).
+
+Usage:
+    calibration = ScoreCalibration.from_scores(training_anomaly_scores)
+    risk_scores = calibration.transform(new_anomaly_scores)
+"""
+
+import numpy as np
+
+
+# decision_function = score_samples - offset_, with both terms in [-1, 0]
+SCORE_RANGE = (-1.0, 1.0)
+DEFAULT_BINS = 8192
+
+
+class ScoreCalibration:
+    """
+    Mergeable fixed-bin empirical CDF of anomaly scores.
+
+    Parameters:
+    -----------
+    counts : np.ndarray, optional
+        Histogram counts per bin; defaults to an empty histogram
+    n_bins : int
+        Number of equal-width bins over SCORE_RANGE
+    """
+
+    def __init__(self, counts=None, n_bins=DEFAULT_BINS):
+        if counts is None:
+            counts = np.zeros(n_bins, dtype=np.int64)
+        self.counts = np.array(counts, dtype=np.int64)
+        self.n_bins = len(self.counts)
+        self.low, self.high = SCORE_RANGE
+        self._bin_width = (self.high - self.low) / self.n_bins
+        self._refresh()
+
+    @classmethod
+    def from_scores(cls, anomaly_scores, n_bins=DEFAULT_BINS):
+        """Fit a calibration on a set of (training) anomaly scores."""
+        calibration = cls(n_bins=n_bins)
+        calibration.update(anomaly_scores)
+        return calibration
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild a calibration stored with to_dict (e.g. in a model artifact)."""
+        return cls(counts=state["counts"])
+
+    def to_dict(self):
+        """Plain-array state for persisting in a model artifact."""
+        return {
+            "score_range": SCORE_RANGE,
+            "counts": self.counts.copy(),
+        }
+
+    # --------------------------------------------
+    # Fitting and merging
+    # --------------------------------------------
+    def _bin_positions(self, anomaly_scores):
+        """Fractional bin position of each score, clipped to the histogram."""
+        scores = np.clip(np.asarray(anomaly_scores, dtype=np.float64), self.low, self.high)
+        positions = (scores - self.low) / self._bin_width
+        bins = np.minimum(positions.astype(np.int64), self.n_bins - 1)
+        return bins, positions - bins
+
+    def _refresh(self):
+        # cumulative[i] = number of scores below the left edge of bin i
+        self.total = int(self.counts.sum())
+        self._cumulative = np.concatenate([[0], np.cumsum(self.counts)[:-1]]).astype(np.float64)
+
+    def update(self, anomaly_scores):
+        """Add anomaly scores to the histogram in place."""
+        bins, _ = self._bin_positions(anomaly_scores)
+        self.counts += np.bincount(bins, minlength=self.n_bins)
+        self._refresh()
+        return self
+
+    def merge(self, other):
+        """
+        Combine with a calibration fitted on another shard.
+
+        Returns:
+        --------
+        ScoreCalibration
+            New calibration equal to one fitted on both shards' scores
+
+        Raises:
+        -------
+        ValueError
+            If the calibrations use different bins
+        """
+        if other.n_bins != self.n_bins:
+            raise ValueError(f"Cannot merge calibrations with {self.n_bins} and {other.n_bins} bins")
+        return ScoreCalibration(counts=self.counts + other.counts)
+
+    # --------------------------------------------
+    # Scoring
+    # --------------------------------------------
+    def cdf(self, anomaly_scores):
+        """Fraction of calibration scores below each score (interpolated within bins)."""
+        if self.total == 0:
+            raise ValueError("Score calibration has not been fitted")
+        bins, fraction = self._bin_positions(anomaly_scores)
+        return (self._cumulative[bins] + fraction * self.counts[bins]) / self.total
+
+    def transform(self, anomaly_scores):
+        """
+        Convert anomaly scores to 0-100 RiskScore.
+
+        More negative (more anomalous) scores map to higher risk.
+        """
+        return (1.0 - self.cdf(anomaly_scores)) * 100
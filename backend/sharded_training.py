@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Sharded Isolation Forest Training
+=================================
+
+Builds one Isolation Forest from trees grown on separate row shards in
+worker processes, for claim sets where a single-process fit is too slow.
+
+Each tree only ever sees max_samples rows, drawn from its shard instead
+of the full matrix. Rows are dealt to shards round-robin (row i goes to
+shard i mod n_shards), so every shard spans the whole input even when it
+is sorted by provider, date or amount; a contiguous split would give each
+shard's trees a skewed population. The merged model is still not the
+forest an unsharded fit would grow, only one built from similar
+subsamples. The scaled matrix is placed in shared memory once (as
+float32, the dtype IsolationForest fits in); each worker fits its share
+of the trees on a strided view of its rows, and the partial forests are
+concatenated into a single IsolationForest.
+
+With contamination set, offset_ is the same percentile of training
+score_samples that IsolationForest.fit uses, computed on at most
+offset_sample_size rows drawn uniformly from the full matrix.
+
+Usage:
+    model = train_sharded_isolation_forest(X_scaled, n_estimators=200, n_shards=8)
+"""
+
+import copy
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.ensemble import IsolationForest
+
+from forest_scorer import FlatIsolationForest
+from shared_arrays import attach_shared_arrays, shared_arrays, worker_arrays
+
+
+def _fit_shard(first_row, stride, n_estimators, max_samples, bootstrap, max_features, seed):
+    """Pool task: grow n_estimators trees on rows first_row::stride of the shared matrix."""
+    X = worker_arrays()['X'][first_row::stride]
+    forest = IsolationForest(
+        n_estimators=n_estimators,
+        max_samples=max_samples,
+        bootstrap=bootstrap,
+        max_features=max_features,
+        contamination='auto',
+        random_state=seed,
+        n_jobs=1,
+    )
+    return forest.fit(X)
+
+
+def merge_isolation_forests(forests):
+    """
+    Concatenate partial forests into one IsolationForest.
+
+    All forests must share max_samples_, n_features_in_ and max_features,
+    so that path lengths are normalised the same way. The merged model
+    scores exactly like averaging over all trees; estimators_samples_
+    refers to row indices within each tree's own shard.
+
+    Raises:
+    -------
+    ValueError
+        If the forests were fitted with different settings
+    """
+    first = forests[0]
+    for forest in forests[1:]:
+        if (forest.max_samples_ != first.max_samples_
+                or forest.n_features_in_ != first.n_features_in_
+                or forest._max_features != first._max_features):
+            raise ValueError("Cannot merge Isolation Forests fitted with different settings")
+
+    merged = copy.copy(first)
+    merged.estimators_ = [tree for forest in forests for tree in forest.estimators_]
+    merged.estimators_features_ = [f for forest in forests for f in forest.estimators_features_]
+    merged._seeds = np.concatenate([forest._seeds for forest in forests])
+    merged._average_path_length_per_tree = tuple(
+        v for forest in forests for v in forest._average_path_length_per_tree
+    )
+    merged._decision_path_lengths = tuple(
+        v for forest in forests for v in forest._decision_path_lengths
+    )
+    merged.n_estimators = len(merged.estimators_)
+    return merged
+
+
+def plan_shards(n_rows, n_shards, n_estimators, max_samples):
+    """
+    First row, row stride and tree count per shard.
+
+    Shard i holds rows i, i + n_shards, i + 2 * n_shards, ... Shards are
+    kept at least max_samples rows long so every tree draws the same
+    subsample size; the shard count drops if the data is too small.
+    """
+    n_shards = max(1, min(n_shards, n_estimators, n_rows // max(max_samples, 1) or 1))
+    trees = np.full(n_shards, n_estimators // n_shards)
+    trees[:n_estimators % n_shards] += 1
+    return [(i, n_shards, int(trees[i])) for i in range(n_shards)]
+
+
+def train_sharded_isolation_forest(X, n_estimators=200, max_samples=256, bootstrap=False,
+                                   max_features=1.0, contamination='auto', n_shards=None,
+                                   workers=None, random_state=42, offset_sample_size=1_000_000):
+    """
+    Fit an Isolation Forest with trees built per row shard across processes.
+
+    Parameters:
+    -----------
+    X : np.ndarray
+        Scaled feature matrix
+    n_estimators : int
+        Total number of trees across all shards
+    max_samples : int
+        Rows subsampled to build each tree (capped at the shard size)
+    bootstrap : bool
+        Draw each tree's subsample with replacement
+    max_features : float or int
+        Features drawn for each tree
+    contamination : float or 'auto'
+        As in IsolationForest
+    n_shards : int, optional
+        Row shards (default: workers)
+    workers : int, optional
+        Worker processes (default: number of CPUs)
+    random_state : int
+        Seed; each shard gets an independent child seed
+    offset_sample_size : int
+        Rows scored to place the contamination threshold
+
+    Returns:
+    --------
+    IsolationForest
+        Single fitted model with all shards' trees
+    """
+    n_rows = len(X)
+    workers = workers or os.cpu_count() or 1
+    shards = plan_shards(n_rows, n_shards or workers, n_estimators, min(max_samples, n_rows))
+    # The last shards are the shortest: n_rows // stride rows
+    samples_per_tree = min(max_samples, n_rows // len(shards))
+    seeds = np.random.SeedSequence(random_state).generate_state(len(shards))
+
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    with shared_arrays({'X': X}) as specs:
+        with ProcessPoolExecutor(max_workers=min(workers, len(shards)), initializer=attach_shared_arrays,
+                                 initargs=(specs,)) as pool:
+            futures = [
+                pool.submit(_fit_shard, first_row, stride, trees, samples_per_tree, bootstrap,
+                            max_features, int(seed))
+                for (first_row, stride, trees), seed in zip(shards, seeds)
+            ]
+            forests = [future.result() for future in futures]
+
+    model = merge_isolation_forests(forests)
+    model.contamination = contamination
+    model.random_state = random_state
+    model.n_jobs = None
+
+    if contamination != 'auto':
+        rng = np.random.default_rng(random_state)
+        if n_rows > offset_sample_size:
+            rows = np.sort(rng.choice(n_rows, offset_sample_size, replace=False))
+            X = X[rows]
+        # Export uncached: the cached flat forest would keep the old offset_
+        scores = FlatIsolationForest.from_model(model).score_samples(X)
+        model.offset_ = np.percentile(scores, 100.0 * contamination)
+    return model
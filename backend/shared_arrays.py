@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Shared-Memory NumPy Arrays for Process Pools
+============================================
+
+Places arrays in multiprocessing.shared_memory blocks once in the parent
+process; pool workers attach to them as read-only numpy views instead of
+receiving pickled copies.
+
+Usage:
+    with shared_arrays({'X': X}) as specs:
+        with ProcessPoolExecutor(initializer=attach_shared_arrays, initargs=(specs,)) as pool:
+            ...
+    # inside a worker task:
+    X = worker_arrays()['X']
+"""
+
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+@contextmanager
+def shared_arrays(arrays):
+    """
+    Copy arrays into shared memory blocks for the lifetime of the block.
+
+    Yields a dict of name -> (block_name, shape, dtype) specs that workers
+    pass to attach_shared_arrays. Blocks are unlinked on exit.
+    """
+    blocks, specs = [], {}
+    try:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            blocks.append(block)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[...] = array
+            specs[name] = (block.name, array.shape, array.dtype.str)
+        yield specs
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+# Worker-process state set by attach_shared_arrays
+_worker_blocks = []
+_worker_arrays = {}
+
+
+def attach_shared_arrays(specs):
+    """Pool initializer: map the parent's shared blocks as read-only arrays."""
+    for name, (block_name, shape, dtype) in specs.items():
+        # Pool workers share the parent's resource tracker, which already
+        # tracks the block; the parent unlinks it when the pool is done
+        block = shared_memory.SharedMemory(name=block_name)
+        array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        array.flags.writeable = False
+        _worker_blocks.append(block)
+        _worker_arrays[name] = array
+
+
+def worker_arrays():
+    """Arrays attached in this worker, by name."""
+    return _worker_arrays
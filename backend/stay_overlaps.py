@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Overlapping Beneficiary Stays
+=============================
+
+Flags claims where one beneficiary is billed by several providers for
+overlapping periods: an inpatient stay at one hospital while another bills
+for the same days.
+
+Instead of a self-merge on BeneID (quadratic for frequent beneficiaries),
+claims are sorted by (BeneID, start date) and the overlaps of every claim
+are counted with two binary searches: claims of the same beneficiary that
+start on or before its end, minus those that end before its start. Doing
+the same per (BeneID, Provider) and subtracting leaves the overlaps with
+other providers. Everything is vectorized and O(n log n).
+
+Stay periods use AdmissionDt/DischargeDt where present (inpatient) and
+ClaimStartDt/ClaimEndDt otherwise; both ends are inclusive.
+
+BeneficiaryStays keeps the periods of recent claims per beneficiary, so
+claims scored later are matched against them as well as against each
+other (see claim_scoring.py).
+
+Features:
+    OverlappingStayCount  Claims of the same beneficiary from other
+                          providers overlapping this claim's period
+    ProviderOverlapRate   Share of the provider's claims with at least one
+                          such overlap
+"""
+
+import numpy as np
+import pandas as pd
+
+from temporal_features import claim_days
+
+
+OVERLAP_FEATURE_COLUMNS = ['OverlappingStayCount', 'ProviderOverlapRate']
+
+# (start, end) date columns, in order of preference
+STAY_DATE_COLUMNS = [('AdmissionDt', 'DischargeDt'), ('ClaimStartDt', 'ClaimEndDt')]
+
+# Stored periods ending this many days before the latest one are dropped
+DEFAULT_HISTORY_DAYS = 90
+
+
+def _days(claims, column):
+    """Dates in a column as int64 days since the epoch, with a missing mask."""
+    days = claim_days(claims, column)
+    missing = np.isnan(days)
+    return np.where(missing, 0, days).astype(np.int64), missing
+
+
+def stay_periods(claims):
+    """
+    Inclusive (start_day, end_day, valid) per claim.
+
+    Each claim takes the first STAY_DATE_COLUMNS pair with both dates set.
+    Periods ending before they start are invalid.
+    """
+    n_rows = len(claims)
+    start = np.zeros(n_rows, dtype=np.int64)
+    end = np.zeros(n_rows, dtype=np.int64)
+    valid = np.zeros(n_rows, dtype=bool)
+    for start_col, end_col in STAY_DATE_COLUMNS:
+        pair_start, start_missing = _days(claims, start_col)
+        pair_end, end_missing = _days(claims, end_col)
+        use = ~valid & ~start_missing & ~end_missing
+        start[use] = pair_start[use]
+        end[use] = pair_end[use]
+        valid |= use
+    valid &= end >= start
+    return start, end, valid
+
+
+def _overlap_counts(groups, start, end):
+    """
+    Other intervals in the same group overlapping each interval.
+
+    Intervals are placed on one number line with each group offset by more
+    than the full date range, so one sorted array covers every group.
+    """
+    if len(groups) == 0:
+        return np.zeros(0, dtype=np.int64)
+    low = min(start.min(), end.min())
+    span = int(max(start.max(), end.max()) - low) + 2
+    offset = groups.astype(np.int64) * span - low
+    start_keys = np.sort(offset + start)
+    end_keys = np.sort(offset + end)
+    starting_by_end = np.searchsorted(start_keys, offset + end, side='right')
+    ended_before_start = np.searchsorted(end_keys, offset + start, side='left')
+    # The interval itself always counts as starting by its own end
+    return starting_by_end - ended_before_start - 1
+
+
+def other_provider_overlaps(beneficiary, provider, start, end):
+    """
+    Periods of the same beneficiary from other providers overlapping each period.
+
+    Parameters:
+    -----------
+    beneficiary, provider : np.ndarray
+        Integer beneficiary and provider code (or hash) per period
+    start, end : np.ndarray
+        Inclusive period bounds in days
+
+    Returns:
+    --------
+    np.ndarray
+        int64 overlap count per period
+    """
+    bene_codes, _ = pd.factorize(beneficiary)
+    provider_codes, providers = pd.factorize(provider)
+    pair_codes, _ = pd.factorize(bene_codes.astype(np.int64) * max(len(providers), 1) + provider_codes)
+    return _overlap_counts(bene_codes, start, end) - _overlap_counts(pair_codes, start, end)
+
+
+def stay_overlap_features(claims):
+    """
+    Per-claim overlap counts and per-provider overlap rates.
+
+    Parameters:
+    -----------
+    claims : pd.DataFrame
+        Claims with BeneID, Provider and stay date columns
+
+    Returns:
+    --------
+    dict
+        OverlappingStayCount and ProviderOverlapRate as float32 arrays.
+        Claims without a valid period count 0 overlaps; ProviderOverlapRate
+        is NaN for claims with no provider.
+    """
+    n_rows = len(claims)
+    start, end, valid = stay_periods(claims)
+    bene_codes, _ = pd.factorize(claims['BeneID'])
+    provider_codes, providers = pd.factorize(claims['Provider'])
+    valid &= (bene_codes >= 0) & (provider_codes >= 0)
+
+    overlap_count = np.zeros(n_rows, dtype=np.float32)
+    overlap_count[valid] = other_provider_overlaps(
+        bene_codes[valid], provider_codes[valid], start[valid], end[valid])
+
+    has_provider = provider_codes >= 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        provider_rate = (
+            np.bincount(provider_codes[has_provider], weights=(overlap_count[has_provider] > 0).astype(np.float64),
+                        minlength=len(providers))
+            / np.bincount(provider_codes[has_provider], minlength=len(providers))
+        )
+    overlap_rate = np.full(n_rows, np.nan, dtype=np.float32)
+    overlap_rate[has_provider] = provider_rate[provider_codes[has_provider]]
+
+    return {
+        'OverlappingStayCount': overlap_count,
+        'ProviderOverlapRate': overlap_rate,
+    }
+
+
+# =============================================================================
+# Stored Stay Periods
+# =============================================================================
+
+def _padded(values, length):
+    """Copy of values zero-padded to length."""
+    padded = np.zeros(length, dtype=values.dtype)
+    padded[:len(values)] = values
+    return padded
+
+
+class BeneficiaryStays:
+    """
+    Stay periods of recent claims per beneficiary, for matching new claims.
+
+    Stores the beneficiary (as a 64-bit hash), provider and inclusive
+    period of every added claim with a valid period, whether it overlaps
+    another provider's claim, and per-provider counts of claims and of
+    claims with such an overlap. New claims then get the
+    OverlappingStayCount and ProviderOverlapRate that stay_overlap_features
+    would give them on all claims added so far plus their own batch, in
+    time proportional to the batch's beneficiaries' periods.
+
+    Parameters:
+    -----------
+    history_days : int or None
+        Periods ending more than this many days before the latest stored
+        end are dropped on update (None keeps all). A new claim can only
+        overlap periods ending on or after its start, so only claims
+        arriving later than that lose matches. The provider counts always
+        cover every claim added.
+    """
+
+    def __init__(self, history_days=DEFAULT_HISTORY_DAYS):
+        self.history_days = history_days
+        self.providers = pd.Index(np.array([], dtype=object), name='Provider')
+        self.provider_claims = np.zeros(0, dtype=np.int64)
+        self.provider_overlapped = np.zeros(0, dtype=np.int64)
+
+        self.beneficiary = np.zeros(0, dtype=np.uint64)
+        self.provider = np.zeros(0, dtype=np.int64)
+        self.start = np.zeros(0, dtype=np.int64)
+        self.end = np.zeros(0, dtype=np.int64)
+        self.overlapped = np.zeros(0, dtype=bool)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild from to_dict output; arrays are copied so mmapped input can be updated."""
+        if data is None:
+            return cls()
+        stays = cls(history_days=data["history_days"])
+        stays.providers = pd.Index(data["providers"], name='Provider')
+        stays.provider_claims = np.array(data["provider_claims"], dtype=np.int64)
+        stays.provider_overlapped = np.array(data["provider_overlapped"], dtype=np.int64)
+        stays.beneficiary = np.array(data["beneficiary"], dtype=np.uint64)
+        stays.provider = np.array(data["provider"], dtype=np.int64)
+        stays.start = np.array(data["start"], dtype=np.int64)
+        stays.end = np.array(data["end"], dtype=np.int64)
+        stays.overlapped = np.array(data["overlapped"], dtype=bool)
+        return stays
+
+    def __len__(self):
+        return len(self.start)
+
+    def _match(self, claims):
+        """
+        Overlaps of a batch with the stored periods and with each other.
+
+        Only stored periods of the batch's beneficiaries are read, since
+        overlaps never cross beneficiaries.
+
+        Returns:
+        --------
+        dict
+            providers (extended with the batch's new providers),
+            provider_rows and valid per claim, overlap_count per claim,
+            first_overlaps (stored rows gaining their first overlap) and the
+            provider claim and overlap totals once the batch is added
+        """
+        n_rows = len(claims)
+        start, end, valid = stay_periods(claims)
+
+        beneficiary = np.zeros(n_rows, dtype=np.uint64)
+        bene_values = claims['BeneID'].to_numpy(dtype=object)
+        has_bene = pd.notna(bene_values)
+        beneficiary[has_bene] = pd.util.hash_array(bene_values[has_bene])
+
+        provider_codes, labels = pd.factorize(claims['Provider'])
+        labels = pd.Index(np.asarray(labels, dtype=object))
+        positions = self.providers.get_indexer(labels)
+        new = positions == -1
+        providers = self.providers.append(labels[new]) if new.any() else self.providers
+        positions[new] = np.arange(len(self.providers), len(providers))
+        # Missing providers factorize to -1, which picks the trailing -1
+        provider_rows = np.append(positions, -1)[provider_codes]
+        has_provider = provider_rows >= 0
+        valid &= has_bene & has_provider
+
+        # Stored periods first, then the batch's, on one set of group codes
+        stored = np.flatnonzero(np.isin(self.beneficiary, beneficiary[valid]))
+        counts = other_provider_overlaps(
+            np.concatenate([self.beneficiary[stored], beneficiary[valid]]),
+            np.concatenate([self.provider[stored], provider_rows[valid]]),
+            np.concatenate([self.start[stored], start[valid]]),
+            np.concatenate([self.end[stored], end[valid]]),
+        )
+
+        overlap_count = np.zeros(n_rows, dtype=np.int64)
+        overlap_count[valid] = counts[len(stored):]
+        first_overlaps = stored[(counts[:len(stored)] > 0) & ~self.overlapped[stored]]
+
+        n_providers = len(providers)
+        has_overlap = has_provider & (overlap_count > 0)
+        provider_claims = _padded(self.provider_claims, n_providers) + np.bincount(
+            provider_rows[has_provider], minlength=n_providers)
+        provider_overlapped = (
+            _padded(self.provider_overlapped, n_providers)
+            + np.bincount(provider_rows[has_overlap], minlength=n_providers)
+            + np.bincount(self.provider[first_overlaps], minlength=n_providers)
+        )
+        return {
+            'providers': providers,
+            'provider_rows': provider_rows,
+            'valid': valid,
+            'start': start,
+            'end': end,
+            'beneficiary': beneficiary,
+            'overlap_count': overlap_count,
+            'first_overlaps': first_overlaps,
+            'provider_claims': provider_claims,
+            'provider_overlapped': provider_overlapped,
+        }
+
+    # --------------------------------------------
+    # Updates
+    # --------------------------------------------
+    def update(self, claims):
+        """Add a batch of claims: their periods, overlap flags and provider counts."""
+        match = self._match(claims)
+        valid = match['valid']
+        self.providers = match['providers']
+        self.provider_claims = match['provider_claims']
+        self.provider_overlapped = match['provider_overlapped']
+        self.overlapped[match['first_overlaps']] = True
+
+        self.beneficiary = np.concatenate([self.beneficiary, match['beneficiary'][valid]])
+        self.provider = np.concatenate([self.provider, match['provider_rows'][valid]])
+        self.start = np.concatenate([self.start, match['start'][valid]])
+        self.end = np.concatenate([self.end, match['end'][valid]])
+        self.overlapped = np.concatenate([self.overlapped, match['overlap_count'][valid] > 0])
+
+        if self.history_days is not None and len(self.end):
+            keep = self.end >= self.end.max() - self.history_days
+            if not keep.all():
+                for name in ['beneficiary', 'provider', 'start', 'end', 'overlapped']:
+                    setattr(self, name, getattr(self, name)[keep])
+
+    # --------------------------------------------
+    # Features
+    # --------------------------------------------
+    def claim_features(self, claims):
+        """
+        Overlap features of claims not yet added, as if they were added.
+
+        Returns:
+        --------
+        dict
+            OverlappingStayCount and ProviderOverlapRate, as
+            stay_overlap_features
+        """
+        match = self._match(claims)
+        provider_rows = match['provider_rows']
+        has_provider = provider_rows >= 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            provider_rate = match['provider_overlapped'] / match['provider_claims']
+        overlap_rate = np.full(len(claims), np.nan, dtype=np.float32)
+        overlap_rate[has_provider] = provider_rate[provider_rows[has_provider]]
+        return {
+            'OverlappingStayCount': match['overlap_count'].astype(np.float32),
+            'ProviderOverlapRate': overlap_rate,
+        }
+
+    # --------------------------------------------
+    # Export
+    # --------------------------------------------
+    def to_dict(self):
+        """Plain arrays for the model artifact."""
+        return {
+            "history_days": self.history_days,
+            "providers": self.providers.to_numpy(dtype=object),
+            "provider_claims": self.provider_claims.copy(),
+            "provider_overlapped": self.provider_overlapped.copy(),
+            "beneficiary": self.beneficiary.copy(),
+            "provider": self.provider.copy(),
+            "start": self.start.copy(),
+            "end": self.end.copy(),
+            "overlapped": self.overlapped.copy(),
+        }
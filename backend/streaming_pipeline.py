@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Out-of-Core Streaming Pipeline for Large Claim Files
+====================================================
+
+Two-pass variant of fraud_detection_engine.run_pipeline for claim extracts
+that do not fit in memory.
+
+Pass 1 streams the CSV in chunks to build the provider, procedure and
+global aggregates (claim_scoring.ClaimAggregates) and keeps a bounded
+uniform sample of claims for fitting the scaler and Isolation Forest.
+Features that compare claims with each other (near-duplicate scores, stay
+overlaps, claim velocity and the provider network) need every claim at
+once, so pass 1 also spills small per-claim records into hash-partitioned
+files in a temporary directory and then computes those features one
+partition at a time (cross_claim_partitions.ClaimPartitions) with the
+same functions engineer_features uses. Pass 2 streams the file again,
+builds features from the final aggregates and the spilled cross-claim
+features, scores each chunk and appends claim-level results to the output
+file.
+
+The engineered features therefore match run_pipeline on the same file,
+whatever the chunk size; with a sample covering every claim the model and
+scores match as well (benchmarks/check_streaming_pipeline.py verifies
+this). Peak memory is bounded by the chunk size, the sample size, the
+aggregate tables and the largest partition, which holds about one chunk
+of claims unless a single provider, beneficiary or LSH bucket is larger.
+The spill files take about 700 bytes per claim on disk.
+
+Usage:
+    python streaming_pipeline.py --data national_claims.csv --output claim_level_results.csv
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from claim_scoring import ClaimAggregates
+from cross_claim_partitions import ClaimPartitions
+from fraud_detection_engine import (
+    score_isolation_model,
+    select_and_scale_features,
+    train_isolation_model,
+    transform_with_fitted_scaler,
+)
+from pipeline_instrumentation import PipelineInstrumentation, logger, set_verbosity
+from risk_calibration import ScoreCalibration
+
+
+REQUIRED_COLUMNS = ['Provider', 'InscClaimAmtReimbursed', 'PotentialFraud']
+
+
+# =============================================================================
+# Chunked Reading
+# =============================================================================
+
+def iter_claim_chunks(filepath, chunksize=250_000):
+    """
+    Yield validated claim chunks from a CSV file.
+
+    PotentialFraud is converted from Yes/No to 1/0 exactly as load_data does.
+    Each chunk is indexed by file row position.
+
+    Raises:
+    -------
+    FileNotFoundError
+        If the specified file does not exist
+    ValueError
+        If required columns are missing
+    """
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(f"Dataset file not found: {filepath}")
+
+    offset = 0
+    for i, chunk in enumerate(pd.read_csv(filepath, chunksize=chunksize)):
+        if i == 0:
+            missing_columns = [col for col in REQUIRED_COLUMNS if col not in chunk.columns]
+            if missing_columns:
+                raise ValueError(f"Missing required columns: {missing_columns}")
+        chunk['PotentialFraud'] = chunk['PotentialFraud'].map({'Yes': 1, 'No': 0})
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+
+def _update_sample(sample, sample_keys, chunk, rng, sample_size):
+    """
+    Bottom-k reservoir update: keep the sample_size rows with the smallest
+    random keys seen so far, which is a uniform sample without replacement.
+    Rows keep their file row index.
+    """
+    keys = rng.random(len(chunk))
+    if sample is not None and len(sample) >= sample_size:
+        keep = keys < sample_keys.max()
+        chunk, keys = chunk[keep], keys[keep]
+    if sample is not None:
+        chunk = pd.concat([sample, chunk])
+        keys = np.concatenate([sample_keys, keys])
+    if len(chunk) > sample_size:
+        idx = np.argpartition(keys, sample_size - 1)[:sample_size]
+        chunk, keys = chunk.iloc[idx], keys[idx]
+    return chunk, keys
+
+
+def _estimate_rows(filepath, sample_bytes=1 << 20):
+    """Rough claim count of a CSV file from the length of its first lines."""
+    with open(filepath, 'rb') as f:
+        f.readline()
+        lines = f.readlines(sample_bytes)
+    if not lines:
+        return 0
+    return int(os.path.getsize(filepath) / (sum(map(len, lines)) / len(lines))) + 1
+
+
+# =============================================================================
+# PASS 1: Aggregates and Training Sample
+# =============================================================================
+
+def compute_streaming_aggregates(filepath, partition_dir, chunksize=250_000, sample_size=200_000,
+                                 random_state=42):
+    """
+    First pass: aggregate statistics, cross-claim features and a bounded training sample.
+
+    Parameters:
+    -----------
+    filepath : str
+        Path to the claims CSV file
+    partition_dir : str
+        Empty directory for the cross-claim spill files; they are read
+        again in pass 2, so it must outlive the returned ClaimPartitions
+    chunksize : int
+        Rows per chunk
+    sample_size : int
+        Maximum number of claims kept for model fitting
+    random_state : int
+        Seed for the sample
+
+    Returns:
+    --------
+    tuple
+        (ClaimAggregates with the provider network set, sample_df indexed
+        by file row, ClaimPartitions holding the cross-claim features,
+        total_rows, fraud_count)
+    """
+    logger.info("=" * 60)
+    logger.info("PASS 1: Streaming Aggregates")
+    logger.info("=" * 60)
+
+    rng = np.random.default_rng(random_state)
+    aggregates = ClaimAggregates(claim_history=False)
+    sample, sample_keys = None, None
+    # Partitions of about one chunk of claims each
+    partitions = ClaimPartitions(partition_dir, math.ceil(_estimate_rows(filepath) / chunksize))
+    total_rows = 0
+    fraud_count = 0
+
+    for chunk in iter_claim_chunks(filepath, chunksize):
+        aggregates.update(chunk)
+        sample, sample_keys = _update_sample(sample, sample_keys, chunk, rng, sample_size)
+        partitions.add(chunk)
+        total_rows += len(chunk)
+        fraud_count += int(chunk['PotentialFraud'].sum())
+
+    if total_rows == 0:
+        raise ValueError(f"No claims found in {filepath}")
+
+    aggregates.provider_network = partitions.finish()
+
+    logger.info(f"✓ Aggregated {total_rows:,} claims across {len(aggregates.provider_index):,} providers")
+    logger.info(f"  - Fraudulent claims: {fraud_count:,} ({fraud_count/total_rows*100:.2f}%)")
+    logger.info(f"  - Training sample: {len(sample):,} claims")
+    logger.info(f"  - Cross-claim features: {partitions.n_partitions:,} partitions")
+
+    return aggregates, sample, partitions, total_rows, fraud_count
+
+
+# =============================================================================
+# PASS 2: Streaming Scoring
+# =============================================================================
+
+def run_streaming_pipeline(data_path, output_path="claim_level_results.csv", chunksize=250_000,
+                           sample_size=200_000, model_artifact=None, random_state=42,
+                           verbose=1, trace_memory=False, spill_dir=None):
+    """
+    Run the detection pipeline in two streaming passes over a CSV file.
+
+    Parameters:
+    -----------
+    data_path : str
+        Path to the cleaned claims CSV file
+    output_path : str
+        Claim-level results are appended here chunk by chunk
+    chunksize : int
+        Rows per chunk
+    sample_size : int
+        Maximum number of claims used to fit the scaler and model
+    model_artifact : dict, optional
+        Persisted artifact to score with instead of fitting on the sample
+    random_state : int
+        Seed for the training sample
+    verbose : int
+        See fraud_detection_engine.run_pipeline
+    trace_memory : bool
+        Record peak traced memory per stage (slower)
+    spill_dir : str, optional
+        Where to create the temporary directory for the cross-claim spill
+        files (about 700 bytes per claim); the system default otherwise
+
+    Returns:
+    --------
+    dict
+        Output path, provider summary, metrics, fitted model, scaler,
+        feature columns, the risk-score calibration and per-stage records
+        under "stage_metrics"
+    """
+    set_verbosity(verbose)
+    instrumentation = PipelineInstrumentation(trace_memory=trace_memory)
+
+    # Spill files live until the scoring pass is done
+    with tempfile.TemporaryDirectory(prefix="claim_partitions_", dir=spill_dir) as partition_dir:
+        with instrumentation.stage("streaming_aggregates") as record:
+            aggregates, sample, partitions, total_rows, _ = compute_streaming_aggregates(
+                data_path, partition_dir, chunksize, sample_size, random_state
+            )
+            record["rows_out"] = len(aggregates.provider_index)
+
+        if model_artifact is None:
+            # Fit on the sample using features derived from full-data aggregates.
+            # File order, so a sample of every claim fits exactly what run_pipeline fits
+            with instrumentation.stage("fit_on_sample", rows_in=len(sample)) as record:
+                sample = sample.sort_index()
+                sample_features = aggregates.build_features(sample, partitions.claim_features(sample))
+                X_sample, feature_cols, scaler = select_and_scale_features(sample_features)
+                fill_values = sample_features[feature_cols].median().to_dict()
+                model, sample_scores, _ = train_isolation_model(X_sample, sample_features)
+                calibration = ScoreCalibration.from_scores(sample_scores)
+                record["rows_out"] = len(X_sample)
+        else:
+            feature_cols = model_artifact["feature_columns"]
+            fill_values = model_artifact["fill_values"]
+            scaler = model_artifact["scaler"]
+            model = model_artifact["model"]
+            calibration = ScoreCalibration.from_dict(model_artifact["score_calibration"])
+        del sample
+
+        logger.info("\n" + "=" * 60)
+        logger.info("PASS 2: Streaming Scoring")
+        logger.info("=" * 60)
+
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+        provider_totals = None
+        tn = fp = fn = tp = 0
+        scored_rows = 0
+
+        with instrumentation.stage("streaming_scoring", rows_in=total_rows) as record:
+            for chunk in iter_claim_chunks(data_path, chunksize):
+                features = aggregates.build_features(chunk, partitions.claim_features(chunk))
+                X_scaled = transform_with_fitted_scaler(features, feature_cols, fill_values, scaler)
+                anomaly_scores, anomaly_flags = score_isolation_model(model, X_scaled)
+
+                features['AnomalyScore'] = anomaly_scores
+                features['AnomalyFlag'] = anomaly_flags
+                features['RiskScore'] = calibration.transform(anomaly_scores)
+                features.to_csv(output_path, mode='a', header=scored_rows == 0, index=False)
+
+                # Running provider totals for the provider risk summary
+                chunk_totals = features.groupby('Provider').agg(
+                    RiskScoreSum=('RiskScore', 'sum'),
+                    SuspiciousClaimCount=('AnomalyFlag', 'sum'),
+                    TotalClaims=('AnomalyFlag', 'count'),
+                    ActualFraudCount=('PotentialFraud', 'sum'),
+                )
+                provider_totals = chunk_totals if provider_totals is None else provider_totals.add(chunk_totals, fill_value=0)
+
+                # Running confusion matrix
+                y_true = features['PotentialFraud'].to_numpy()
+                tp += int(((y_true == 1) & (anomaly_flags == 1)).sum())
+                fp += int(((y_true == 0) & (anomaly_flags == 1)).sum())
+                fn += int(((y_true == 1) & (anomaly_flags == 0)).sum())
+                tn += int(((y_true == 0) & (anomaly_flags == 0)).sum())
+
+                scored_rows += len(chunk)
+                logger.info(f"  ✓ Scored {scored_rows:,} / {total_rows:,} claims")
+            record["rows_out"] = scored_rows
+        partitions.close()
+
+    logger.info(f"\n✓ Claim-level results written to {output_path}")
+
+    provider_summary = provider_totals.reset_index()
+    provider_summary['AvgRiskScore'] = provider_summary['RiskScoreSum'] / provider_summary['TotalClaims']
+    provider_summary['SuspiciousClaimPercentage'] = (
+        provider_summary['SuspiciousClaimCount'] / provider_summary['TotalClaims'] * 100
+    )
+    provider_summary = provider_summary.sort_values('AvgRiskScore', ascending=False)
+    provider_summary = provider_summary[[
+        'Provider', 'AvgRiskScore', 'SuspiciousClaimPercentage',
+        'TotalClaims', 'SuspiciousClaimCount', 'ActualFraudCount'
+    ]]
+
+    total = tp + tn + fp + fn
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    metrics = {
+        'confusion_matrix': np.array([[tn, fp], [fn, tp]]),
+        'true_negatives': tn,
+        'false_positives': fp,
+        'false_negatives': fn,
+        'true_positives': tp,
+        'accuracy': (tp + tn) / total if total else 0.0,
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1
+    }
+
+    logger.info(f"✓ Aggregated risk metrics for {len(provider_summary)} providers")
+    logger.info(f"  ✓ Precision: {precision:.4f}  Recall: {recall:.4f}  F1-Score: {f1:.4f}")
+    instrumentation.log_summary()
+
+    return {
+        "results_path": output_path,
+        "provider_summary": provider_summary,
+        "metrics": metrics,
+        "model": model,
+        "scaler": scaler,
+        "feature_columns": feature_cols,
+        "calibration": calibration,
+        "stage_metrics": instrumentation.records
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core fraud detection pipeline")
+    parser.add_argument("--data", help="Path to the cleaned claims CSV", default="cleaned_claims.csv")
+    parser.add_argument("--output", help="Claim-level results CSV", default="claim_level_results.csv")
+    parser.add_argument("--provider-output", help="Provider risk summary CSV", default="provider_risk_summary.csv")
+    parser.add_argument("--chunksize", type=int, default=250_000, help="Rows per chunk")
+    parser.add_argument("--sample-size", type=int, default=200_000, help="Claims used for model fitting")
+    parser.add_argument("--spill-dir", help="Directory for temporary cross-claim spill files", default=None)
+
+    args = parser.parse_args()
+
+    try:
+        results = run_streaming_pipeline(
+            args.data, args.output, chunksize=args.chunksize, sample_size=args.sample_size,
+            spill_dir=args.spill_dir
+        )
+        results["provider_summary"].to_csv(args.provider_output, index=False)
+        print(f"✓ Provider risk summary written to {args.provider_output}")
+    except Exception as e:
+        print(f"Pipeline failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
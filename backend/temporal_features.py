@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Temporal Claim-Velocity Features
+================================
+
+Rolling per-provider claim counts and amounts from real ClaimStartDt
+dates, plus daily and monthly claim aggregates for the dashboard timeline.
+
+Claims are placed on one sorted array of (provider, day) keys, each
+provider offset by more than the full date range. The claims in a
+provider's trailing window (day - w, day] are then a contiguous slice
+found with two searchsorted calls, and window sums come from a cumulative
+sum over the same order: no groupby, no per-provider rolling loop.
+
+ProviderClaimWindows keeps the dates and amounts of recent claims per
+provider, so claims scored later see the claims before them in their
+windows as well as their own batch (see claim_scoring.py).
+
+Features:
+    ClaimCount7d / ClaimCount30d    Provider's claims in the trailing 7/30 days
+    ClaimAmount7d / ClaimAmount30d  Their total InscClaimAmtReimbursed
+    ClaimBurstScore                 7-day claim rate over the 30-day rate;
+                                    1 is steady, up to 30/7 for a burst
+"""
+
+import numpy as np
+import pandas as pd
+
+
+TEMPORAL_FEATURE_COLUMNS = [
+    'ClaimCount7d', 'ClaimCount30d', 'ClaimAmount7d', 'ClaimAmount30d', 'ClaimBurstScore',
+]
+
+DATE_COLUMN = 'ClaimStartDt'
+
+# Stored claims dated this many days before the latest one are dropped;
+# at least the longest window
+DEFAULT_HISTORY_DAYS = 90
+
+
+def claim_days(claims, column):
+    """Dates in a claim column as days since the epoch (NaN when missing or unparseable)."""
+    if column not in claims.columns:
+        return np.full(len(claims), np.nan)
+    dates = pd.to_datetime(claims[column], errors='coerce')
+    days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64).astype(np.float64)
+    days[dates.isna().to_numpy()] = np.nan
+    return days
+
+
+def claim_start_days(claims):
+    """Claim start date as days since the epoch (NaN when missing or unparseable)."""
+    return claim_days(claims, DATE_COLUMN)
+
+
+def rolling_window_totals(groups, days, amounts, windows=(7, 30)):
+    """
+    Trailing-window claim counts and amount totals within each group.
+
+    Parameters:
+    -----------
+    groups : np.ndarray
+        Non-negative integer group (provider) code per claim
+    days : np.ndarray
+        Integer day per claim
+    amounts : np.ndarray
+        Claim amounts (NaN counts as 0)
+    windows : tuple
+        Window lengths in days; a window w covers (day - w, day]
+
+    Returns:
+    --------
+    dict
+        window -> (counts, amount_totals) arrays aligned with the input
+    """
+    if len(days) == 0:
+        return {w: (np.zeros(0), np.zeros(0)) for w in windows}
+    low = days.min()
+    span = int(days.max() - low) + max(windows) + 1
+    keys = groups.astype(np.int64) * span + (days - low)
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    amount_cumsum = np.concatenate([[0.0], np.cumsum(np.nan_to_num(amounts[order]))])
+
+    # Same-day claims all fall inside each other's window
+    upper = np.searchsorted(sorted_keys, keys, side='right')
+    totals = {}
+    for window in windows:
+        lower = np.searchsorted(sorted_keys, keys - window, side='right')
+        totals[window] = (
+            (upper - lower).astype(np.float64),
+            amount_cumsum[upper] - amount_cumsum[lower],
+        )
+    return totals
+
+
+def temporal_claim_features(claims):
+    """
+    Per-claim rolling velocity features.
+
+    Parameters:
+    -----------
+    claims : pd.DataFrame
+        Claims with Provider, ClaimStartDt and InscClaimAmtReimbursed
+
+    Returns:
+    --------
+    dict
+        TEMPORAL_FEATURE_COLUMNS -> float32 arrays; NaN for claims without
+        a provider or a parseable date
+    """
+    n_rows = len(claims)
+    days = claim_start_days(claims)
+    provider_codes, _ = pd.factorize(claims['Provider'])
+    valid = (provider_codes >= 0) & ~np.isnan(days)
+    amounts = claims['InscClaimAmtReimbursed'].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    totals = rolling_window_totals(provider_codes[valid], days[valid].astype(np.int64), amounts[valid])
+    return velocity_features(n_rows, valid, totals[7], totals[30])
+
+
+def velocity_features(n_rows, valid, totals7, totals30):
+    """TEMPORAL_FEATURE_COLUMNS from 7- and 30-day (counts, amounts) of the valid claims."""
+    count7, amount7 = totals7
+    count30, amount30 = totals30
+    features = {}
+    for name, values in [
+        ('ClaimCount7d', count7), ('ClaimCount30d', count30),
+        ('ClaimAmount7d', amount7), ('ClaimAmount30d', amount30),
+        ('ClaimBurstScore', (count7 / 7.0) / (count30 / 30.0)),
+    ]:
+        column = np.full(n_rows, np.nan, dtype=np.float32)
+        column[valid] = values
+        features[name] = column
+    return features
+
+
+class ProviderClaimWindows:
+    """
+    Dates and amounts of recent claims per provider, for windowing new claims.
+
+    New claims get the features temporal_claim_features would give them on
+    all claims added so far plus their own batch: each window counts the
+    provider's stored claims in it as well as the batch's.
+
+    Parameters:
+    -----------
+    history_days : int or None
+        Claims dated more than this many days before the latest stored
+        claim are dropped on update (None keeps all). Windows reach 30
+        days back, so only claims arriving later than the difference lose
+        counts.
+    """
+
+    def __init__(self, history_days=DEFAULT_HISTORY_DAYS):
+        self.history_days = history_days
+        self.providers = pd.Index(np.array([], dtype=object), name='Provider')
+        self.provider = np.zeros(0, dtype=np.int64)
+        self.day = np.zeros(0, dtype=np.int64)
+        self.amount = np.zeros(0, dtype=np.float64)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild from to_dict output; arrays are copied so mmapped input can be updated."""
+        if data is None:
+            return cls()
+        windows = cls(history_days=data["history_days"])
+        windows.providers = pd.Index(data["providers"], name='Provider')
+        windows.provider = np.array(data["provider"], dtype=np.int64)
+        windows.day = np.array(data["day"], dtype=np.int64)
+        windows.amount = np.array(data["amount"], dtype=np.float64)
+        return windows
+
+    def __len__(self):
+        return len(self.day)
+
+    def _batch(self, claims):
+        """
+        Stored provider rows, days and amounts of a batch's dated claims.
+
+        Returns:
+        --------
+        tuple
+            (providers extended with the batch's new providers, provider
+            rows, days, amounts, valid mask over the batch)
+        """
+        days = claim_start_days(claims)
+        provider_codes, labels = pd.factorize(claims['Provider'])
+        labels = pd.Index(np.asarray(labels, dtype=object))
+        positions = self.providers.get_indexer(labels)
+        new = positions == -1
+        providers = self.providers.append(labels[new]) if new.any() else self.providers
+        positions[new] = np.arange(len(self.providers), len(providers))
+
+        valid = (provider_codes >= 0) & ~np.isnan(days)
+        amounts = claims['InscClaimAmtReimbursed'].to_numpy(dtype=np.float64, na_value=np.nan)
+        return (providers, positions[provider_codes[valid]], days[valid].astype(np.int64),
+                np.nan_to_num(amounts[valid]), valid)
+
+    # --------------------------------------------
+    # Updates
+    # --------------------------------------------
+    def update(self, claims):
+        """Add a batch of claims; claims without a provider or date are skipped."""
+        self.providers, provider, day, amount, _ = self._batch(claims)
+        self.provider = np.concatenate([self.provider, provider])
+        self.day = np.concatenate([self.day, day])
+        self.amount = np.concatenate([self.amount, amount])
+
+        if self.history_days is not None and len(self.day):
+            keep = self.day >= self.day.max() - self.history_days
+            if not keep.all():
+                self.provider, self.day, self.amount = self.provider[keep], self.day[keep], self.amount[keep]
+
+    # --------------------------------------------
+    # Features
+    # --------------------------------------------
+    def claim_features(self, claims):
+        """
+        Velocity features of claims not yet added, as if they were added.
+
+        Returns:
+        --------
+        dict
+            TEMPORAL_FEATURE_COLUMNS -> float32 arrays, as temporal_claim_features
+        """
+        _, provider, day, amount, valid = self._batch(claims)
+        # Only the batch providers' stored claims can fall in the batch's windows
+        stored = np.flatnonzero(np.isin(self.provider, provider))
+        totals = rolling_window_totals(
+            np.concatenate([self.provider[stored], provider]),
+            np.concatenate([self.day[stored], day]),
+            np.concatenate([self.amount[stored], amount]),
+        )
+        return velocity_features(
+            len(claims), valid,
+            *[tuple(values[len(stored):] for values in totals[window]) for window in (7, 30)],
+        )
+
+    # --------------------------------------------
+    # Export
+    # --------------------------------------------
+    def to_dict(self):
+        """Plain arrays for the model artifact."""
+        return {
+            "history_days": self.history_days,
+            "providers": self.providers.to_numpy(dtype=object),
+            "provider": self.provider.copy(),
+            "day": self.day.copy(),
+            "amount": self.amount.copy(),
+        }
+
+
+def claim_timeline(claims, anomaly_flags, freq='M'):
+    """
+    Claims processed, flagged and flagged amount per day or month.
+
+    Parameters:
+    -----------
+    claims : pd.DataFrame
+        Claims with ClaimStartDt and InscClaimAmtReimbursed
+    anomaly_flags : np.ndarray
+        1 for flagged claims
+    freq : str
+        'D' for daily or 'M' for monthly buckets
+
+    Returns:
+    --------
+    pd.DataFrame
+        Period, processed, flagged and saved per bucket with at least one
+        claim, in date order; empty if no claim has a date
+    """
+    days = claim_start_days(claims)
+    valid = ~np.isnan(days)
+    periods = days[valid].astype(np.int64).astype('datetime64[D]').astype(f'datetime64[{freq}]').astype(np.int64)
+    if len(periods) == 0:
+        return pd.DataFrame(columns=['Period', 'processed', 'flagged', 'saved'])
+
+    flags = np.asarray(anomaly_flags)[valid].astype(np.float64)
+    amounts = np.nan_to_num(claims['InscClaimAmtReimbursed'].to_numpy(dtype=np.float64, na_value=np.nan)[valid])
+    offset = periods - periods.min()
+    processed = np.bincount(offset)
+    present = np.flatnonzero(processed)
+
+    return pd.DataFrame({
+        'Period': (present + periods.min()).astype(f'datetime64[{freq}]'),
+        'processed': processed[present],
+        'flagged': np.bincount(offset, weights=flags)[present].astype(np.int64),
+        'saved': np.bincount(offset, weights=flags * amounts)[present],
+    })
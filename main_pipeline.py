@@ -3,9 +3,13 @@ import sys
 import data_loader as dl
 import preprocessing as pp
 
-def run_pipeline(file_path, label_path=None):
+def run_pipeline(file_path, label_path=None, columnar_format="feather", write_csv=True):
     """
     Main orchestration function for the healthcare fraud detection pipeline.
+
+    The cleaned dataset is written as cleaned_claims.<columnar_format> with
+    pinned dtypes, plus cleaned_claims.csv as a fallback unless write_csv is
+    False. Pass columnar_format=None to write CSV only.
     """
     print(f"--- Starting Pipeline for {file_path} ---")
     
@@ -27,9 +31,18 @@ def run_pipeline(file_path, label_path=None):
     X_ml = pp.get_ml_features(X, id_cols=id_cols)
     
     # 5. Save Cleaned Dataset
-    output_path = "cleaned_claims.csv"
-    df.to_csv(output_path, index=False)
-    print(f"--- Pipeline Completed. Cleaned data saved to {output_path} ---")
+    output_paths = []
+    if columnar_format:
+        try:
+            output_paths.append(dl.save_columnar(pp.pin_dtypes(df), f"cleaned_claims.{columnar_format}"))
+        except ImportError as e:
+            print(f"Warning: columnar output unavailable ({e}). Writing CSV only.")
+            write_csv = True
+    if write_csv or not output_paths:
+        output_path = "cleaned_claims.csv"
+        df.to_csv(output_path, index=False)
+        output_paths.append(output_path)
+    print(f"--- Pipeline Completed. Cleaned data saved to {', '.join(output_paths)} ---")
     
     return X_ml, y
 
@@ -37,11 +50,15 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Healthcare Fraud Detection Data Pipeline")
     parser.add_argument("--file", help="Path to the features CSV", default="Dataset/Train_Inpatientdata-1542865627584.csv")
     parser.add_argument("--labels", help="Path to the labels CSV", default="Dataset/Train-1542865627584.csv")
+    parser.add_argument("--format", help="Columnar output format", choices=["feather", "parquet", "none"], default="feather")
+    parser.add_argument("--no-csv", help="Skip the CSV fallback output", action="store_true")
     
     args = parser.parse_args()
     
     try:
-        X, y = run_pipeline(args.file, label_path=args.labels)
+        columnar_format = None if args.format == "none" else args.format
+        X, y = run_pipeline(args.file, label_path=args.labels,
+                            columnar_format=columnar_format, write_csv=not args.no_csv)
         print(f"Final ML Feature Set shape: {X.shape}")
         if y is not None:
             print(f"Target variable counts:\n{y.value_counts()}")